@@ -4,10 +4,12 @@ from typing import List
 import semantic_kernel as sk
 from utils.custom_planner import CustomBasicPlanner
 from utils.input_model import Question
+from utils.prompt_cache import load_prompt
 from semantic_kernel.planners import BasicPlanner
 
 from semantic_kernel.planners.basic_planner import Plan
 import utils.sk_utils as sk_utils
+from request_utils.service_request import AsyncRequester
 
 
 def get_dummy_input() -> List[Question]:
@@ -56,8 +58,7 @@ async def main():
 
     questions = get_dummy_input()
 
-    with open(os.path.join("plugins", "prompts", "basic_planner.txt"), "r") as f:
-        planner_prompt = f.read()
+    planner_prompt = load_prompt(os.path.join("utils", "prompts", "basic_planner.txt"))
 
 
     for question in questions:
@@ -74,6 +75,9 @@ async def main():
         print(result)
         print("-------------------------------\n\n")
 
+    # Close the pooled plugin connections while their event loop still runs
+    await AsyncRequester.close_shared()
+
 # Run the main function
 if __name__ == "__main__":
     import asyncio
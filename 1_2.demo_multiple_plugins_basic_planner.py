@@ -3,11 +3,16 @@ from typing import List
 
 import semantic_kernel as sk
 from utils.custom_planner import CustomBasicPlanner
+from utils.plan_cache import PlanCache
+from utils.prompt_cache import load_prompt
+from utils.semantic_plan_index import SemanticPlanIndex
 from utils.input_model import Question
 from semantic_kernel.planners import BasicPlanner, SequentialPlanner
 
 from semantic_kernel.planners.basic_planner import Plan
-import utils.sk_utils as sk_utils
+from request_utils.service_request import AsyncRequester
+from utils.kernel_pool import get_kernel_pool
+from utils.tracing import trace_question
 
 
 def get_dummy_input() -> List[Question]:
@@ -55,13 +60,11 @@ def invoke_handler(sender, e):
 
 async def main():
     
-    # Initialize the kernel
-    kernel = sk_utils.get_kernel_router()
+    # Build the kernel with its plugins once, every run gets a cheap view of it
+    kernel_pool = get_kernel_pool().warm()
+    kernel = kernel_pool.view()
 
-    # Import plugins
-    plugins = sk_utils.load_plugins(kernel=kernel)
-
-    planner = CustomBasicPlanner(service_id="planner")# BasicPlanner(service_id="planner")
+    planner = CustomBasicPlanner(service_id="planner", plan_cache=PlanCache(), semantic_index=SemanticPlanIndex())# BasicPlanner(service_id="planner")
 
     questions = get_dummy_input()
 
@@ -69,18 +72,18 @@ async def main():
 
     kernel.add_function_invoked_handler(invoke_handler)
 
-    with open(os.path.join("utils", "prompts", "basic_planner.txt"), "r") as f:
-        planner_prompt = f.read()
+    planner_prompt = load_prompt(os.path.join("utils", "prompts", "basic_planner.txt"))
 
     for question in questions:
         # Create a plan
         # plan: Plan = await planner.create_plan(question.question)
-        plan: Plan = await planner.create_plan(question.question, kernel=kernel, prompt=planner_prompt)
-        # add steps to plan
+        with trace_question(question):
+            plan: Plan = await planner.create_plan(question.question, kernel=kernel, prompt=planner_prompt)
+            # add steps to plan
 
-        # modify object passed 
-        # Execute the plan
-        result = await planner.execute_plan(plan, kernel, question, headers=headers)
+            # modify object passed 
+            # Execute the plan
+            result = await planner.execute_plan(plan, kernel, question, headers=headers)
         print("-------------------------------\n\n")
         print(f"Question: {question.question}")
         print(f"plan: {plan.generated_plan}")
@@ -88,6 +91,9 @@ async def main():
         print(result)
         print("-------------------------------\n\n")
 
+    # Close the pooled plugin connections while their event loop still runs
+    await AsyncRequester.close_shared()
+
 # Run the main function
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,182 @@
+"""
+Offline end-to-end benchmark: create_plan + execute_plan through the real kernel, plugins and
+HTTP stack, with the fake LLM (benchmarks.fake_llm) and the plugin stub servers
+(benchmarks.stub_servers). Reports p50/p95/p99 latency and throughput per scenario and
+concurrency level, and writes them to JSON to compare runs.
+
+    python -m benchmarks.bench_e2e --requests 200 --concurrency 1 8 32 --output e2e.json
+"""
+# Standard imports
+import os
+import json
+import time
+import asyncio
+import argparse
+import platform
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+# Internal imports
+from benchmarks.fake_llm import FakeChatCompletion
+from benchmarks.stub_servers import RAG_PATH, SERVICEDESK_PATH, LatencyDistribution, rag_server, servicedesk_server
+from request_utils.metrics import get_registry
+from request_utils.service_request import AsyncRequester
+from utils import custom_logs
+from utils.batch_runner import percentile
+from utils.context_budget import get_context_budget
+from utils.custom_planner import CustomBasicPlanner
+from utils.input_model import Question
+from utils.kernel_pool import KernelPool, build_kernel
+from utils.plan_cache import PlanCache
+from utils.prompt_cache import get_prompt_cache, load_prompt
+from utils.singleflight import coalescing_stats
+from utils.token_accounting import usage_stats
+
+PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "prompts", "basic_planner.txt")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    question: str
+    subtasks: List[Dict[str, Any]]
+    execution_mode: str = "sequential"
+
+
+SCENARIOS = {
+    "servicedesk": Scenario(
+        "lista las incidencias wifi",
+        [{"function": "sevicedesk.get_incidences", "args": {"question": "lista las incidencias wifi"}}],
+    ),
+    "rag": Scenario(
+        "What is life cycle analysis?",
+        [{"function": "rag.ask_rag", "args": {"question": "What is life cycle analysis?"}}],
+    ),
+    "cities_then_rag": Scenario(
+        "Tell me some facts about the most populated city in the world.",
+        [{"function": "cities_db.get_cities", "args": {"filter": {"population": "max(population)"}}},
+         {"function": "rag.ask_rag", "args": {"question": "Tell me some facts about $step1"}}],
+    ),
+    "parallel_fanout": Scenario(
+        "lista las incidencias y las facturas del usuario 5 y explica la politica de soporte",
+        [{"function": "sevicedesk.get_incidences", "args": {"question": "lista las incidencias del usuario 5"}},
+         {"function": "invoices.get_invoices", "args": {"question": "facturas del usuario 5"}},
+         {"function": "rag.ask_rag", "args": {"question": "politica de soporte"}}],
+        execution_mode="parallel",
+    ),
+}
+
+
+def make_question(scenario: Scenario, servicedesk_url: str, message_id: int) -> Question:
+    return Question(user_id=7, message_id=message_id, chat_id=4, domain_id=1, question=scenario.question,
+                    plugins=[{"name": "ServiceDesk", "url": servicedesk_url,
+                              "configuration": {"url": "https://servicedesk.invalid/api/v3", "token": "benchmark"}}])
+
+
+async def run_level(pool: KernelPool, planner: CustomBasicPlanner, prompt: str, scenario: Scenario,
+                    servicedesk_url: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for message_id in range(requests):
+        queue.put_nowait(message_id)
+
+    async def worker() -> None:
+        nonlocal errors
+        while not queue.empty():
+            message_id = queue.get_nowait()
+            question = make_question(scenario, servicedesk_url, message_id)
+            kernel = pool.view()
+            started = time.perf_counter()
+            try:
+                plan = await planner.create_plan(question.question, kernel=kernel, prompt=prompt)
+                await planner.execute_plan(plan, kernel, question, headers={}, execution_mode=scenario.execution_mode)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        "throughput_rps": round(len(latencies) / wall, 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from plugins.result_cache import set_result_cache
+
+    if not args.result_cache:
+        set_result_cache(None)
+    plugin_latency = LatencyDistribution.parse(args.plugin_latency)
+    fake_llm = FakeChatCompletion(
+        service_id="planner", ai_model_id="fake-gpt-4", latency=LatencyDistribution.parse(args.llm_latency), seed=args.seed,
+        plans={scenario.question: {"input": scenario.question, "subtasks": scenario.subtasks} for scenario in SCENARIOS.values()},
+    )
+    pool = KernelPool(lambda: build_kernel(fake_llm)).warm()
+    prompt = load_prompt(args.prompt)
+
+    results: Dict[str, Any] = {}
+    with rag_server(plugin_latency, args.payload_bytes, seed=args.seed) as rag, \
+            servicedesk_server(plugin_latency, args.payload_bytes, seed=args.seed + 1) as servicedesk:
+        os.environ["RAG_URL"] = rag.url(RAG_PATH)
+        servicedesk_url = servicedesk.url(SERVICEDESK_PATH)
+        for name in args.scenarios:
+            scenario = SCENARIOS[name]
+            planner = CustomBasicPlanner(service_id="planner", execution_mode=scenario.execution_mode,
+                                         plan_cache=PlanCache() if args.plan_cache else None)
+            # Warm-up: imports the lazy plugins and opens the pooled connections
+            await run_level(pool, planner, prompt, scenario, servicedesk_url, 2, 1)
+            results[name] = {}
+            for concurrency in args.concurrency:
+                level = await run_level(pool, planner, prompt, scenario, servicedesk_url, args.requests, concurrency)
+                results[name][str(concurrency)] = level
+                print(f"{name:<18}c={concurrency:<4}p50 {level['p50_ms']:>8.1f} ms  p95 {level['p95_ms']:>8.1f} ms  "
+                      f"p99 {level['p99_ms']:>8.1f} ms  {level['throughput_rps']:>8.1f} req/s  errors {level['errors']}")
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "llm_calls": fake_llm.calls,
+        "scenarios": results,
+        "methods": get_registry().summary(),
+        "endpoints": AsyncRequester.shared().endpoints.stats(),
+        "coalescing": coalescing_stats(),
+        "context_budget": get_context_budget().stats(),
+        "llm_usage": usage_stats(),
+        "prompt_cache": get_prompt_cache().stats(),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    if not args.logs:
+        custom_logs.configure_logging(mode="queue", stream=open(os.devnull, "w"))
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end latency and throughput benchmark")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--llm-latency", default="lognormal:300:0.3", help="fake LLM latency distribution (ms)")
+    parser.add_argument("--plugin-latency", default="lognormal:40:0.5", help="stub services latency distribution (ms)")
+    parser.add_argument("--payload-bytes", type=int, default=2048, help="stub services response size")
+    parser.add_argument("--plan-cache", action="store_true", help="enable the planner plan cache")
+    parser.add_argument("--result-cache", action="store_true", help="keep the plugin result cache enabled")
+    parser.add_argument("--prompt", default=PROMPT_PATH, help="planner prompt file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--logs", action="store_true", help="keep application logs on stderr")
+    parser.add_argument("--output", default=None, help="JSON results file")
+    main(parser.parse_args())
@@ -0,0 +1,38 @@
+"""
+Per-request kernel setup cost: building a kernel with sk_utils (as the demos did for every run)
+against taking a view from a warmed utils.kernel_pool.KernelPool.
+
+    python -m benchmarks.bench_kernel_pool --iterations 200
+"""
+# Standard imports
+import time
+import argparse
+from typing import Callable
+
+# Internal imports
+from utils.kernel_pool import KernelPool, build_kernel
+
+
+def per_call_us(setup: Callable[[], object], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        setup()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main(args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    pool = KernelPool().warm()
+    print(f"template built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    build_us = per_call_us(build_kernel, args.iterations)
+    view_us = per_call_us(pool.view, args.iterations * 10)
+    print(f"{'get_kernel_router + load_plugins':<36}{build_us:>12.1f} us/request")
+    print(f"{'KernelPool.view':<36}{view_us:>12.1f} us/request")
+    print(f"speedup x{build_us / view_us:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kernel setup microbenchmark")
+    parser.add_argument("--iterations", type=int, default=200)
+    main(parser.parse_args())
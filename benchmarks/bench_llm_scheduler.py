@@ -0,0 +1,89 @@
+"""
+Burst of chat completions against the rate limited local OpenAI server
+(benchmarks.fake_openai_server), through the real OpenAI connector:
+
+    unscheduled  every call retries 429s on its own (openai client default, 2 retries)
+    scheduled    calls go through utils.llm_scheduler (budgets, priorities, shared backoff)
+
+Most calls are background work of one busy domain, the rest are final answers of other
+domains. Reports successes, failures, 429s seen by the server and latency per priority.
+
+    python -m benchmarks.bench_llm_scheduler --calls 120 --rpm 120
+"""
+# Standard imports
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, List, Optional
+
+# Third party
+from openai import AsyncOpenAI
+from semantic_kernel.connectors.ai.open_ai.services.open_ai_chat_completion import OpenAIChatCompletion
+from semantic_kernel.contents.chat_history import ChatHistory
+
+# Internal imports
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.stub_servers import LatencyDistribution
+from utils import custom_logs
+from utils.batch_runner import percentile
+from utils.llm_scheduler import BACKGROUND, FINAL_ANSWER, PRIORITY_NAMES, LLMScheduler, SchedulingChatCompletion, llm_call_context
+
+
+async def burst(service: Any, calls: int, final_every: int) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {}
+    failures = 0
+    settings = service.get_prompt_execution_settings_class()(service_id="planner", max_tokens=64)
+
+    async def call(index: int) -> None:
+        nonlocal failures
+        final = index % final_every == 0
+        priority, domain = (FINAL_ANSWER, index % 3 + 2) if final else (BACKGROUND, 1)
+        history = ChatHistory()
+        history.add_user_message(f"Question {index}: summarize the wifi incidences of domain {domain}.")
+        started = time.perf_counter()
+        try:
+            with llm_call_context(priority=priority, domain=domain):
+                await service.complete_chat(history, settings)
+        except Exception:
+            failures += 1
+            return
+        latencies.setdefault(PRIORITY_NAMES[priority], []).append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(index) for index in range(calls)))
+    report: Dict[str, Any] = {"wall_s": round(time.perf_counter() - started, 2), "failures": failures}
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        report[name] = {"ok": len(values), "p50_s": round(percentile(values, 0.5), 2), "p95_s": round(percentile(values, 0.95), 2)}
+    return report
+
+
+def run(mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    with FakeOpenAIServer(rpm=args.rpm, tpm=args.tpm, burst_s=args.burst_s, latency=LatencyDistribution.parse(args.latency)) as server:
+        client = AsyncOpenAI(api_key="fake", base_url=server.base_url, max_retries=0 if mode == "scheduled" else 2)
+        service: Any = OpenAIChatCompletion(service_id="planner", ai_model_id="gpt-4", async_client=client)
+        scheduler: Optional[LLMScheduler] = None
+        if mode == "scheduled":
+            # A little under the server limits, the shared backoff handles the rest
+            scheduler = LLMScheduler(requests_per_minute=args.rpm * 0.95, tokens_per_minute=(args.tpm or 1e9) * 0.95, burst_s=args.burst_s)
+            service = SchedulingChatCompletion(service, scheduler)
+        report = asyncio.run(burst(service, args.calls, args.final_every))
+        report["server_429"] = server.rate_limited
+        report["server_completed"] = server.completed
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat completion burst with and without the LLM scheduler")
+    parser.add_argument("--calls", type=int, default=120)
+    parser.add_argument("--rpm", type=float, default=120, help="server requests per minute")
+    parser.add_argument("--tpm", type=float, default=None, help="server tokens per minute")
+    parser.add_argument("--burst-s", type=float, default=5.0, help="seconds of the server budget spendable at once")
+    parser.add_argument("--latency", default="constant:50", help="server completion latency (ms)")
+    parser.add_argument("--final-every", type=int, default=5, help="one call in N is a final answer, the rest background")
+    parser.add_argument("--modes", nargs="+", choices=["unscheduled", "scheduled"], default=["unscheduled", "scheduled"])
+    args = parser.parse_args()
+
+    custom_logs.configure_logging(mode="sync", stream=open("/dev/null", "w"))
+    for mode in args.modes:
+        print(f"{mode:<12} {run(mode, args)}")
@@ -0,0 +1,73 @@
+"""
+Time spent inside logger calls by coroutines when stderr is slow (a pipe being drained by a
+busy collector, a terminal): sync handler against the queue mode of utils.custom_logs.
+
+    python -m benchmarks.bench_logging --records 2000 --write-delay-ms 0.2
+"""
+# Standard imports
+import io
+import time
+import asyncio
+import argparse
+import threading
+
+# Internal imports
+from utils import custom_logs
+
+
+class SlowStream(io.StringIO):
+    """
+    Stream whose writes take `delay` seconds, like a blocked pipe.
+    """
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        with self._lock:
+            self.lines += text.count("\n")
+        return len(text)
+
+
+async def log_burst(records: int, tasks: int) -> float:
+    """
+    Seconds the event loop spent inside logger.info for `records` records from `tasks` coroutines.
+    """
+    logger = custom_logs.getLogger("bench_logging")
+    blocked = 0.0
+
+    async def worker(worker_id: int) -> None:
+        nonlocal blocked
+        for index in range(records // tasks):
+            started = time.perf_counter()
+            logger.info("worker %d record %d: %s", worker_id, index, {"question": "lista las incidencias wifi"})
+            blocked += time.perf_counter() - started
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(tasks)))
+    return blocked
+
+
+def main(args: argparse.Namespace) -> None:
+    print(f"{args.records} records, stderr write {args.write_delay_ms} ms")
+    print(f"{'mode':<14}{'format':<8}{'loop blocked ms':>16}{'us/record':>12}{'written':>10}")
+    for mode in ("sync", "queue"):
+        for log_format in ("text", "json"):
+            stream = SlowStream(args.write_delay_ms / 1000)
+            custom_logs.configure_logging(mode=mode, log_format=log_format, stream=stream)
+            blocked = asyncio.run(log_burst(args.records, args.tasks))
+            # Stopping the listener drains the queue
+            custom_logs.configure_logging(mode="sync", stream=io.StringIO())
+            print(f"{mode:<14}{log_format:<8}{blocked * 1000:>16.1f}{blocked / args.records * 1e6:>12.1f}{stream.lines:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Logging pipeline microbenchmark")
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--write-delay-ms", type=float, default=0.2)
+    main(parser.parse_args())
@@ -0,0 +1,102 @@
+"""
+Microbenchmark of plan extraction: utils.plan_parser.parse_plan against the previous
+recursive regex + unicode_escape approach, on large and adversarial completions.
+
+    python -m benchmarks.bench_plan_parser --repeat 5
+"""
+# Standard imports
+import json
+import time
+import argparse
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Internal imports
+from utils.plan_parser import parse_plan
+
+PLAN = {
+    "input": "¿Cuál es la ciudad más poblada de Europa y qué incidencias tiene José?",
+    "subtasks": [
+        {"function": "cities_db.get_cities", "args": {"filter": {"population": "max(population)", "continent": "Europe"}}},
+        {"function": "rag.ask_rag", "args": {"question": "Datos de la ciudad {$step1}"}},
+    ],
+}
+
+
+def legacy_parse(completion: str) -> Dict[str, Any]:
+    """
+    The extraction CustomBasicPlanner.parse_generated_plan used before utils.plan_parser.
+    """
+    import regex
+    json_regex = r"\{(?:[^{}]|(?R))*\}"
+    generated_plan_string = regex.search(json_regex, completion).group()
+    decoded_string = generated_plan_string.encode("utf-8").decode("unicode_escape")
+    return json.loads(decoded_string)
+
+
+def completions(scale: int) -> List[Tuple[str, str]]:
+    plan = json.dumps(PLAN, ensure_ascii=False, indent=2)
+    big_plan = dict(PLAN, subtasks=PLAN["subtasks"] * (scale // 10))
+    prose = "Here is the plan you asked for, following the format. " * (scale // 10)
+    return [
+        ("small", f"Sure:\n```json\n{plan}\n```"),
+        ("escaped", json.dumps(plan, ensure_ascii=False)[1:-1]),
+        ("long_prose", f"{prose}\n{plan}\n{prose}"),
+        ("many_subtasks", json.dumps(big_plan, ensure_ascii=False)),
+        ("braces_in_prose", "{note} " * scale + plan),
+        ("unclosed_braces", "{ " * scale + plan),
+    ]
+
+
+def _timed(parser: Callable[[str], Dict[str, Any]], completion: str, repeat: int, queue: "multiprocessing.Queue") -> None:
+    try:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = parser(completion)
+        queue.put(((time.perf_counter() - started) / repeat * 1000, result == PLAN or result.get("input") == PLAN["input"], None))
+    except Exception as exc:
+        queue.put((None, False, f"{type(exc).__name__}: {exc}"[:80]))
+
+
+def measure(parser: Callable[[str], Dict[str, Any]], completion: str, repeat: int, timeout: float) -> Tuple[Optional[float], bool, Optional[str]]:
+    """
+    Mean milliseconds per parse, whether the plan came out intact and the error if any.
+    Runs in a child process so a catastrophic backtrack is cut at the timeout.
+    """
+    queue: "multiprocessing.Queue" = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_timed, args=(parser, completion, repeat, queue))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return None, False, f"timeout after {timeout}s"
+    return queue.get()
+
+
+def main(args: argparse.Namespace) -> None:
+    parsers = [("plan_parser", parse_plan)]
+    try:
+        import regex  # noqa: F401
+        parsers.append(("legacy_regex", legacy_parse))
+    except ImportError:
+        print("regex is not installed, skipping the legacy parser")
+
+    print(f"{'case':<18}{'chars':>10}  " + "".join(f"{name:>30}" for name, _ in parsers))
+    for case, completion in completions(args.scale):
+        cells = []
+        for _, parser in parsers:
+            elapsed_ms, intact, error = measure(parser, completion, args.repeat, args.timeout)
+            if error:
+                cells.append(error[:28])
+            else:
+                cells.append(f"{elapsed_ms:.3f} ms{'' if intact else ' (corrupted)'}")
+        print(f"{case:<18}{len(completion):>10}  " + "".join(f"{cell:>30}" for cell in cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan extraction microbenchmark")
+    parser.add_argument("--scale", type=int, default=2000, help="size factor of the adversarial completions")
+    parser.add_argument("--repeat", type=int, default=5, help="parses per measurement")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds before a measurement is abandoned")
+    main(parser.parse_args())
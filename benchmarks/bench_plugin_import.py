@@ -0,0 +1,83 @@
+"""
+Catalog loading cost for a tenant with dozens of plugins: CustomKernel.import_plugin_from_object
+without the per-class metadata cache (every import introspects the class), with it, and the bulk
+CustomKernel.import_plugins.
+
+    python -m benchmarks.bench_plugin_import --plugins 40 --functions 6
+"""
+# Standard imports
+import time
+import argparse
+from typing import Annotated, Any, Callable, Dict, List
+
+# Third party
+from semantic_kernel.functions import kernel_function
+
+# Internal imports
+from utils.custom_kernel import CustomKernel, PluginSpec, clear_plugin_metadata_cache
+
+
+def make_plugin_class(index: int, functions: int) -> type:
+    """
+    Plugin class shaped like the repo plugins: annotated kernel functions, sync and async.
+    """
+    namespace: Dict[str, Any] = {}
+    for number in range(functions):
+        if number % 2:
+            async def method(self, question: Annotated[str, "question to answer"],
+                             limit: Annotated[int, "max results"] = 10) -> Annotated[str, "answer"]:
+                return question
+        else:
+            def method(self, filter: Annotated[Dict[str, str], "filters in dict format"],
+                       headers: Annotated[Dict[str, str], "request headers"] = None) -> Annotated[List[str], "rows"]:
+                return []
+        namespace[f"function_{number}"] = kernel_function(name=f"function_{number}", description=f"Function {number} of plugin {index}")(method)
+    return type(f"Plugin{index}", (), namespace)
+
+
+def specs(classes: List[type]) -> List[PluginSpec]:
+    return [PluginSpec(plugin_class(), f"plugin_{index}", f"Plugin number {index}") for index, plugin_class in enumerate(classes)]
+
+
+def one_by_one(classes: List[type], cached: bool) -> None:
+    kernel = CustomKernel()
+    for spec in specs(classes):
+        if not cached:
+            clear_plugin_metadata_cache()
+        kernel.import_plugin_from_object(spec.instance, plugin_name=spec.name, plugin_description=spec.description)
+
+
+def bulk(classes: List[type]) -> None:
+    CustomKernel().import_plugins(specs(classes))
+
+
+def per_catalog_ms(load: Callable[[], None], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        load()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main(args: argparse.Namespace) -> None:
+    classes = [make_plugin_class(index, args.functions) for index in range(args.plugins)]
+    print(f"{args.plugins} plugins x {args.functions} functions")
+
+    uncached = per_catalog_ms(lambda: one_by_one(classes, cached=False), args.repeat)
+    clear_plugin_metadata_cache()
+    cold = per_catalog_ms(lambda: bulk(classes), 1)
+    cached = per_catalog_ms(lambda: one_by_one(classes, cached=True), args.repeat)
+    bulk_cached = per_catalog_ms(lambda: bulk(classes), args.repeat)
+
+    print(f"{'import_plugin_from_object, no cache':<40}{uncached:>10.2f} ms/catalog")
+    print(f"{'import_plugins, first load':<40}{cold:>10.2f} ms/catalog")
+    print(f"{'import_plugin_from_object, cached':<40}{cached:>10.2f} ms/catalog")
+    print(f"{'import_plugins, cached':<40}{bulk_cached:>10.2f} ms/catalog")
+    print(f"speedup x{uncached / bulk_cached:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plugin catalog import microbenchmark")
+    parser.add_argument("--plugins", type=int, default=40)
+    parser.add_argument("--functions", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
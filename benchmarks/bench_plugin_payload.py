@@ -0,0 +1,94 @@
+"""
+Allocations and time per plugin request payload: the previous linear lookup + deepcopy +
+model_dump_json (twice, with the debug log) against Question.plugin_conf / plugin_payload.
+
+    python -m benchmarks.bench_plugin_payload --plugins 20 --config-keys 2000
+"""
+# Standard imports
+import copy
+import time
+import argparse
+import tracemalloc
+from typing import Callable, Tuple
+
+# Internal imports
+from utils.input_model import Question
+
+
+def make_question(plugins: int, config_keys: int) -> Question:
+    return Question(
+        user_id=7, message_id=7, chat_id=4, domain_id=1, question="lista las incidencias wifi de la oficina de Málaga",
+        plugins=[{
+            "name": f"Plugin{index}" if index else "ServiceDesk",
+            "url": f"http://localhost:9001/plugin/{index}",
+            "configuration": {f"setting_{key}": {"value": key, "tags": ["a", "b", "c"]} for key in range(config_keys)},
+        } for index in reversed(range(plugins))],
+    )
+
+
+def legacy_payload(question: Question, plugin_name: str = "servicedesk") -> bytes:
+    """
+    What OrchestratorPlugin.send_request_plugin did before the plugin config index.
+    """
+    plugin_conf = None
+    for plugin in question.plugins:
+        if plugin.name.lower() == plugin_name:
+            plugin_conf = plugin
+            break
+    formated_question = copy.deepcopy(question)
+    formated_question.plugins = [plugin_conf]
+    # The debug log line serialized the full question even with debug disabled
+    _ = f"requesting to{plugin_conf.url}, with data: {question.model_dump_json()}"
+    return formated_question.model_dump_json().encode("utf-8")
+
+
+def indexed_payload(question: Question, plugin_name: str = "servicedesk") -> bytes:
+    return question.plugin_payload(question.plugin_conf(plugin_name))
+
+
+def rewritten_payload(question: Question) -> bytes:
+    """
+    The question text changes between steps (question_updater), so the scalar part is rebuilt.
+    """
+    question.question = question.question[::-1]
+    return indexed_payload(question)
+
+
+def measure(build: Callable[[Question], bytes], question: Question, calls: int) -> Tuple[float, float]:
+    """
+    (us per call, peak KiB allocated by one call) after a warm-up call on the same request.
+    """
+    build(question)
+    started = time.perf_counter()
+    for _ in range(calls):
+        build(question)
+    elapsed_us = (time.perf_counter() - started) / calls * 1e6
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    payload = build(question)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del payload
+    return elapsed_us, (peak - before) / 1024
+
+
+def main(args: argparse.Namespace) -> None:
+    question = make_question(args.plugins, args.config_keys)
+    assert legacy_payload(question) == indexed_payload(question), "payloads differ"
+    print(f"{args.plugins} plugins, {args.config_keys} configuration keys each, "
+          f"{len(indexed_payload(question)) / 1024:.0f} KiB sent per plugin request")
+    print(f"{'':<24}{'us/call':>12}{'peak KiB/call':>16}")
+    for name, build in (("deepcopy (before)", legacy_payload),
+                        ("indexed (after)", indexed_payload),
+                        ("indexed, new question", rewritten_payload)):
+        elapsed_us, peak_kib = measure(build, question, args.calls)
+        print(f"{name:<24}{elapsed_us:>12.1f}{peak_kib:>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plugin request payload microbenchmark")
+    parser.add_argument("--plugins", type=int, default=20)
+    parser.add_argument("--config-keys", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=200)
+    main(parser.parse_args())
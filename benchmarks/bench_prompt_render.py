@@ -0,0 +1,102 @@
+"""
+Microbenchmark of the prompt work done per request, on a kernel view with every plugin loaded
+(no LLM call):
+
+    planner          BasicPlanner.create_plan: build the planner function from the prompt,
+                     register it, build the function manual and render the template
+    planner_cached   CustomBasicPlanner: compiled planner function of the catalog (see
+                     utils.prompt_cache), only the goal is rendered
+    updater          question_updater prompt parsed and rendered on every call
+    updater_cached   question_updater template parsed once, only rendered
+
+Also checks the compiled planner prompt renders the same text as the full template.
+
+    python -m benchmarks.bench_prompt_render --requests 2000
+"""
+# Standard imports
+import time
+import asyncio
+import argparse
+from typing import Awaitable, Callable, Dict
+
+# Third party
+import semantic_kernel as sk
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.planners.basic_planner import BasicPlanner
+from semantic_kernel.prompt_template.kernel_prompt_template import KernelPromptTemplate
+
+# Internal imports
+from benchmarks.bench_e2e import PROMPT_PATH
+from benchmarks.fake_llm import FakeChatCompletion
+from utils import custom_logs
+from utils.custom_planner import CustomBasicPlanner
+from utils.kernel_pool import KernelPool, build_kernel
+from utils.prompt_cache import function_manual, load_prompt
+
+GOAL = "Which is the most populated city in Europe and which incidences does it have?"
+PREVIOUS_OUTPUT = "['Istanbul']"
+
+
+async def per_request_us(step: Callable[[], Awaitable[object]], requests: int) -> float:
+    await step()
+    started = time.perf_counter()
+    for _ in range(requests):
+        await step()
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def run(args: argparse.Namespace) -> Dict[str, object]:
+    pool = KernelPool(lambda: build_kernel(FakeChatCompletion(service_id="planner", ai_model_id="gpt-4"))).warm()
+    prompt = load_prompt(args.prompt)
+    basic_planner = BasicPlanner(service_id="planner")
+    planner = CustomBasicPlanner(service_id="planner")
+
+    async def planner_step() -> str:
+        kernel = pool.view()
+        function = kernel.create_function_from_prompt(
+            plugin_name="PlannerPlugin", function_name="CreatePlan",
+            prompt_template_config=sk.PromptTemplateConfig(
+                template=prompt, execution_settings=PromptExecutionSettings(service_id="planner", max_tokens=1000, temperature=0.8)))
+        manual = basic_planner._create_available_functions_string(kernel)
+        return await function.prompt_template.render(kernel, KernelArguments(goal=GOAL, available_functions=manual))
+
+    async def planner_cached_step() -> str:
+        kernel = pool.view()
+        function = planner.planner_function(kernel, prompt, planner.catalog_fingerprint(kernel, prompt))
+        return await function.prompt_template.render(kernel, KernelArguments(goal=GOAL))
+
+    updater = pool.view().func("question_updater", "question_updater")
+    updater_arguments = KernelArguments(question=GOAL, previous_output=PREVIOUS_OUTPUT)
+
+    async def updater_step() -> str:
+        return await KernelPromptTemplate(prompt_template_config=updater.prompt_template.prompt_template_config).render(
+            pool.template, updater_arguments)
+
+    async def updater_cached_step() -> str:
+        return await updater.prompt_template.render(pool.template, updater_arguments)
+
+    kernel = pool.view()
+    full = KernelPromptTemplate(prompt_template_config=sk.PromptTemplateConfig(template=prompt))
+    expected = await full.render(kernel, KernelArguments(goal=GOAL, available_functions=function_manual(kernel)))
+
+    report: Dict[str, object] = {
+        "prompt_chars": len(expected),
+        "identical": await planner_cached_step() == expected and await updater_step() == await updater_cached_step(),
+    }
+    for name, step in (("planner", planner_step), ("planner_cached", planner_cached_step),
+                       ("updater", updater_step), ("updater_cached", updater_cached_step)):
+        report[f"{name}_us"] = round(await per_request_us(step, args.requests), 1)
+    report["prompt_cache"] = planner.prompt_cache.stats()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per request prompt rendering cost, with and without compiled templates")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--prompt", default=PROMPT_PATH, help="planner prompt file")
+    args = parser.parse_args()
+
+    custom_logs.configure_logging(mode="sync", stream=open("/dev/null", "w"))
+    for key, value in asyncio.run(run(args)).items():
+        print(f"{key:<18} {value}")
@@ -0,0 +1,96 @@
+"""
+Deterministic chat completion service for offline runs, to pass to
+sk_utils.get_kernel_router(chat_service=...) in place of OpenAIChatCompletion.
+
+Planner prompts are answered with the canned plan of their goal (or a default plan), question
+update prompts with the question unchanged, anything else with a fixed answer. Latency is
+drawn from a seeded distribution and usage is reported as ~4 characters per token.
+"""
+# Standard imports
+import json
+import random
+import asyncio
+from types import SimpleNamespace
+from typing import Any, AsyncIterable, Dict, List, Optional
+
+# Third party
+from pydantic import PrivateAttr
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_role import ChatRole
+from semantic_kernel.contents.streaming_chat_message_content import StreamingChatMessageContent
+
+# Internal imports
+from benchmarks.stub_servers import LatencyDistribution
+
+DEFAULT_PLAN = {"input": "", "subtasks": [{"function": "rag.ask_rag", "args": {"question": ""}}]}
+
+
+def planner_goal(prompt: str) -> Optional[str]:
+    """
+    Goal of a planner prompt (the text between [GOAL] and [OUTPUT]), None for other prompts.
+    """
+    start = prompt.rfind("[GOAL]")
+    if start < 0:
+        return None
+    end = prompt.find("[OUTPUT]", start)
+    return prompt[start + len("[GOAL]"):end if end >= 0 else None].strip().strip('"')
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatCompletion(ChatCompletionClientBase):
+    """
+    Chat service returning canned plans, keyed by goal.
+    """
+    plans: Dict[str, Dict[str, Any]] = {}
+    default_plan: Dict[str, Any] = DEFAULT_PLAN
+    answer: str = "This is a canned answer."
+    latency: LatencyDistribution = LatencyDistribution()
+    seed: int = 0
+    calls: int = 0
+
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._rng = random.Random(self.seed)
+
+    def reply(self, prompt: str) -> str:
+        goal = planner_goal(prompt)
+        if goal is not None:
+            plan = dict(self.plans.get(goal, self.default_plan))
+            plan["input"] = plan.get("input") or goal
+            return json.dumps(plan, ensure_ascii=False)
+        if "I have the following Question:" in prompt:
+            # question_updater: keep the question
+            return prompt.split("I have the following Question:", 1)[1].split("And the following context:", 1)[0].strip().rstrip(".")
+        return self.answer
+
+    async def _wait(self) -> None:
+        self.calls += 1
+        delay_ms = self.latency.sample_ms(self._rng)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        await self._wait()
+        prompt = "\n".join(message.content or "" for message in chat_history.messages)
+        content = self.reply(prompt)
+        usage = SimpleNamespace(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(content))
+        return [ChatMessageContent(role=ChatRole.ASSISTANT, content=content, ai_model_id=self.ai_model_id,
+                                   metadata={"usage": usage})]
+
+    async def complete_chat_stream(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                                   **kwargs: Any) -> AsyncIterable[List[StreamingChatMessageContent]]:
+        await self._wait()
+        content = self.reply("\n".join(message.content or "" for message in chat_history.messages))
+        words = content.split(" ")
+        for index, word in enumerate(words):
+            yield [StreamingChatMessageContent(choice_index=0, role=ChatRole.ASSISTANT, ai_model_id=self.ai_model_id,
+                                               content=word if index == len(words) - 1 else word + " ")]
@@ -0,0 +1,170 @@
+"""
+Local OpenAI-compatible chat completion server (POST /v1/chat/completions) with its own
+requests-per-minute and tokens-per-minute limits, answering 429 with Retry-After past them
+like the real API. Replies come from benchmarks.fake_llm.
+
+    python -m benchmarks.fake_openai_server --rpm 60 --tpm 20000
+    OPENAI_BASE_URL=http://127.0.0.1:8080/v1 OPENAI_API_KEY=fake python -m utils.batch_runner ...
+
+Streaming requests are answered in one server-sent event chunk.
+"""
+# Standard imports
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler
+from typing import Annotated, Callable, Dict, Optional
+
+# Internal imports
+from benchmarks.fake_llm import FakeChatCompletion, estimate_tokens
+from benchmarks.stub_servers import BenchmarkHTTPServer, LatencyDistribution
+
+
+class _Limit:
+    """
+    Per minute budget, refilled continuously, of which at most `burst_s` seconds' worth can be
+    spent at once (OpenAI enforces its limits over windows shorter than a minute).
+    """
+
+    def __init__(self, per_minute: Optional[float], burst_s: float):
+        self.per_minute = per_minute
+        self.capacity = (per_minute or 0.0) * burst_s / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, amount: float) -> float:
+        """
+        Take `amount` and return 0, or the seconds until it would be available.
+        """
+        if not self.per_minute:
+            return 0.0
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+        if self.level >= min(amount, self.capacity):
+            self.level -= amount
+            return 0.0
+        return (min(amount, self.capacity) - self.level) * 60 / self.per_minute
+
+
+class FakeOpenAIServer:
+    """
+    Threaded chat completion server, run in a daemon thread when used as a context manager.
+    """
+
+    def __init__(self, reply: Annotated[Optional[Callable[[str], str]], "Completion of a prompt"] = None,
+                 rpm: Annotated[Optional[float], "Requests per minute before 429, None for no limit"] = None,
+                 tpm: Annotated[Optional[float], "Tokens per minute before 429, None for no limit"] = None,
+                 burst_s: Annotated[float, "Seconds of budget that can be spent at once"] = 60.0,
+                 latency: LatencyDistribution = LatencyDistribution(), port: int = 0, host: str = "127.0.0.1", seed: int = 0):
+        self.reply = reply or FakeChatCompletion(service_id="fake", ai_model_id="gpt-4").reply
+        self.latency = latency
+        self._requests = _Limit(rpm, burst_s)
+        self._tokens = _Limit(tpm, burst_s)
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.completed = 0
+        self.rate_limited = 0
+        self._server = BenchmarkHTTPServer((host, port), self._handler())
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _admit(self, tokens: int) -> float:
+        with self._lock:
+            wait = max(self._requests.take(1), self._tokens.take(tokens))
+            if wait > 0:
+                self.rate_limited += 1
+            return wait
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _send(self, status: int, body: bytes, headers: Dict[str, str]) -> None:
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self) -> None:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                prompt = "\n".join(str(message.get("content") or "") for message in request.get("messages", []))
+                prompt_tokens = estimate_tokens(prompt)
+                max_tokens = request.get("max_tokens") or 256
+                wait = server._admit(prompt_tokens + max_tokens)
+                if wait > 0:
+                    error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+                    self._send(429, json.dumps(error).encode("utf-8"), {
+                        "Content-Type": "application/json", "retry-after-ms": str(int(wait * 1000) + 1),
+                        "retry-after": str(int(wait) + 1)})
+                    return
+
+                with server._lock:
+                    delay_ms = server.latency.sample_ms(server._rng)
+                time.sleep(delay_ms / 1000)
+                content = server.reply(prompt)
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(content),
+                         "total_tokens": prompt_tokens + estimate_tokens(content)}
+                created = int(time.time())
+                with server._lock:
+                    server.completed += 1
+                if request.get("stream"):
+                    chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": request.get("model"),
+                             "choices": [{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": "stop"}]}
+                    body = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode("utf-8")
+                    self._send(200, body, {"Content-Type": "text/event-stream"})
+                    return
+                completion = {"id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": request.get("model"),
+                              "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                              "usage": usage}
+                self._send(200, json.dumps(completion).encode("utf-8"), {"Content-Type": "application/json"})
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeOpenAIServer":
+        threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible chat completion server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rpm", type=float, default=None, help="requests per minute before 429")
+    parser.add_argument("--tpm", type=float, default=None, help="tokens per minute before 429")
+    parser.add_argument("--burst-s", type=float, default=60.0, help="seconds of budget that can be spent at once")
+    parser.add_argument("--latency", default="lognormal:300:0.3", help="completion latency distribution (ms)")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(rpm=args.rpm, tpm=args.tpm, burst_s=args.burst_s, latency=LatencyDistribution.parse(args.latency),
+                          port=args.port) as server:
+        print(f"OpenAI-compatible server on {server.base_url}, Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
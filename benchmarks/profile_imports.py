@@ -0,0 +1,85 @@
+"""
+Cold-start breakdown of the orchestrator: runs each entry point in a fresh interpreter with
+`python -X importtime` and reports the slowest modules and the time per top-level package,
+plus the wall time to a ready kernel with lazy and eager plugin loading.
+
+    python -m benchmarks.profile_imports --top 15
+"""
+# Standard imports
+import os
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    "sk_utils": "import utils.sk_utils",
+    "custom_planner": "import utils.custom_planner",
+    "plugins (eager)": "import plugins.ServiceDesk.ServiceDesk, plugins.Invoices_db.InvoicesDB, plugins.Rag.Rag, plugins.CitiesDB.Cities",
+}
+
+# Kernel ready to plan, without the OpenAI service so no .env is needed
+KERNEL_READY = """
+import time
+started = time.perf_counter()
+from utils.custom_kernel import CustomKernel
+import utils.sk_utils as sk_utils
+kernel = CustomKernel()
+sk_utils.load_plugins(kernel, lazy={lazy})
+print(time.perf_counter() - started)
+"""
+
+
+def run(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    return subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    (module, self us, cumulative us) of every import line.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        modules.append((module.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def report(name: str, code: str, top: int) -> None:
+    modules = parse_importtime(run(code, importtime=True).stderr)
+    total_us = sum(self_us for _, self_us, _ in modules)
+    by_package: Dict[str, int] = defaultdict(int)
+    for module, self_us, _ in modules:
+        by_package[module.split(".")[0]] += self_us
+
+    print(f"\n== {name}: {total_us / 1000:.0f} ms, {len(modules)} modules")
+    print("  by package (self time):")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {package:<40}{self_us / 1000:>9.1f} ms {self_us / total_us:>6.1%}")
+    print("  slowest modules (self time):")
+    for module, self_us, cumulative_us in sorted(modules, key=lambda item: -item[1])[:top]:
+        print(f"    {module:<60}{self_us / 1000:>9.1f} ms  (cumulative {cumulative_us / 1000:.1f} ms)")
+
+
+def main(args: argparse.Namespace) -> None:
+    for name, code in ENTRY_POINTS.items():
+        report(name, code, args.top)
+
+    print("\n== kernel ready (fresh interpreter, median of runs)")
+    for lazy in (True, False):
+        timings = sorted(float(run(KERNEL_READY.format(lazy=lazy)).stdout.split()[-1]) for _ in range(args.runs))
+        print(f"    {'lazy' if lazy else 'eager':<8}{timings[len(timings) // 2] * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profiler for cold starts")
+    parser.add_argument("--top", type=int, default=10, help="rows per table")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per kernel timing")
+    main(parser.parse_args())
@@ -0,0 +1,182 @@
+"""
+Local stand-ins for the plugin microservices, with configurable latency and payload size:
+the Rag service (localhost:8000/domain) and the ServiceDesk service (localhost:9001/query).
+
+    python -m benchmarks.stub_servers --latency lognormal:40:0.5 --payload-bytes 2048
+
+Latencies are given as "constant:MS", "uniform:LOW_MS:HIGH_MS" or "lognormal:MEDIAN_MS:SIGMA".
+"""
+# Standard imports
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Annotated, Dict, Optional, Tuple
+
+RAG_PATH = "/domain"
+SERVICEDESK_PATH = "/query"
+
+
+class BenchmarkHTTPServer(ThreadingHTTPServer):
+    """
+    Threaded server with a listen backlog for bursts of concurrent connections (the default 5
+    resets them).
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    """
+    Response delay in milliseconds, drawn from a seeded generator so runs are repeatable.
+    """
+    kind: str = "constant"
+    params: Tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: Annotated[str, "constant:MS | uniform:LOW:HIGH | lognormal:MEDIAN:SIGMA"]) -> "LatencyDistribution":
+        kind, *params = spec.split(":")
+        expected = {"constant": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Invalid latency distribution {spec}")
+        return cls(kind, tuple(float(param) for param in params))
+
+    def sample_ms(self, rng: random.Random) -> float:
+        if self.kind == "constant":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+@dataclass
+class StubRoute:
+    """
+    Response of one stub endpoint: a JSON list of filler strings of about `payload_bytes`.
+    """
+    latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    payload_bytes: int = 512
+    status: int = 200
+    requests: int = 0
+
+    def body(self, request_bytes: int) -> bytes:
+        item = json.dumps(f"result for a {request_bytes} bytes request ")
+        count = max(1, self.payload_bytes // (len(item) + 1))
+        return ("[" + ",".join([item] * count) + "]").encode("utf-8")
+
+
+class StubServer:
+    """
+    Threaded HTTP server answering POST (and GET) requests on its routes.
+    Used as a context manager it runs in a daemon thread.
+    """
+
+    def __init__(self, routes: Annotated[Dict[str, StubRoute], "path -> route"], port: Annotated[int, "0 picks a free port"] = 0,
+                 host: str = "127.0.0.1", seed: Annotated[int, "Seed of the latency generator"] = 0):
+        self.routes = routes
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._bodies: Dict[Tuple[str, int], bytes] = {}
+        self._server = BenchmarkHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def url(self, path: str) -> str:
+        return f"http://{self._server.server_address[0]}:{self.port}{path}"
+
+    def _delay_ms(self, route: StubRoute) -> float:
+        with self._rng_lock:
+            return route.latency.sample_ms(self._rng)
+
+    def _body(self, path: str, route: StubRoute, request_bytes: int) -> bytes:
+        key = (path, request_bytes)
+        body = self._bodies.get(key)
+        if body is None:
+            body = self._bodies[key] = route.body(request_bytes)
+        return body
+
+    def _handler(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes, with Nagle a keep-alive client waits for the delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def _respond(self) -> None:
+                request_bytes = int(self.headers.get("Content-Length") or 0)
+                if request_bytes:
+                    self.rfile.read(request_bytes)
+                route = stub.routes.get(self.path.split("?", 1)[0])
+                if route is None:
+                    self.send_error(404)
+                    return
+                route.requests += 1
+                time.sleep(stub._delay_ms(route) / 1000)
+                body = stub._body(self.path, route, request_bytes)
+                self.send_response(route.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (a cancelled hedged request)
+                    self.close_connection = True
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"stub-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def rag_server(latency: LatencyDistribution, payload_bytes: int = 2048, port: int = 0, seed: int = 0) -> StubServer:
+    return StubServer({RAG_PATH: StubRoute(latency, payload_bytes)}, port=port, seed=seed)
+
+
+def servicedesk_server(latency: LatencyDistribution, payload_bytes: int = 1024, port: int = 0, seed: int = 1) -> StubServer:
+    return StubServer({SERVICEDESK_PATH: StubRoute(latency, payload_bytes)}, port=port, seed=seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the plugin stub servers on their real ports")
+    parser.add_argument("--latency", default="lognormal:40:0.5", help="latency distribution of both services")
+    parser.add_argument("--payload-bytes", type=int, default=2048)
+    parser.add_argument("--rag-port", type=int, default=8000)
+    parser.add_argument("--servicedesk-port", type=int, default=9001)
+    args = parser.parse_args()
+
+    latency = LatencyDistribution.parse(args.latency)
+    with rag_server(latency, args.payload_bytes, args.rag_port) as rag, \
+            servicedesk_server(latency, args.payload_bytes, args.servicedesk_port) as servicedesk:
+        print(f"Rag on {rag.url(RAG_PATH)}, ServiceDesk on {servicedesk.url(SERVICEDESK_PATH)}, Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
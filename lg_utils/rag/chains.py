@@ -6,8 +6,6 @@ from typing import Any, Dict, List
 import requests
 from langchain.chains.base import Chain
 
-# Setting up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
@@ -67,6 +65,7 @@ class HttpRequestChainRag(Chain):
 
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     chain = HttpRequestChain()
     input_data = {"url": "https://api.example.com/data", "method": "GET"}
     result = chain.run(input_data)
@@ -2,6 +2,7 @@ from typing import Annotated, Union
 from semantic_kernel.functions import kernel_function
 
 from utils.input_model import Question
+from plugins.result_cache import cached_plugin_read, invalidates_plugin_reads
 
 
 class InvoicesDB:
@@ -13,6 +14,7 @@ class InvoicesDB:
         description="Retrieve information about invoices and the users related to them.",
         name="get_invoices"
     )
+    @cached_plugin_read
     def get_invoices(self, question: Union[Annotated[str, "The input of the user"], Annotated[Question, "The input of the user"]]) -> Annotated[str, "List of invoices"]:
         data = question
         return f"requested invoices with question: {data}"
@@ -21,6 +23,7 @@ class InvoicesDB:
         description="Execute write operations on invoices like update, upsert on inserts.",
         name="upsert_invoices"
     )
+    @invalidates_plugin_reads("get_invoices")
     def upsert_invoices(self, question: Union[Annotated[str, "The input of the user"], Annotated[Question, "The input of the user"]]) -> Annotated[str, "Boolean telling if the operations was successful"]:
         data = question
         return f"requested write operations on invoices with question: {data}"
\ No newline at end of file
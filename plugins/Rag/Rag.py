@@ -1,13 +1,18 @@
+import os
 from typing import Annotated, Union, Optional, Dict
 from semantic_kernel.functions import kernel_function
 
 from utils.input_model import Question
 from plugins.orchestrator_plugins import OrchestratorPlugin
+from plugins.result_cache import cached_plugin_read
 from utils import custom_logs
-from request_utils.service_request import Requester
+from request_utils.resilience import CircuitOpenError
+from request_utils.service_request import AsyncRequester
 
 logger = custom_logs.getLogger("ServiceDeskPlugin")
 
+DEFAULT_RAG_URL = "http://localhost:8000/domain"
+
 
 class Rag(OrchestratorPlugin):
 
@@ -19,13 +24,17 @@ class Rag(OrchestratorPlugin):
         name="ask_rag"
     )
     
-    def ask_rag(self, question: Union[Annotated[str, "User question"], Annotated[Question, "User Question"]],
-                headers: Annotated[Optional[Dict[str, str]], "Headers to send to request"] = dict()) -> Annotated[str, "Response from request"]:
+    @cached_plugin_read
+    async def ask_rag(self, question: Union[Annotated[str, "User question"], Annotated[Question, "User Question"]],
+                      headers: Annotated[Optional[Dict[str, str]], "Headers to send to request"] = dict()) -> Annotated[str, "Response from request"]:
         data = question
         
-        url = f"http://localhost:8000/domain"
+        url = os.getenv("RAG_URL", DEFAULT_RAG_URL)
         
-        logger.info(f"entered rag url: {url} and headers: {headers}")
-        result = Requester.post(url=url, data=question.model_dump_json(), headers=headers, is_json=False)
-        return result.content
+        logger.info("entered rag url: %s and headers: %s", url, headers)
+        try:
+            result = await AsyncRequester.shared().post(url=url, data=question.model_dump_json(), headers=headers, is_json=False, hedge=True)
+        except CircuitOpenError as error:
+            return self.fallback_result(error)
+        return result.text
         # return f"requested rag with question: {data} It is the capital and largest city of the autonomous community of Catalonia"
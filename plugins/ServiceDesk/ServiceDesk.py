@@ -3,6 +3,7 @@ from semantic_kernel.functions import kernel_function
 from semantic_kernel.planners.basic_planner import Plan
 
 from plugins.orchestrator_plugins import OrchestratorPlugin
+from plugins.result_cache import cached_plugin_read
 from request_utils.service_request import Requester
 from utils.input_model import Question, Plugin
 from utils import custom_logs
@@ -20,7 +21,8 @@ class ServiceDesk(OrchestratorPlugin):
         name="get_incidences"
     )
     
-    def get_incidences(self, question: Union[Annotated[str, "List the incidences"], Annotated[Question, "List the incidences"]], headers: Annotated[Optional[Dict[str, str]], "Headers to send to request"] = dict()) -> Annotated[str, "List of incidences"]:
+    @cached_plugin_read
+    async def get_incidences(self, question: Union[Annotated[str, "List the incidences"], Annotated[Question, "List the incidences"]], headers: Annotated[Optional[Dict[str, str]], "Headers to send to request"] = dict()) -> Annotated[str, "List of incidences"]:
         if not isinstance(question, Question):
             raise Exception("No service desk plugin was specified")
         
@@ -31,6 +33,6 @@ class ServiceDesk(OrchestratorPlugin):
         # headers = {}
         # logger.debug(f"requesting to{url}, with data: {question.model_dump_json()}")
         # result = Requester.post(url=url, data=question.model_dump_json(), headers=headers, is_json=False)
-        logger.info(f"headers: {headers}")
-        result = self.send_request_plugin(question=question, headers=headers)
-        return str(result)
+        logger.info("headers: %s", headers)
+        # A read: hedged, and the fallback result is returned as is (not cached)
+        return await self.send_request_plugin_async(question=question, headers=headers, hedge=True)
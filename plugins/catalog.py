@@ -0,0 +1,75 @@
+# Standard imports
+import sys
+from typing import Annotated, Dict, List
+
+# Internal imports
+from utils.lazy_plugins import LazyFunction, LazyParameter, LazyPluginSpec, import_plugin_functions, spec_mismatches
+
+QUESTION = LazyParameter(name="question", type="str, Question")
+HEADERS = LazyParameter(name="headers", description="Headers to send to request", type="str, str", is_required=False, default_value={})
+
+# Visible plugins declared by import path, they are imported when the planner first uses one of their functions.
+# Keep the declared functions in sync with the @kernel_function decorators: a mismatch fails the plugin load,
+# check them with `python -m plugins.catalog` (run by plugins/test_catalog.py).
+PLUGIN_CATALOG = (
+    LazyPluginSpec(
+        name="sevicedesk",
+        description="Provide information about incidences through the ServiceDesk ticketing service",
+        import_path="plugins.ServiceDesk.ServiceDesk:ServiceDesk",
+        functions=(
+            LazyFunction(name="get_incidences", description="Get and list incidences using the ticketing service ServiceDesk",
+                         parameters=(QUESTION, HEADERS), return_description="List of incidences"),
+        ),
+    ),
+    LazyPluginSpec(
+        name="invoices",
+        description="Retrieve information about invoices and the users related to them. Execute write operations on invoices like update, upsert on inserts.",
+        import_path="plugins.Invoices_db.InvoicesDB:InvoicesDB",
+        functions=(
+            LazyFunction(name="get_invoices", description="Retrieve information about invoices and the users related to them.",
+                         parameters=(QUESTION,), return_description="List of invoices"),
+            LazyFunction(name="upsert_invoices", description="Execute write operations on invoices like update, upsert on inserts.",
+                         parameters=(QUESTION,), return_description="Boolean telling if the operations was successful"),
+        ),
+    ),
+    LazyPluginSpec(
+        name="rag",
+        description="Default plugin to call when no other plugin can be used. Any information not provided by other functions are meant to be retrieved from here.",
+        import_path="plugins.Rag.Rag:Rag",
+        functions=(
+            LazyFunction(name="ask_rag", description="Default plugin to call when no other plugin can be used. Any information not provided by other functions are meant to be retrieved from here.",
+                         parameters=(QUESTION, HEADERS), return_description="Response from request"),
+        ),
+    ),
+    LazyPluginSpec(
+        name="cities_db",
+        description="Plugin useful to retrieve cities based on some filters.",
+        import_path="plugins.CitiesDB.Cities:CitiesDB",
+        functions=(
+            LazyFunction(name="get_cities", description="Get the cities based on locations (for example countries or continents), population, etc..",
+                         parameters=(LazyParameter(name="filter", type="str, str",
+                                                   description="filters in dict format with the information to filter. Here are some examples {'population': 'max(population)', 'continent': 'Europe'}. {'population': '>5000'}"),),
+                         return_description="List of cities"),
+        ),
+    ),
+)
+
+
+def catalog_mismatches() -> Annotated[Dict[str, List[str]], "differences by plugin name, empty when the catalog matches"]:
+    """
+    Import every declared plugin and compare its declared metadata with its kernel functions.
+    """
+    mismatches = {}
+    for spec in PLUGIN_CATALOG:
+        found = spec_mismatches(spec, import_plugin_functions(spec))
+        if found:
+            mismatches[spec.name] = found
+    return mismatches
+
+
+if __name__ == "__main__":
+    found = catalog_mismatches()
+    for name, mismatches in found.items():
+        for mismatch in mismatches:
+            print(f"{name}: {mismatch}")
+    sys.exit(1 if found else 0)
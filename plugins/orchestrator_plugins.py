@@ -1,10 +1,11 @@
-import copy
+import logging
 from abc import ABC, ABCMeta
 from typing import Annotated, Optional
 
 from utils.input_model import Question, Plugin
 from utils import custom_logs
-from request_utils.service_request import Requester
+from request_utils.resilience import CircuitOpenError, FallbackResult
+from request_utils.service_request import Requester, AsyncRequester
 
 
 logger = custom_logs.getLogger('OrchestratorPlugin')
@@ -30,23 +31,52 @@ class OrchestratorPlugin(metaclass=PluginMeta):
         Retrieve the configuration for the plugin, looking for a plugin
         whose name matches this class's name.
         """
-        plugin_name = self._class_name.lower()
-        for plugin in question.plugins:
-            if plugin.name.lower() == plugin_name:
-                return plugin
-        return None
+        return question.plugin_conf(self._class_name)
+
+    def fallback_result(self, error: Annotated[CircuitOpenError, "Why the service was not called"]) -> Annotated[FallbackResult, "Answer used instead of the service's"]:
+        """
+        Result returned at once while the circuit of the plugin service is open.
+        """
+        logger.warning("%s unavailable, answering with the fallback result: %s", self._class_name, error)
+        return FallbackResult(f"The {self._class_name} service is temporarily unavailable, no results could be retrieved.")
 
     def send_request_plugin(self, question: Annotated[Question, "List the incidences"], headers: Optional[Annotated[dict, "Headers for the request"]] = {}) -> Annotated[str, "Response from microservice"]:
         """
-        Default request to all microservices
+        Default request to all microservices, sync variant of send_request_plugin_async.
+        Answers with fallback_result while the circuit of the service is open.
         """
 
         plugin_conf: Plugin = self.get_plugin_conf(question)
-        formated_question = copy.deepcopy(question)
-        formated_question.plugins = [plugin_conf]
+        payload = question.plugin_payload(plugin_conf)
 
         url = plugin_conf.url
         
-        logger.debug(f"requesting to{url}, with data: {question.model_dump_json()}")
-        result = Requester.post(url=url, data=formated_question.model_dump_json(), headers=headers, is_json=False)
-        return str(result)
\ No newline at end of file
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("requesting to%s, with data: %s", url, payload.decode("utf-8"))
+        try:
+            result = Requester.post(url=url, data=payload, headers=headers, is_json=False)
+        except CircuitOpenError as error:
+            return self.fallback_result(error)
+        return result.text
+
+    async def send_request_plugin_async(self, question: Annotated[Question, "List the incidences"], headers: Optional[Annotated[dict, "Headers for the request"]] = None,
+                                        requester: Optional[Annotated[AsyncRequester, "Requester to use, defaults to the shared pooled one"]] = None,
+                                        hedge: Annotated[bool, "Hedge the request, only for idempotent reads"] = False) -> Annotated[str, "Response from microservice"]:
+        """
+        Default request to all microservices, sent through the pooled AsyncRequester.
+        Answers with fallback_result while the circuit of the service is open.
+        """
+
+        plugin_conf: Plugin = self.get_plugin_conf(question)
+        payload = question.plugin_payload(plugin_conf)
+
+        url = plugin_conf.url
+        requester = requester or AsyncRequester.shared()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("requesting to%s, with data: %s", url, payload.decode("utf-8"))
+        try:
+            result = await requester.post(url=url, data=payload, headers=headers or {}, is_json=False, hedge=hedge)
+        except CircuitOpenError as error:
+            return self.fallback_result(error)
+        return result.text
\ No newline at end of file
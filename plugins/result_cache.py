@@ -0,0 +1,307 @@
+# Standard imports
+import sys
+import json
+import time
+import hashlib
+import functools
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from inspect import iscoroutinefunction
+from typing import Annotated, Any, Callable, Dict, Iterable, Optional, Set, Tuple, Union
+
+# Internal imports
+from request_utils.resilience import FallbackResult
+from utils.input_model import Question
+from utils.plan_cache import normalize_question
+from utils.singleflight import get_singleflight
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+
+class ResultCache(ABC):
+    """
+    Interface of the plugin result cache, implement it to plug another backend (redis...).
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value)."""
+
+    @abstractmethod
+    def set(self, key: str, plugin: str, function: str, value: Any) -> None:
+        """Store a value produced by plugin.function."""
+
+    @abstractmethod
+    def invalidate(self, plugin: str, functions: Optional[Iterable[str]] = None) -> int:
+        """Drop the entries of a plugin (optionally only some functions), return how many were removed."""
+
+
+@dataclass
+class _ResultEntry:
+    value: Any
+    plugin: str
+    function: str
+    size: int
+    expires_at: float
+
+
+class InMemoryResultCache(ResultCache):
+    """
+    LRU result cache bounded by entries and approximate bytes, with per-plugin TTLs.
+    """
+
+    def __init__(self, default_ttl: Annotated[float, "TTL in seconds for plugins without a specific one"] = 60.0,
+                 plugin_ttls: Annotated[Optional[Dict[str, float]], "TTL in seconds per plugin name"] = None,
+                 max_entries: Annotated[int, "Maximum number of entries"] = 4096,
+                 max_bytes: Annotated[int, "Approximate memory bound of the cached values"] = 32 * 1024 * 1024,
+                 clock: Annotated[Callable[[], float], "Monotonic clock"] = time.monotonic):
+        self.default_ttl = default_ttl
+        self.plugin_ttls = {name.lower(): ttl for name, ttl in (plugin_ttls or {}).items()}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[str, _ResultEntry]" = OrderedDict()
+        self._keys_by_plugin: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        keys = self._keys_by_plugin.get(entry.plugin)
+        if keys is not None:
+            keys.discard(key)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= self._clock():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry.value
+
+    def set(self, key: str, plugin: str, function: str, value: Any) -> None:
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        ttl = self.plugin_ttls.get(plugin, self.default_ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _ResultEntry(value=value, plugin=plugin, function=function, size=size,
+                                              expires_at=self._clock() + ttl)
+            self._keys_by_plugin.setdefault(plugin, set()).add(key)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, plugin: str, functions: Optional[Iterable[str]] = None) -> int:
+        functions = set(functions) if functions is not None else None
+        with self._lock:
+            keys = [key for key in self._keys_by_plugin.get(plugin, ())
+                    if functions is None or self._entries[key].function in functions]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        if keys:
+            logger.debug("Invalidated %d cached results of plugin %s", len(keys), plugin)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_plugin.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+
+_result_cache: Optional[ResultCache] = InMemoryResultCache()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    return _result_cache
+
+
+def set_result_cache(cache: Annotated[Optional[ResultCache], "Cache to use, None disables result caching"]) -> None:
+    global _result_cache
+    _result_cache = cache
+
+
+def plugin_name_of(plugin_instance: Any) -> str:
+    """
+    Name used for the plugin in the cache and in Question.plugins, the lowercased class name.
+    """
+    return getattr(plugin_instance, "_class_name", None) or type(plugin_instance).__name__.lower()
+
+
+def headers_digest(headers: Annotated[Optional[Dict[str, str]], "headers sent to the plugin service"]) -> Annotated[str, "hash of the headers"]:
+    """
+    Hash of the request headers (credentials included), results fetched with other credentials
+    are not shared.
+    """
+    if not headers:
+        return ""
+    return hashlib.sha256(json.dumps(headers, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def result_cache_key(plugin: Annotated[str, "plugin name"], function: Annotated[str, "function name"],
+                     question: Annotated[Union[Question, str], "question sent to the plugin"],
+                     headers: Annotated[Optional[Dict[str, str]], "headers sent to the plugin service"] = None) -> Annotated[str, "cache key"]:
+    """
+    Key on plugin, function, user, domain, normalized question, the plugin configuration of the
+    question and the request headers, so cached results never cross users or credentials.
+    """
+    if isinstance(question, Question):
+        conf = question.plugin_conf(plugin)
+        configuration = conf.configuration if conf is not None else None
+        parts = [plugin, function, question.user_id, question.domain_id, normalize_question(question.question), configuration]
+    else:
+        parts = [plugin, function, None, None, normalize_question(str(question)), None]
+    parts.append(headers_digest(headers))
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Generations:
+    """
+    Write generation of every plugin function: a read whose function was invalidated while it
+    ran does not store its (possibly stale) result. Stores and invalidations hold `lock`, so a
+    store cannot land between an invalidation and the entries it drops.
+    """
+
+    def __init__(self):
+        self._generations: Dict[Tuple[str, Optional[str]], int] = {}
+        self.lock = threading.RLock()
+
+    def current(self, plugin: str, function: str) -> Tuple[int, int]:
+        with self.lock:
+            return self._generations.get((plugin, None), 0), self._generations.get((plugin, function), 0)
+
+    def advance(self, plugin: str, functions: Optional[Iterable[str]] = None) -> None:
+        with self.lock:
+            for function in (functions or (None,)):
+                self._generations[(plugin, function)] = self._generations.get((plugin, function), 0) + 1
+
+
+_generations = _Generations()
+
+
+def cached_plugin_read(function: Annotated[Callable, "read-only plugin method taking a `question` argument"]) -> Callable:
+    """
+    Serve a read-only plugin function from the result cache. Put it below @kernel_function.
+    Fallback results (unavailable service) are not cached. On a miss, concurrent calls with the
+    same key (same user and headers) share one execution (see utils.singleflight), even with the
+    cache disabled, unless a write of the plugin happened in between.
+    """
+    function_name = function.__name__
+    reads = get_singleflight("plugin_read")
+
+    def lookup(self, args, kwargs) -> Tuple[Optional[ResultCache], Optional[str], str, bool, Any]:
+        cache = get_result_cache()
+        question = kwargs.get("question", args[0] if args else None)
+        if question is None:
+            return cache, None, "", False, None
+        plugin = plugin_name_of(self)
+        key = result_cache_key(plugin, function_name, question, kwargs.get("headers", args[1] if len(args) > 1 else None))
+        if cache is None:
+            return cache, key, plugin, False, None
+        found, value = cache.get(key)
+        return cache, key, plugin, found, value
+
+    def flight_key(key: str, generation: Tuple[int, int]) -> str:
+        # The cache key already holds the user and the headers (as service_request's coalescing
+        # key), the generation keeps reads started after a write from joining one started before
+        return f"{key}:{generation[0]}:{generation[1]}"
+
+    def store(cache: Optional[ResultCache], key: str, plugin: str, generation: Tuple[int, int], value: Any) -> Any:
+        if cache is None or isinstance(value, FallbackResult):
+            return value
+        with _generations.lock:
+            if _generations.current(plugin, function_name) != generation:
+                logger.debug("%s.%s invalidated during the read, result not cached", plugin, function_name)
+                return value
+            cache.set(key, plugin, function_name, value)
+        return value
+
+    if iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(self, *args: Any, **kwargs: Any) -> Any:
+            cache, key, plugin, found, value = lookup(self, args, kwargs)
+            if found:
+                return value
+            if key is None:
+                return await function(self, *args, **kwargs)
+
+            generation = _generations.current(plugin, function_name)
+
+            async def call() -> Any:
+                return store(cache, key, plugin, generation, await function(self, *args, **kwargs))
+            return await reads.do(flight_key(key, generation), call)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+        cache, key, plugin, found, value = lookup(self, args, kwargs)
+        if found:
+            return value
+        if key is None:
+            return function(self, *args, **kwargs)
+
+        generation = _generations.current(plugin, function_name)
+        # Sync plugin functions run in worker threads (utils.thread_offload)
+        return reads.do_sync(flight_key(key, generation),
+                             lambda: store(cache, key, plugin, generation, function(self, *args, **kwargs)))
+    return wrapper
+
+
+def invalidates_plugin_reads(*functions: Annotated[str, "read functions made stale by the write, all if empty"]) -> Callable:
+    """
+    Mark a plugin write function: once it succeeds the cached reads of the plugin are dropped,
+    and the reads in flight meanwhile do not cache their result. Put it below @kernel_function.
+    """
+    def decorator(function: Callable) -> Callable:
+        def invalidate(self) -> None:
+            plugin = plugin_name_of(self)
+            cache = get_result_cache()
+            with _generations.lock:
+                # Reads still running cannot store their result anymore
+                _generations.advance(plugin, functions or None)
+                if cache is not None:
+                    cache.invalidate(plugin, functions or None)
+
+        if iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(self, *args: Any, **kwargs: Any) -> Any:
+                result = await function(self, *args, **kwargs)
+                invalidate(self)
+                return result
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+            result = function(self, *args, **kwargs)
+            invalidate(self)
+            return result
+        return wrapper
+    return decorator
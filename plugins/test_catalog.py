@@ -0,0 +1,20 @@
+# Internal imports
+from plugins.catalog import PLUGIN_CATALOG, catalog_mismatches
+from utils.lazy_plugins import LazyFunction, LazyPluginSpec, import_plugin_functions, spec_mismatches
+
+
+def test_catalog_matches_kernel_function_decorators():
+    assert catalog_mismatches() == {}
+
+
+def test_mismatch_is_reported():
+    spec = next(spec for spec in PLUGIN_CATALOG if spec.name == "invoices")
+    functions = import_plugin_functions(spec)
+    changed = LazyPluginSpec(name=spec.name, description=spec.description, import_path=spec.import_path,
+                             functions=(LazyFunction(name="get_invoices", description="Something else"),))
+
+    mismatches = spec_mismatches(changed, functions)
+
+    assert "upsert_invoices is not declared" in mismatches
+    assert any(mismatch.startswith("get_invoices description") for mismatch in mismatches)
+    assert any(mismatch.startswith("get_invoices parameters") for mismatch in mismatches)
@@ -0,0 +1,107 @@
+# Standard imports
+import asyncio
+
+# Third party
+import pytest
+
+# Internal imports
+from plugins.result_cache import (InMemoryResultCache, cached_plugin_read, get_result_cache, invalidates_plugin_reads,
+                                  result_cache_key, set_result_cache)
+from utils.input_model import Question
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Tickets:
+    _class_name = "tickets"
+
+    def __init__(self):
+        self.reads = 0
+        self.release = asyncio.Event()
+        self.block = False
+
+    @cached_plugin_read
+    async def get_tickets(self, question, headers=None):
+        self.reads += 1
+        if self.block:
+            await self.release.wait()
+        return f"read {self.reads}"
+
+    @invalidates_plugin_reads("get_tickets")
+    async def update_tickets(self, question):
+        return "updated"
+
+
+def question(user_id: int = 1, text: str = "list my tickets") -> Question:
+    return Question(user_id=user_id, message_id=1, chat_id=1, domain_id=1, question=text)
+
+
+@pytest.fixture(autouse=True)
+def result_cache():
+    previous = get_result_cache()
+    cache = InMemoryResultCache()
+    set_result_cache(cache)
+    yield cache
+    set_result_cache(previous)
+
+
+def test_reads_are_cached_per_user_and_headers():
+    async def scenario():
+        tickets = Tickets()
+        first = await tickets.get_tickets(question(user_id=1), headers={"Authorization": "a"})
+        assert await tickets.get_tickets(question(user_id=1), headers={"Authorization": "a"}) == first
+        await tickets.get_tickets(question(user_id=2), headers={"Authorization": "a"})
+        await tickets.get_tickets(question(user_id=1), headers={"Authorization": "b"})
+        return tickets.reads
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_key_includes_user_and_headers():
+    assert result_cache_key("p", "f", question(1)) != result_cache_key("p", "f", question(2))
+    assert result_cache_key("p", "f", question(1), {"Authorization": "a"}) != result_cache_key("p", "f", question(1), {"Authorization": "b"})
+    assert result_cache_key("p", "f", question(1, "List my  tickets")) == result_cache_key("p", "f", question(1, "list my tickets"))
+
+
+def test_write_invalidates_reads():
+    async def scenario():
+        tickets = Tickets()
+        await tickets.get_tickets(question())
+        await tickets.update_tickets(question())
+        return await tickets.get_tickets(question())
+
+    assert asyncio.run(scenario()) == "read 2"
+
+
+def test_read_raced_by_a_write_is_not_cached(result_cache):
+    async def scenario():
+        tickets = Tickets()
+        tickets.block = True
+        read = asyncio.ensure_future(tickets.get_tickets(question()))
+        await asyncio.sleep(0)
+        await tickets.update_tickets(question())
+        tickets.release.set()
+        stale = await read
+        return stale, await tickets.get_tickets(question())
+
+    stale, fresh = asyncio.run(scenario())
+
+    assert (stale, fresh) == ("read 1", "read 2")
+    assert result_cache.stats()["size"] == 1
+
+
+def test_entries_expire_per_plugin_ttl():
+    clock = FakeClock()
+    cache = InMemoryResultCache(default_ttl=10, plugin_ttls={"Tickets": 1}, clock=clock)
+    cache.set("a", "tickets", "get_tickets", "value")
+    cache.set("b", "other", "get", "value")
+
+    clock.now = 2
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, "value")
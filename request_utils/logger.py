@@ -1,39 +1,95 @@
 # Standard imports
-import time
-import logging
-from typing import Annotated, Callable, Any, Type
-from utils import custom_logs
-# Setting up logging
+import inspect
+import functools
+from time import perf_counter_ns
+from typing import Annotated, Callable, Any, Optional
 
-logger = custom_logs.getLogger("class_annotations")
+# Internal imports
+from request_utils.metrics import MetricsRegistry, get_registry
 
 
 class MethodObservability(type):
     """
-    A metaclass that logs the time elapsed during the execution of methods of the class.
+    A metaclass that records the time elapsed during the execution of methods of the class
+    in per-method latency histograms (see request_utils.metrics).
+
+    Coroutines are timed until they finish and generators until they are exhausted or closed,
+    not just until they are created.
     """
     def __new__(cls, name: Annotated[str, "The name of the class."], bases: Annotated[tuple, "The base classes."], dct: Annotated[dict, "The attribute/method dictionary."]):
         """
-        Creates a new instance of the class, modifying its methods to log the execution time.
+        Creates a new instance of the class, modifying its methods to record the execution time.
 
         Returns:
             Type: The new class with modified methods.
         """
         new_cls = super().__new__(cls, name, bases, dct)
         for attribute_name, attribute in dct.items():
-            if callable(attribute):
-                setattr(new_cls, attribute_name, cls.wrap_method(attribute))
+            if isinstance(attribute, (staticmethod, classmethod)):
+                wrapped = cls.wrap_method(attribute.__func__, f"{name}.{attribute_name}")
+                setattr(new_cls, attribute_name, type(attribute)(wrapped))
+            elif callable(attribute) and not isinstance(attribute, type):
+                setattr(new_cls, attribute_name, cls.wrap_method(attribute, f"{name}.{attribute_name}"))
         return new_cls
 
     @staticmethod
-    def wrap_method(method: Annotated[Callable, "The method to wrap."]) -> Annotated[Callable, "The wrapped method."]:
+    def wrap_method(method: Annotated[Callable, "The method to wrap."],
+                    metric_name: Annotated[Optional[str], "Histogram name, the method qualname by default"] = None,
+                    registry: Annotated[Optional[MetricsRegistry], "Registry to record into, the process wide one by default"] = None
+                    ) -> Annotated[Callable, "The wrapped method."]:
         """
-        Wraps a method to log its execution time.
+        Wraps a method to record its execution time, keeping it a coroutine / generator function
+        when it is one.
         """
+        metric_name = metric_name or getattr(method, "__qualname__", repr(method))
+        registry = registry or get_registry()
+        histogram = registry.histogram(metric_name)
+
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                if not registry.sampled():
+                    return await method(*args, **kwargs)
+                start_ns = perf_counter_ns()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    histogram.observe_ns(perf_counter_ns() - start_ns)
+            return async_wrapper
+
+        if inspect.isasyncgenfunction(method):
+            @functools.wraps(method)
+            async def async_gen_wrapper(*args, **kwargs):
+                generator = method(*args, **kwargs)
+                start_ns = perf_counter_ns() if registry.sampled() else None
+                try:
+                    async for item in generator:
+                        yield item
+                finally:
+                    # Closed early by the consumer: close the wrapped generator now, not on GC
+                    await generator.aclose()
+                    if start_ns is not None:
+                        histogram.observe_ns(perf_counter_ns() - start_ns)
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def gen_wrapper(*args, **kwargs):
+                start_ns = perf_counter_ns() if registry.sampled() else None
+                try:
+                    return (yield from method(*args, **kwargs))
+                finally:
+                    if start_ns is not None:
+                        histogram.observe_ns(perf_counter_ns() - start_ns)
+            return gen_wrapper
+
+        @functools.wraps(method)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
-            result = method(*args, **kwargs)
-            end_time = time.time()
-            logger.info(f"Execution time for {method.__name__}: {end_time - start_time} seconds")
-            return result
+            if not registry.sampled():
+                return method(*args, **kwargs)
+            start_ns = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.observe_ns(perf_counter_ns() - start_ns)
         return wrapper
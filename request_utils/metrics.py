@@ -0,0 +1,252 @@
+# Standard imports
+import os
+import random
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Annotated, Dict, List, Optional, Sequence, Tuple
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+# Upper bounds in seconds, from in-process helpers to LLM calls and full plans
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.00001, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                                      0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram fed with nanosecond durations.
+    """
+
+    def __init__(self, buckets: Annotated[Sequence[float], "Bucket upper bounds in seconds"] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._bounds_ns = [int(bound * 1e9) for bound in self.buckets]
+        # One slot per bucket plus +Inf, not cumulative
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum_ns = 0
+        self._lock = threading.Lock()
+
+    def observe_ns(self, duration_ns: int) -> None:
+        slot = bisect_left(self._bounds_ns, duration_ns)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum_ns += duration_ns
+
+    def snapshot(self) -> Tuple[List[int], int]:
+        """
+        (per bucket counts including +Inf, sum in ns), consistent with each other.
+        """
+        with self._lock:
+            return list(self._counts), self._sum_ns
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum_ns = 0
+
+    @property
+    def count(self) -> int:
+        return sum(self.snapshot()[0])
+
+    def quantile(self, q: Annotated[float, "Quantile in [0, 1]"]) -> Optional[float]:
+        """
+        Estimated quantile in seconds, interpolated linearly inside the bucket like Prometheus'
+        histogram_quantile. None without observations.
+        """
+        counts, _ = self.snapshot()
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for slot, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if slot == len(self.buckets):
+                    # Beyond the last bound, the best estimate is that bound
+                    return self.buckets[-1]
+                lower = self.buckets[slot - 1] if slot else 0.0
+                return lower + (self.buckets[slot] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class Counter:
+    """
+    Monotonic counter with one label, never sampled.
+    """
+
+    def __init__(self, name: Annotated[str, "Metric name, without namespace and _total"], help: str,
+                 label: Annotated[str, "Label name"]):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: Annotated[str, "Label value"], amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def values(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values = {}
+
+
+class MetricsRegistry:
+    """
+    Per-method latency histograms and counters, exported in the Prometheus text format.
+
+    With sample_rate < 1 only that fraction of calls is timed, so counts are sampled counts:
+    divide by the rate (exported as `<namespace>_sample_rate`) to estimate call volumes.
+    """
+
+    def __init__(self, namespace: Annotated[str, "Prefix of the exported metric names"] = "orchestrator",
+                 sample_rate: Annotated[float, "Fraction of calls timed, between 0 and 1"] = 1.0,
+                 buckets: Annotated[Sequence[float], "Bucket upper bounds in seconds"] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self.set_sample_rate(sample_rate)
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def set_sample_rate(self, sample_rate: float) -> None:
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}")
+        self.sample_rate = sample_rate
+
+    def sampled(self) -> bool:
+        """
+        Whether the call about to start should be timed.
+        """
+        rate = self.sample_rate
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    def histogram(self, method: Annotated[str, "Qualified method name"]) -> LatencyHistogram:
+        histogram = self._histograms.get(method)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(method, LatencyHistogram(self.buckets))
+        return histogram
+
+    def observe_ns(self, method: Annotated[str, "Qualified method name"], duration_ns: int) -> None:
+        self.histogram(method).observe_ns(duration_ns)
+
+    def counter(self, name: Annotated[str, "Metric name, without namespace and _total"], help: str = "",
+                label: Annotated[str, "Label name"] = "name") -> Counter:
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter(name, help, label))
+        return counter
+
+    def reset(self) -> None:
+        """
+        Zero every histogram and counter. They are kept, instrumented methods hold a reference to theirs.
+        """
+        for histogram in list(self._histograms.values()):
+            histogram.reset()
+        for counter in list(self._counters.values()):
+            counter.reset()
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Count, mean and p50/p95/p99 estimates in seconds per method.
+        """
+        summary = {}
+        for method, histogram in sorted(self._histograms.items()):
+            counts, sum_ns = histogram.snapshot()
+            total = sum(counts)
+            summary[method] = {
+                "count": total,
+                "mean": sum_ns / total / 1e9 if total else None,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+            }
+        return summary
+
+    def render_prometheus(self) -> str:
+        name = f"{self.namespace}_method_duration_seconds"
+        lines = [
+            f"# HELP {self.namespace}_sample_rate Fraction of method calls timed.",
+            f"# TYPE {self.namespace}_sample_rate gauge",
+            f"{self.namespace}_sample_rate {self.sample_rate}",
+            f"# HELP {name} Duration of instrumented method calls, awaited coroutines and generators included.",
+            f"# TYPE {name} histogram",
+        ]
+        for method, histogram in sorted(self._histograms.items()):
+            counts, sum_ns = histogram.snapshot()
+            label = method.replace("\\", "\\\\").replace('"', '\\"')
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{method="{label}",le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{name}_bucket{{method="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{method="{label}"}} {sum_ns / 1e9}')
+            lines.append(f'{name}_count{{method="{label}"}} {cumulative}')
+        for counter in sorted(self._counters.values(), key=lambda counter: counter.name):
+            counter_name = f"{self.namespace}_{counter.name}_total"
+            lines.append(f"# HELP {counter_name} {counter.help}")
+            lines.append(f"# TYPE {counter_name} counter")
+            for value_label, value in sorted(counter.values().items()):
+                value_label = value_label.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{counter_name}{{{counter.label}="{value_label}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry(sample_rate=float(os.getenv("METHOD_OBSERVABILITY_SAMPLE_RATE", "1.0")))
+
+
+def get_registry() -> MetricsRegistry:
+    """
+    Process wide registry fed by MethodObservability.
+    """
+    return _registry
+
+
+def render_prometheus() -> str:
+    return _registry.render_prometheus()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = _registry
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Scrapes are periodic, keep them out of the application log
+        pass
+
+
+def start_metrics_server(port: Annotated[int, "Port to listen on, 0 picks a free one"] = 9464,
+                         host: Annotated[str, "Interface to bind"] = "127.0.0.1",
+                         registry: Annotated[Optional[MetricsRegistry], "Registry to export, the process wide one by default"] = None
+                         ) -> Annotated[ThreadingHTTPServer, "Running server, call shutdown() to stop it"]:
+    """
+    Serve GET /metrics in the Prometheus text format from a daemon thread.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or _registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%d/metrics", host, server.server_address[1])
+    return server
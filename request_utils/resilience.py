@@ -0,0 +1,227 @@
+"""
+Per-endpoint circuit breakers and hedged requests for the plugin microservices.
+
+A breaker counts consecutive failures (errors, 5xx answers and calls slower than
+`slow_call_s`) of one endpoint. Past `failure_threshold` it opens: calls fail at once with
+CircuitOpenError for `open_s` seconds, then a few probe calls are let through (half-open) and
+the breaker closes again once they succeed.
+
+Hedging sends a second attempt of an idempotent read when the first one has not answered
+after the recent p95 latency of the endpoint. Hedges are paid from a budget earned by the
+hedgeable requests (`budget_ratio` hedges per request), so a slow backend gets at most that
+much extra load.
+"""
+# Standard imports
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Annotated, Callable, Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to an endpoint whose breaker is open.
+    """
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Circuit open for {endpoint}, retrying in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class FallbackResult(str):
+    """
+    Plugin result standing in for an unavailable service. Never cached (see plugins.result_cache).
+    """
+
+
+@dataclass(frozen=True)
+class BreakerSettings:
+    failure_threshold: int = 5
+    slow_call_s: float = 10.0
+    open_s: float = 30.0
+    half_open_probes: int = 1
+
+
+@dataclass(frozen=True)
+class HedgeSettings:
+    quantile: float = 0.95
+    min_delay_s: float = 0.05
+    max_delay_s: float = 2.0
+    min_samples: int = 20
+    window: int = 200
+    budget_ratio: float = 0.1
+    max_budget: float = 10.0
+
+
+class CircuitBreaker:
+    """
+    Consecutive failure breaker of one endpoint.
+    """
+
+    def __init__(self, name: Annotated[str, "Endpoint, for logs and errors"], settings: Optional[BreakerSettings] = None,
+                 clock: Annotated[Callable[[], float], "Monotonic clock"] = time.monotonic):
+        self.name = name
+        self.settings = settings or BreakerSettings()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self) -> None:
+        """
+        Reserve a call, raise CircuitOpenError if the endpoint must not be called now.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self._opened_at + self.settings.open_s - self._clock()
+                if retry_in > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, retry_in)
+                self.state = HALF_OPEN
+                self._probes = self._probe_successes = 0
+                logger.info("Circuit of %s half-open, probing", self.name)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.settings.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._probes += 1
+
+    @property
+    def closed(self) -> bool:
+        return self.state == CLOSED
+
+    def record(self, success: Annotated[bool, "Answered without error"], elapsed_s: float) -> None:
+        failed = not success or elapsed_s >= self.settings.slow_call_s
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.settings.half_open_probes:
+                        self.state = CLOSED
+                        self._failures = 0
+                        logger.info("Circuit of %s closed", self.name)
+            elif failed:
+                self._failures += 1
+                if self.state == CLOSED and self._failures >= self.settings.failure_threshold:
+                    self._open()
+            else:
+                self._failures = 0
+
+    def release(self) -> None:
+        """
+        Give back a reserved call that ended without a verdict (cancelled hedge).
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > self._probe_successes:
+                self._probes -= 1
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = self._clock()
+        self.opened += 1
+        logger.warning("Circuit of %s open for %gs after %d failures", self.name, self.settings.open_s, self._failures)
+
+
+class HedgePolicy:
+    """
+    Hedge delay from the recent latencies of one endpoint, and the hedge budget.
+    """
+
+    def __init__(self, settings: Optional[HedgeSettings] = None):
+        self.settings = settings or HedgeSettings()
+        self._latencies: Deque[float] = deque(maxlen=self.settings.window)
+        self._budget = self.settings.max_budget
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def observe(self, elapsed_s: float) -> None:
+        self._latencies.append(elapsed_s)
+
+    def delay_s(self) -> Optional[float]:
+        """
+        Seconds to wait before hedging, None until enough latencies are known.
+        """
+        latencies = sorted(self._latencies)
+        if len(latencies) < self.settings.min_samples:
+            return None
+        delay = latencies[min(len(latencies) - 1, int(self.settings.quantile * len(latencies)))]
+        return min(self.settings.max_delay_s, max(self.settings.min_delay_s, delay))
+
+    def earn(self) -> None:
+        with self._lock:
+            self._budget = min(self.settings.max_budget, self._budget + self.settings.budget_ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._budget < 1.0:
+                return False
+            self._budget -= 1.0
+            self.hedged += 1
+            return True
+
+
+class Endpoint:
+    def __init__(self, name: str, breaker: CircuitBreaker, hedge: HedgePolicy):
+        self.name = name
+        self.breaker = breaker
+        self.hedge = hedge
+
+    def stats(self) -> Dict[str, object]:
+        return {"state": self.breaker.state, "opened": self.breaker.opened, "rejected": self.breaker.rejected,
+                "hedged": self.hedge.hedged, "hedge_wins": self.hedge.hedge_wins, "hedge_delay_s": self.hedge.delay_s()}
+
+
+def endpoint_name(url: str) -> str:
+    """
+    scheme://host:port/path, query strings are not part of the endpoint.
+    """
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class EndpointRegistry:
+    """
+    Breaker and hedge policy of every endpoint called.
+    """
+
+    def __init__(self, breaker: Optional[BreakerSettings] = None, hedge: Optional[HedgeSettings] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.breaker_settings = breaker or BreakerSettings()
+        self.hedge_settings = hedge or HedgeSettings()
+        self._clock = clock
+        self._endpoints: Dict[str, Endpoint] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Endpoint:
+        name = endpoint_name(url)
+        endpoint = self._endpoints.get(name)
+        if endpoint is None:
+            with self._lock:
+                endpoint = self._endpoints.get(name)
+                if endpoint is None:
+                    endpoint = self._endpoints[name] = Endpoint(
+                        name, CircuitBreaker(name, self.breaker_settings, self._clock), HedgePolicy(self.hedge_settings))
+        return endpoint
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {name: endpoint.stats() for name, endpoint in list(self._endpoints.items())}
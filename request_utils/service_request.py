@@ -1,12 +1,123 @@
 # Standard imports
+import json
 import time
+import asyncio
 import logging
+from dataclasses import dataclass, field
 
 # Third-party imports
+import httpx
 import requests
-from typing import Any, Annotated, Type, Optional, Dict
+from requests.adapters import HTTPAdapter
+from typing import Any, Annotated, AsyncIterator, Callable, Type, Optional, Dict, Tuple, Union
 
 from request_utils.logger import MethodObservability
+from request_utils.resilience import BreakerSettings, Endpoint, EndpointRegistry, HedgeSettings
+from utils import custom_logs
+from utils.singleflight import get_singleflight
+from utils.tracing import Span, payload_size, start_span
+from utils.traffic import HTTP, Exchange, TrafficReplayer, decode_body, encode_body, get_recorder, get_replayer, http_key
+
+logger = custom_logs.getLogger("service_request")
+
+# Shared session so consecutive sync requests reuse the TCP/TLS connection (keep-alive).
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+# Breakers of the endpoints called through the sync Requester
+_sync_endpoints = EndpointRegistry()
+
+
+def _http_span(method: str, url: str, data: Any = None) -> Span:
+    """
+    Span of one plugin HTTP call. The request size is only computed for sampled traces.
+    """
+    span = start_span(f"http {method}", {"http.method": method, "http.url": url})
+    if span.recording:
+        span.set_attribute("http.request_bytes", payload_size(data))
+    return span
+
+
+def _record_response(span: Span, response: Union[requests.Response, httpx.Response]) -> None:
+    if span.recording:
+        span.set_attributes({"http.status_code": response.status_code, "http.response_bytes": len(response.content)})
+
+
+def _body_bytes(body: Any) -> bytes:
+    """
+    Request body as sent, or its canonical JSON for dicts, to key recorded exchanges.
+    """
+    if body is None:
+        return b""
+    if isinstance(body, bytes):
+        return body
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    return json.dumps(body, sort_keys=True, default=str).encode("utf-8")
+
+
+def _replayed_exchange(method: str, url: str, body: Any) -> Tuple[Optional[TrafficReplayer], Optional[Exchange]]:
+    """
+    Recorded exchange of the request when replaying, None to send it (not replaying, or a
+    non strict replay miss).
+    """
+    replayer = get_replayer()
+    if replayer is None:
+        return None, None
+    return replayer, replayer.lookup(HTTP, http_key(method, url, _body_bytes(body)), f"{method} {url}")
+
+
+def _record_exchange(method: str, url: str, body: Any, response: Union[requests.Response, httpx.Response], started: float) -> None:
+    recorder = get_recorder()
+    if recorder is not None:
+        request_body = _body_bytes(body)
+        recorder.record(Exchange(
+            kind=HTTP, key=http_key(method, url, request_body), elapsed_ms=(time.perf_counter() - started) * 1000,
+            request={"method": method, "url": url, "bytes": len(request_body)},
+            response={"status": response.status_code, "content_type": response.headers.get("content-type", ""),
+                      **encode_body(response.content)},
+        ))
+
+
+def _coalescing_key(method: str, url: str, body: Any, headers: Optional[Dict[str, str]]) -> str:
+    """
+    Identical requests: same method, URL, body and headers (credentials included).
+    """
+    return http_key(method, url, _body_bytes(body) + b"\x00" + json.dumps(headers or {}, sort_keys=True).encode("utf-8"))
+
+
+def _send(method: str, url: str, body: Any, send: Callable[[], requests.Response],
+          coalesce: bool = False, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """
+    Send a sync request, or serve it from the replayed traffic. With `coalesce`, identical
+    requests made concurrently from other threads share one response (see utils.singleflight).
+    """
+    if coalesce:
+        return get_singleflight("http").do_sync(_coalescing_key(method, url, body, headers),
+                                                lambda: _send(method, url, body, send))
+    with _http_span(method, url, body) as span:
+        replayer, exchange = _replayed_exchange(method, url, body)
+        if exchange is not None:
+            time.sleep(replayer.delay_s(exchange))
+            response = requests.Response()
+            response.status_code = exchange.response["status"]
+            response.headers["Content-Type"] = exchange.response.get("content_type", "")
+            response._content = decode_body(exchange.response)
+            response.encoding = "utf-8"
+            response.url = url
+        else:
+            breaker = _sync_endpoints.get(url).breaker
+            breaker.before_call()
+            started = time.perf_counter()
+            try:
+                response = send()
+            except Exception:
+                breaker.record(False, time.perf_counter() - started)
+                raise
+            breaker.record(response.status_code < 500, time.perf_counter() - started)
+            _record_exchange(method, url, body, response, started)
+        _record_response(span, response)
+        return response
 
 
 class Requester(metaclass=MethodObservability):
@@ -14,25 +125,28 @@ class Requester(metaclass=MethodObservability):
     A class to perform HTTP GET and POST requests.
     """
     @staticmethod
-    def get(url: Annotated[str, "The URL to send the GET request to"], 
-            headers: Annotated[Optional[Dict[str, str]], "Optional HTTP headers for the GET request"] = None) -> Annotated[requests.Response, "The response object from the GET request"]:
+    def get(url: Annotated[str, "The URL to send the GET request to"],
+            headers: Annotated[Optional[Dict[str, str]], "Optional HTTP headers for the GET request"] = None,
+            coalesce: Annotated[bool, "Share the response of an identical request in flight"] = False) -> Annotated[requests.Response, "The response object from the GET request"]:
         """
         Sends a GET request to a specified URL with optional headers.
 
         Args:
             url (str): The URL to send the GET request to.
             headers (Optional[Dict[str, str]]): Optional HTTP headers for the GET request.
+            coalesce (bool): Share the response of an identical request in flight.
 
         Returns:
             requests.Response: The response object from the GET request.
         """
-        return requests.get(url, headers=headers)
+        return _send("GET", url, None, lambda: _session.get(url, headers=headers, timeout=_SYNC_TIMEOUT), coalesce, headers)
 
     @staticmethod
-    def post(url: Annotated[str, "The URL to send the POST request to"], 
-             data: Annotated[Dict[str, Any], "The data to send in the POST request"], 
-             is_json: Annotated[Optional[bool], "Whether the data is sent as JSON"] = False, 
-             headers: Annotated[Optional[Dict[str, str]], "Optional HTTP headers for the POST request"] = None) -> Annotated[requests.Response, "The response object from the POST request"]:
+    def post(url: Annotated[str, "The URL to send the POST request to"],
+             data: Annotated[Dict[str, Any], "The data to send in the POST request"],
+             is_json: Annotated[Optional[bool], "Whether the data is sent as JSON"] = False,
+             headers: Annotated[Optional[Dict[str, str]], "Optional HTTP headers for the POST request"] = None,
+             coalesce: Annotated[bool, "Share the response of an identical request in flight, only for idempotent reads"] = False) -> Annotated[requests.Response, "The response object from the POST request"]:
         """
         Sends a POST request to a specified URL with given data, with an option to send as JSON, and includes optional headers.
 
@@ -41,11 +155,264 @@ class Requester(metaclass=MethodObservability):
             data (Dict[str, Any]): The data to send in the POST request.
             is_json (Optional[bool]): Whether the data is sent as JSON.
             headers (Optional[Dict[str, str]]): Optional HTTP headers for the POST request.
+            coalesce (bool): Share the response of an identical request in flight, only for idempotent reads.
 
         Returns:
             requests.Response: The response object from the POST request.
         """
         if is_json:
-            return requests.post(url, json=data, headers=headers)
+            return _send("POST", url, data, lambda: _session.post(url, json=data, headers=headers, timeout=_SYNC_TIMEOUT), coalesce, headers)
+        return _send("POST", url, data, lambda: _session.post(url, data=data, headers=headers, timeout=_SYNC_TIMEOUT), coalesce, headers)
+
+
+@dataclass(frozen=True)
+class RequesterSettings:
+    """
+    Connection pool, timeout and resilience (see request_utils.resilience) settings for AsyncRequester.
+    """
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 10.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    max_connections_per_host: int = 10
+    http2: bool = False
+    breaker: BreakerSettings = field(default_factory=BreakerSettings)
+    hedge: HedgeSettings = field(default_factory=HedgeSettings)
+
+
+# (connect, read) timeouts of the sync Requester, which used to wait forever on a stuck service
+_SYNC_TIMEOUT = (RequesterSettings.connect_timeout, RequesterSettings.read_timeout)
+
+
+async def _client_lifetime(client: Annotated[httpx.AsyncClient, "Client created on the running loop"]) -> AsyncIterator[None]:
+    """
+    Stays suspended while the loop that created the client runs. The loop finalizes its pending
+    async generators before closing (asyncio.run does), which closes the client on the loop that
+    owns its connections instead of leaking them when a later loop builds a new client.
+    """
+    try:
+        yield
+    finally:
+        if not client.is_closed:
+            await client.aclose()
+
+
+class AsyncRequester(metaclass=MethodObservability):
+    """
+    Async counterpart of Requester.
+
+    All requests go through one shared httpx.AsyncClient, so connections are pooled and kept
+    alive between plugin calls. The number of in-flight requests per host is bounded by
+    RequesterSettings.max_connections_per_host.
+
+    Every endpoint has a circuit breaker, and idempotent reads can be hedged (`hedge=True`),
+    see request_utils.resilience.
+    """
+    _shared: Optional["AsyncRequester"] = None
+
+    def __init__(self, settings: Annotated[Optional[RequesterSettings], "Pool and timeout settings"] = None):
+        self.settings = settings or RequesterSettings()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lifetime: Optional[AsyncIterator[None]] = None
+        self._host_semaphores: Dict[Tuple[str, str, int], asyncio.Semaphore] = {}
+        self.endpoints = EndpointRegistry(self.settings.breaker, self.settings.hedge)
+
+    @classmethod
+    def shared(cls, settings: Annotated[Optional[RequesterSettings], "Settings used if the shared instance is created"] = None) -> "AsyncRequester":
+        """
+        Return the process wide requester, creating it on first use.
+        """
+        if cls._shared is None:
+            cls._shared = cls(settings)
+        return cls._shared
+
+    @classmethod
+    async def close_shared(cls) -> None:
+        """
+        Close the process wide requester and its connection pool.
+        """
+        if cls._shared is not None:
+            await cls._shared.aclose()
+            cls._shared = None
+
+    def _build_client(self) -> httpx.AsyncClient:
+        settings = self.settings
+        http2 = settings.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+                http2 = False
+
+        timeout = httpx.Timeout(connect=settings.connect_timeout, read=settings.read_timeout,
+                                write=settings.write_timeout, pool=settings.pool_timeout)
+        limits = httpx.Limits(max_connections=settings.max_connections,
+                              max_keepalive_connections=settings.max_keepalive_connections,
+                              keepalive_expiry=settings.keepalive_expiry)
+        return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Return the pooled client, rebuilding it if the running event loop changed
+        (connections cannot be shared across loops). Each client is closed when the loop
+        that created it finishes, see _client_lifetime.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = self._build_client()
+            self._loop = loop
+            self._host_semaphores = {}
+            self._lifetime = _client_lifetime(self._client)
+            # Runs it up to its yield, which registers it with the running loop
+            try:
+                self._lifetime.asend(None).send(None)
+            except StopIteration:
+                pass
+        return self._client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        parsed = httpx.URL(url)
+        key = (parsed.scheme, parsed.host, parsed.port or (443 if parsed.scheme == "https" else 80))
+        semaphore = self._host_semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.settings.max_connections_per_host)
+            self._host_semaphores[key] = semaphore
+        return semaphore
+
+    async def _request(self, method: str, url: str, hedge: bool = False, coalesce: bool = False, **kwargs: Any) -> httpx.Response:
+        body = kwargs.get("content", kwargs.get("json", kwargs.get("data")))
+        replayer, exchange = _replayed_exchange(method, url, body)
+        if exchange is not None:
+            with _http_span(method, url, body) as span:
+                await asyncio.sleep(replayer.delay_s(exchange))
+                response = httpx.Response(exchange.response["status"], content=decode_body(exchange.response),
+                                          headers={"content-type": exchange.response.get("content_type", "")},
+                                          request=httpx.Request(method, url))
+                _record_response(span, response)
+                return response
+
+        endpoint = self.endpoints.get(url)
+        if hedge:
+            send = lambda: self._hedged(endpoint, method, url, body, kwargs)
         else:
-            return requests.post(url, data=data, headers=headers)
\ No newline at end of file
+            send = lambda: self._attempt(endpoint, method, url, body, kwargs)
+        if coalesce:
+            return await get_singleflight("http").do(_coalescing_key(method, url, body, kwargs.get("headers")), send)
+        return await send()
+
+    async def _attempt(self, endpoint: Endpoint, method: str, url: str, body: Any, kwargs: Dict[str, Any],
+                       hedge: bool = False) -> httpx.Response:
+        """
+        One request through the breaker of the endpoint. 5xx answers and slow calls count as failures.
+        """
+        endpoint.breaker.before_call()
+        with _http_span(method, url, body) as span:
+            if hedge and span.recording:
+                span.set_attribute("http.hedge", True)
+            client = self._get_client()
+            async with self._host_semaphore(url):
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                except asyncio.CancelledError:
+                    endpoint.breaker.release()
+                    raise
+                except Exception:
+                    endpoint.breaker.record(False, time.perf_counter() - started)
+                    raise
+            elapsed = time.perf_counter() - started
+            success = response.status_code < 500
+            endpoint.breaker.record(success, elapsed)
+            if success:
+                endpoint.hedge.observe(elapsed)
+            _record_exchange(method, url, body, response, started)
+            _record_response(span, response)
+            return response
+
+    async def _hedged(self, endpoint: Endpoint, method: str, url: str, body: Any, kwargs: Dict[str, Any]) -> httpx.Response:
+        """
+        Send the request, and a second attempt if the first has not answered after the hedge
+        delay of the endpoint. The first successful answer wins, the other attempt is cancelled.
+        """
+        policy = endpoint.hedge
+        policy.earn()
+        delay = policy.delay_s()
+        first = asyncio.ensure_future(self._attempt(endpoint, method, url, body, kwargs))
+        pending = {first}
+        try:
+            if delay is not None:
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                if not done and endpoint.breaker.closed and policy.try_spend():
+                    pending.add(asyncio.ensure_future(self._attempt(endpoint, method, url, body, kwargs, hedge=True)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not first:
+                            policy.hedge_wins += 1
+                        return attempt.result()
+            # Every attempt failed, report the first one's error
+            return first.result()
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+
+    async def get(self, url: Annotated[str, "The URL to send the GET request to"],
+                  headers: Annotated[Optional[Dict[str, str]], "Optional HTTP headers for the GET request"] = None,
+                  hedge: Annotated[bool, "Send a second attempt if the first one is slow"] = False,
+                  coalesce: Annotated[bool, "Share the response of an identical request in flight"] = False) -> Annotated[httpx.Response, "The response object from the GET request"]:
+        """
+        Sends a GET request to a specified URL with optional headers.
+
+        Args:
+            url (str): The URL to send the GET request to.
+            headers (Optional[Dict[str, str]]): Optional HTTP headers for the GET request.
+            hedge (bool): Send a second attempt if the first one is slow.
+            coalesce (bool): Share the response of an identical request in flight.
+
+        Returns:
+            httpx.Response: The response object from the GET request.
+        """
+        return await self._request("GET", url, hedge=hedge, coalesce=coalesce, headers=headers)
+
+    async def post(self, url: Annotated[str, "The URL to send the POST request to"],
+                   data: Annotated[Union[Dict[str, Any], str, bytes], "The data to send in the POST request"],
+                   is_json: Annotated[Optional[bool], "Whether the data is sent as JSON"] = False,
+                   headers: Annotated[Optional[Dict[str, str]], "Optional HTTP headers for the POST request"] = None,
+                   hedge: Annotated[bool, "Send a second attempt if the first one is slow, only for idempotent reads"] = False,
+                   coalesce: Annotated[bool, "Share the response of an identical request in flight, only for idempotent reads"] = False) -> Annotated[httpx.Response, "The response object from the POST request"]:
+        """
+        Sends a POST request to a specified URL with given data, with an option to send as JSON, and includes optional headers.
+
+        Args:
+            url (str): The URL to send the POST request to.
+            data (Dict[str, Any] | str | bytes): The data to send in the POST request.
+            is_json (Optional[bool]): Whether the data is sent as JSON.
+            headers (Optional[Dict[str, str]]): Optional HTTP headers for the POST request.
+            hedge (bool): Send a second attempt if the first one is slow, only for idempotent reads.
+            coalesce (bool): Share the response of an identical request in flight, only for idempotent reads.
+
+        Returns:
+            httpx.Response: The response object from the POST request.
+        """
+        if is_json:
+            return await self._request("POST", url, hedge=hedge, coalesce=coalesce, json=data, headers=headers)
+        if isinstance(data, (str, bytes)):
+            return await self._request("POST", url, hedge=hedge, coalesce=coalesce, content=data, headers=headers)
+        return await self._request("POST", url, hedge=hedge, coalesce=coalesce, data=data, headers=headers)
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled client.
+        """
+        if self._lifetime is not None:
+            # Its cleanup closes the client
+            await self._lifetime.aclose()
+        self._client = None
+        self._loop = None
+        self._lifetime = None
@@ -0,0 +1,81 @@
+# Third party
+import pytest
+
+# Internal imports
+from request_utils.resilience import CLOSED, HALF_OPEN, OPEN, BreakerSettings, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def breaker(clock: FakeClock, **settings) -> CircuitBreaker:
+    return CircuitBreaker("service", BreakerSettings(**{"failure_threshold": 2, "open_s": 10.0, **settings}), clock=clock)
+
+
+def fail(circuit: CircuitBreaker) -> None:
+    circuit.before_call()
+    circuit.record(False, 0.1)
+
+
+def test_opens_after_consecutive_failures_only():
+    circuit = breaker(FakeClock())
+    fail(circuit)
+    circuit.before_call()
+    circuit.record(True, 0.1)
+    fail(circuit)
+    assert circuit.state == CLOSED
+
+    fail(circuit)
+    assert circuit.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        circuit.before_call()
+    assert circuit.rejected == 1
+
+
+def test_slow_calls_count_as_failures():
+    circuit = breaker(FakeClock(), slow_call_s=1.0)
+    for _ in range(2):
+        circuit.before_call()
+        circuit.record(True, 1.5)
+
+    assert circuit.state == OPEN
+
+
+def test_half_open_probe_closes_or_reopens():
+    clock = FakeClock()
+    circuit = breaker(clock)
+    fail(circuit)
+    fail(circuit)
+
+    clock.now = 10.0
+    circuit.before_call()
+    assert circuit.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        circuit.before_call()
+    circuit.record(False, 0.1)
+    assert circuit.state == OPEN and circuit.opened == 2
+
+    clock.now = 20.0
+    circuit.before_call()
+    circuit.record(True, 0.1)
+    assert circuit.state == CLOSED
+
+
+def test_released_probe_can_be_taken_again():
+    clock = FakeClock()
+    circuit = breaker(clock)
+    fail(circuit)
+    fail(circuit)
+    clock.now = 10.0
+    circuit.before_call()
+
+    circuit.release()
+
+    circuit.before_call()
+    assert circuit.state == HALF_OPEN
@@ -0,0 +1,43 @@
+# Standard imports
+import asyncio
+
+# Internal imports
+from request_utils.service_request import AsyncRequester
+
+
+async def current_client(requester: AsyncRequester):
+    return requester._get_client()
+
+
+def test_client_is_reused_within_a_loop():
+    requester = AsyncRequester()
+
+    async def twice():
+        return await current_client(requester), await current_client(requester)
+
+    first, second = asyncio.run(twice())
+
+    assert first is second
+
+
+def test_client_is_closed_when_its_loop_finishes():
+    requester = AsyncRequester()
+
+    first = asyncio.run(current_client(requester))
+    second = asyncio.run(current_client(requester))
+
+    assert first.is_closed
+    assert second.is_closed
+    assert second is not first
+
+
+def test_aclose_closes_the_client():
+    requester = AsyncRequester()
+
+    async def close():
+        client = requester._get_client()
+        await requester.aclose()
+        return client
+
+    assert asyncio.run(close()).is_closed
+    assert requester._client is None
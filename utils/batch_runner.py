@@ -0,0 +1,282 @@
+"""
+Batch orchestration runner.
+
+Streams a JSONL file of utils.input_model.Question records, plans and executes them with
+bounded concurrency and appends one JSONL result per record, in completion order:
+
+    python -m utils.batch_runner questions.jsonl results.jsonl --concurrency 8
+
+Records whose message_id already has a successful result in the output file are skipped,
+so an interrupted run can be resumed with the same command.
+"""
+# Standard imports
+import os
+import json
+import math
+import time
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from typing import Annotated, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+# Third party
+from pydantic import ValidationError
+from semantic_kernel import Kernel
+
+# Internal imports
+from request_utils.service_request import AsyncRequester
+from utils.input_model import Question
+from utils.custom_planner import CustomBasicPlanner
+from utils.custom_kernel import CustomKernel
+from utils import custom_logs
+from utils.context_budget import context_savings
+from utils.llm_scheduler import llm_call_context
+from utils.prompt_cache import load_prompt
+from utils.token_accounting import LLMUsage, token_accounting
+from utils.tracing import trace_question
+
+logger = custom_logs.getLogger(__name__)
+
+PLANNER_PROMPT_PATH = os.path.join(os.path.dirname(__file__), "prompts", "basic_planner.txt")
+
+
+def percentile(values: Annotated[List[float], "sorted values"], fraction: Annotated[float, "0..1"]) -> float:
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    if not values:
+        return 0.0
+    rank = math.ceil(fraction * len(values)) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+
+@dataclass
+class BatchReport:
+    processed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed_seconds: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list)
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+    llm_usage: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    def add_llm_usage(self, domain_id: Any, usage: LLMUsage) -> None:
+        tally = self.llm_usage.setdefault(str(domain_id), {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+        for key in tally:
+            tally[key] += usage.total[key]
+
+    @property
+    def throughput(self) -> float:
+        return self.processed / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+        return {
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "throughput_per_second": round(self.throughput, 3),
+            "latency_ms": {
+                "p50": round(percentile(latencies, 0.50), 1),
+                "p90": round(percentile(latencies, 0.90), 1),
+                "p95": round(percentile(latencies, 0.95), 1),
+                "p99": round(percentile(latencies, 0.99), 1),
+                "max": round(latencies[-1], 1) if latencies else 0.0,
+            },
+            "llm_usage_by_domain": {domain: dict(tally, cost_usd=round(tally["cost_usd"], 6)) for domain, tally in self.llm_usage.items()},
+        }
+
+
+def iter_jsonl(path: Annotated[str, "JSONL file"]) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily yield (line number, line) for the non empty lines of a file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if line:
+                yield line_number, line
+
+
+def completed_message_ids(output_path: Annotated[str, "results file of a previous run"]) -> Set[int]:
+    """
+    Collect the message_ids already answered successfully, dropping a trailing partial line
+    left by an interrupted run so new results are appended on a clean line.
+    """
+    done: Set[int] = set()
+    if not os.path.exists(output_path):
+        return done
+
+    valid_size = 0
+    with open(output_path, "rb") as f:
+        for raw_line in f:
+            if not raw_line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw_line)
+            except json.JSONDecodeError:
+                break
+            valid_size += len(raw_line)
+            if record.get("status") == "ok" and record.get("message_id") is not None:
+                done.add(record["message_id"])
+
+    if valid_size != os.path.getsize(output_path):
+        logger.warning("Truncating partial record at the end of %s", output_path)
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_size)
+    return done
+
+
+class BatchRunner:
+    """
+    Plans and executes Question records with bounded concurrency.
+    """
+
+    def __init__(self, kernel: Annotated[Kernel, "kernel with the plugins loaded"],
+                 planner: Annotated[CustomBasicPlanner, "planner used for every record"],
+                 planner_prompt: Annotated[str, "planner prompt"],
+                 concurrency: Annotated[int, "records processed at once"] = 8,
+                 headers: Annotated[Optional[Dict[str, str]], "headers sent to the plugins"] = None):
+        self.kernel = kernel
+        self.planner = planner
+        self.planner_prompt = planner_prompt
+        self.concurrency = concurrency
+        self.headers = headers or {}
+
+    async def answer(self, question: Question) -> str:
+        # Records run concurrently, each gets its own view so the planner plugin registration does not race
+        kernel = self.kernel.view() if isinstance(self.kernel, CustomKernel) else self.kernel
+        with trace_question(question), llm_call_context(domain=question.domain_id):
+            plan = await self.planner.create_plan(question.question, kernel=kernel, prompt=self.planner_prompt)
+            return await self.planner.execute_plan(plan, kernel, question, headers=self.headers)
+
+    async def _process(self, line_number: int, line: str, report: BatchReport) -> Dict[str, Any]:
+        started = time.perf_counter()
+        record: Dict[str, Any] = {"line": line_number}
+        try:
+            question = Question.model_validate_json(line)
+        except ValidationError as exc:
+            question = None
+            record.update(message_id=_message_id_of(line), status="invalid", error=str(exc))
+            report.failed += 1
+        try:
+            if question is not None:
+                record.update(message_id=question.message_id, chat_id=question.chat_id, question=question.question)
+                with context_savings() as savings, token_accounting() as usage:
+                    try:
+                        record["result"] = await self.answer(question)
+                    finally:
+                        # Failed records spent tokens too
+                        record["context_tokens_saved"] = savings.tokens_saved
+                        record["llm_usage"] = usage.summary()
+                        report.add_llm_usage(question.domain_id, usage)
+                record["status"] = "ok"
+                report.succeeded += 1
+        except Exception as exc:
+            logger.error("Record at line %d failed: %s", line_number, exc)
+            record.update(status="error", error=f"{type(exc).__name__}: {exc}")
+            report.failed += 1
+        record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        report.processed += 1
+        report.latencies_ms.append(record["latency_ms"])
+        if record["status"] != "ok":
+            report.failures.append({"line": line_number, "message_id": record.get("message_id"), "error": record["error"]})
+        return record
+
+    async def run(self, input_path: Annotated[str, "JSONL file of Question records"],
+                  output_path: Annotated[str, "JSONL results file, appended to when resuming"]) -> BatchReport:
+        report = BatchReport()
+        done = completed_message_ids(output_path)
+        queue: "asyncio.Queue[Optional[Tuple[int, str]]]" = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.perf_counter()
+
+        with open(output_path, "a", encoding="utf-8") as output:
+            async def worker() -> None:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    record = await self._process(*item, report)
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+
+            workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+            try:
+                for line_number, line in iter_jsonl(input_path):
+                    if done and _message_id_of(line) in done:
+                        report.skipped += 1
+                        continue
+                    # Blocks when the workers are behind, so the input is never fully loaded in memory
+                    await queue.put((line_number, line))
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+
+        report.elapsed_seconds = time.perf_counter() - started
+        return report
+
+
+def _message_id_of(line: str) -> Optional[int]:
+    try:
+        return json.loads(line).get("message_id")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> BatchReport:
+    from utils.kernel_pool import get_kernel_pool
+    from utils.plan_cache import PlanCache
+
+    # Keep stderr writes off the event loop while records run concurrently
+    custom_logs.configure_logging(mode=args.log_mode, log_format=args.log_format)
+
+    if args.metrics_port is not None:
+        from request_utils.metrics import start_metrics_server
+        start_metrics_server(args.metrics_port)
+
+    if args.traffic_mode != "off":
+        # Before the kernel is built: its chat service is picked from the traffic mode
+        from utils.traffic import configure_traffic, get_replayer
+        configure_traffic(args.traffic_mode, args.traffic_log, time_scale=args.time_scale)
+
+    kernel = get_kernel_pool().warm().template
+    planner = CustomBasicPlanner(service_id="planner", execution_mode=args.execution_mode, plan_cache=PlanCache())
+
+    planner_prompt = load_prompt(args.prompt)
+
+    runner = BatchRunner(kernel, planner, planner_prompt, concurrency=args.concurrency)
+    try:
+        report = await runner.run(args.input, args.output)
+    finally:
+        # The pooled plugin connections belong to this event loop
+        await AsyncRequester.close_shared()
+
+    print(json.dumps(report.summary(), indent=2))
+    if args.traffic_mode == "replay":
+        print(f"Replay: {get_replayer().stats()}")
+    for failure in report.failures[:20]:
+        print(f"FAILED line {failure['line']} message_id={failure['message_id']}: {failure['error']}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the orchestrator over a JSONL file of questions")
+    parser.add_argument("input", help="JSONL file of Question records")
+    parser.add_argument("output", help="JSONL results file (resumed if it exists)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--execution-mode", choices=["sequential", "parallel"], default="sequential")
+    parser.add_argument("--prompt", default=PLANNER_PROMPT_PATH, help="planner prompt file")
+    parser.add_argument("--log-mode", choices=["sync", "queue"], default="queue")
+    parser.add_argument("--log-format", choices=["text", "json"], default=None, help="LOG_FORMAT or text by default")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on this port while running")
+    parser.add_argument("--traffic-mode", choices=["off", "record", "replay"], default="off",
+                        help="record the LLM and plugin traffic, or replay a recording offline")
+    parser.add_argument("--traffic-log", default=None, help="traffic log (.jsonl, or .db for SQLite)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="replay delay factor of the recorded durations (0: no delay)")
+    asyncio.run(main(parser.parse_args()))
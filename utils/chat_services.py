@@ -0,0 +1,248 @@
+# Standard imports
+import asyncio
+from time import perf_counter
+from typing import Annotated, Any, AsyncIterable, Callable, Dict, List, Optional, Tuple, Type
+
+# Third party
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_role import ChatRole
+from semantic_kernel.contents.streaming_chat_message_content import StreamingChatMessageContent
+
+# Internal imports
+from utils.singleflight import get_singleflight
+from utils.tracing import Span, current_span, start_span
+from utils.traffic import LLM, Exchange, ReplayMissError, TrafficRecorder, TrafficReplayer, llm_key
+
+
+class DelegatingChatCompletion(ChatCompletionClientBase):
+    """
+    Chat completion service forwarding every call to `inner`, with the same service and model ids.
+    Subclasses override complete_chat / complete_chat_stream to add behaviour around the calls.
+    """
+    inner: ChatCompletionClientBase
+
+    def __init__(self, inner: Annotated[ChatCompletionClientBase, "Wrapped chat completion service"], **kwargs: Any) -> None:
+        super().__init__(inner=inner, ai_model_id=inner.ai_model_id, service_id=inner.service_id, **kwargs)
+
+    def get_chat_message_content_type(self) -> str:
+        return self.inner.get_chat_message_content_type()
+
+    def get_prompt_execution_settings_class(self) -> Type[PromptExecutionSettings]:
+        return self.inner.get_prompt_execution_settings_class()
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        return await self.inner.complete_chat(chat_history, settings, **kwargs)
+
+    async def complete_chat_stream(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                                   **kwargs: Any) -> AsyncIterable[List[StreamingChatMessageContent]]:
+        async for partial in self.inner.complete_chat_stream(chat_history, settings, **kwargs):
+            yield partial
+
+    def unwrap(self) -> ChatCompletionClientBase:
+        """
+        Innermost service, below every wrapper.
+        """
+        service = self.inner
+        while isinstance(service, DelegatingChatCompletion):
+            service = service.inner
+        return service
+
+
+def wrap_chat_services(kernel: Annotated[Kernel, "Kernel whose chat services are wrapped"],
+                       wrapper: Annotated[Callable[[ChatCompletionClientBase], ChatCompletionClientBase], "Builds the wrapping service"]
+                       ) -> Annotated[Kernel, "The same kernel"]:
+    """
+    Replace every chat completion service of the kernel by wrapper(service), keeping its service id.
+    """
+    for service_id, service in list(kernel.services.items()):
+        if isinstance(service, ChatCompletionClientBase):
+            kernel.services[service_id] = wrapper(service)
+    return kernel
+
+
+def _prompt_chars(chat_history: ChatHistory) -> int:
+    return sum(len(message.content or "") for message in chat_history.messages)
+
+
+def _record_usage(span: Span, metadata: Optional[Dict[str, Any]]) -> None:
+    if (metadata or {}).get("coalesced"):
+        # Shared with an identical completion in flight, its tokens were spent once
+        span.set_attribute("llm.coalesced", True)
+        return
+    usage = (metadata or {}).get("usage")
+    if usage is not None:
+        span.set_attributes({
+            "llm.prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "llm.completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        })
+
+
+class TracingChatCompletion(DelegatingChatCompletion):
+    """
+    Chat completion service recording one span per completion, with the prompt and completion
+    sizes and the token usage reported by the service.
+    """
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        if not current_span().recording:
+            return await self.inner.complete_chat(chat_history, settings, **kwargs)
+        with start_span("llm.complete_chat", {"llm.service_id": self.service_id, "llm.model": self.ai_model_id,
+                                              "llm.prompt_chars": _prompt_chars(chat_history)}) as span:
+            completions = await self.inner.complete_chat(chat_history, settings, **kwargs)
+            span.set_attribute("llm.completion_chars", sum(len(completion.content or "") for completion in completions))
+            if completions:
+                _record_usage(span, completions[0].metadata)
+            return completions
+
+    async def complete_chat_stream(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                                   **kwargs: Any) -> AsyncIterable[List[StreamingChatMessageContent]]:
+        if not current_span().recording:
+            async for partial in self.inner.complete_chat_stream(chat_history, settings, **kwargs):
+                yield partial
+            return
+        # Not made current: the context would be entered and left across yields
+        span = start_span("llm.complete_chat_stream", {"llm.service_id": self.service_id, "llm.model": self.ai_model_id,
+                                                       "llm.prompt_chars": _prompt_chars(chat_history)})
+        span.start()
+        chunks = completion_chars = 0
+        error = None
+        try:
+            async for partial in self.inner.complete_chat_stream(chat_history, settings, **kwargs):
+                chunks += 1
+                completion_chars += sum(len(message.content or "") for message in partial)
+                yield partial
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            span.set_attributes({"llm.stream_chunks": chunks, "llm.completion_chars": completion_chars})
+            span.end(error)
+
+
+def _messages(chat_history: ChatHistory) -> List[Tuple[str, str]]:
+    return [(getattr(message.role, "value", str(message.role)), message.content or "") for message in chat_history.messages]
+
+
+def _settings(settings: PromptExecutionSettings) -> Dict[str, Any]:
+    return settings.model_dump(exclude_none=True, exclude={"service_id", "ai_model_id"})
+
+
+def _call_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The kernel and arguments passed for auto-invoked tool calls change the completion, so they
+    are part of the coalescing key. Kernels count by their plugin catalog: the per-request
+    views of one kernel (CustomKernel.view) share it.
+    """
+    call_kwargs = dict(kwargs)
+    if "kernel" in call_kwargs:
+        kernel = call_kwargs["kernel"]
+        call_kwargs["kernel"] = getattr(kernel, "catalog_id", None) or id(kernel)
+    return call_kwargs
+
+
+class RecordingChatCompletion(DelegatingChatCompletion):
+    """
+    Chat completion service recording every completion (see utils.traffic).
+    """
+    recorder: TrafficRecorder
+
+    def __init__(self, inner: Annotated[ChatCompletionClientBase, "Wrapped chat completion service"],
+                 recorder: Annotated[TrafficRecorder, "Where the exchanges go"]) -> None:
+        super().__init__(inner, recorder=recorder)
+
+    def _exchange(self, chat_history: ChatHistory, settings: PromptExecutionSettings, started: float,
+                  response: Dict[str, Any]) -> Exchange:
+        messages = _messages(chat_history)
+        return Exchange(kind=LLM, key=llm_key(self.ai_model_id, messages, _settings(settings)),
+                        elapsed_ms=(perf_counter() - started) * 1000,
+                        request={"model": self.ai_model_id, "prompt_chars": sum(len(content) for _, content in messages)},
+                        response=response)
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        started = perf_counter()
+        completions = await self.inner.complete_chat(chat_history, settings, **kwargs)
+        self.recorder.record(self._exchange(chat_history, settings, started,
+                                            {"contents": [completion.content or "" for completion in completions]}))
+        return completions
+
+    async def complete_chat_stream(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                                   **kwargs: Any) -> AsyncIterable[List[StreamingChatMessageContent]]:
+        started = perf_counter()
+        chunks: List[Tuple[float, str]] = []
+        async for partial in self.inner.complete_chat_stream(chat_history, settings, **kwargs):
+            chunks.append((round((perf_counter() - started) * 1000, 3), "".join(message.content or "" for message in partial)))
+            yield partial
+        self.recorder.record(self._exchange(chat_history, settings, started, {"chunks": chunks}))
+
+
+class ReplayChatCompletion(ChatCompletionClientBase):
+    """
+    Chat completion service answering with recorded completions (see utils.traffic),
+    after the recorded duration times the replayer time scale.
+    """
+    replayer: TrafficReplayer
+
+    def _lookup(self, chat_history: ChatHistory, settings: PromptExecutionSettings) -> Exchange:
+        messages = _messages(chat_history)
+        prompt = messages[-1][1] if messages else ""
+        description = f"completion of '{prompt[:80]}'"
+        exchange = self.replayer.lookup(LLM, llm_key(self.ai_model_id, messages, _settings(settings)), description)
+        if exchange is None:
+            # No service to fall back to, even when the replay is not strict
+            raise ReplayMissError(f"No recorded {LLM} exchange for {description}")
+        return exchange
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        exchange = self._lookup(chat_history, settings)
+        await asyncio.sleep(self.replayer.delay_s(exchange))
+        contents = exchange.response.get("contents")
+        if contents is None:
+            # Recorded as a stream
+            contents = ["".join(content for _, content in exchange.response["chunks"])]
+        return [ChatMessageContent(role=ChatRole.ASSISTANT, content=content, ai_model_id=self.ai_model_id)
+                for content in contents]
+
+    async def complete_chat_stream(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                                   **kwargs: Any) -> AsyncIterable[List[StreamingChatMessageContent]]:
+        exchange = self._lookup(chat_history, settings)
+        chunks = exchange.response.get("chunks")
+        if chunks is None:
+            chunks = [(exchange.elapsed_ms, content) for content in exchange.response["contents"][:1]]
+        elapsed_ms = 0.0
+        for offset_ms, content in chunks:
+            await asyncio.sleep(max(0.0, offset_ms - elapsed_ms) * self.replayer.time_scale / 1000)
+            elapsed_ms = offset_ms
+            yield [StreamingChatMessageContent(choice_index=0, role=ChatRole.ASSISTANT, content=content,
+                                               ai_model_id=self.ai_model_id)]
+
+
+class CoalescingChatCompletion(DelegatingChatCompletion):
+    """
+    Chat completion service where concurrent identical completions (same model, messages,
+    settings, kernel catalog and arguments) share one call to `inner` (see utils.singleflight). The callers served by another
+    call get copies of its messages with metadata["coalesced"] set. Streams are not coalesced.
+    """
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        called = False
+
+        async def call() -> List[ChatMessageContent]:
+            nonlocal called
+            called = True
+            return await self.inner.complete_chat(chat_history, settings, **kwargs)
+
+        key = llm_key(self.ai_model_id, _messages(chat_history), dict(_settings(settings), call_kwargs=_call_kwargs(kwargs)))
+        completions = await get_singleflight("llm").do(key, call)
+        if called:
+            return completions
+        return [completion.model_copy(update={"metadata": {**(completion.metadata or {}), "coalesced": True}})
+                for completion in completions]
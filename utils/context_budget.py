@@ -0,0 +1,364 @@
+"""
+Context budget of the prompts fed with subtask outputs.
+
+A subtask output (a ServiceDesk listing, a RAG answer...) becomes the previous_output of the
+question_updater prompt and the $input of the next prompt function, and prompt size drives the
+latency of every LLM step. Outputs over the budget are fitted, cheapest strategy first:
+
+- extract: structured outputs (JSON or Python literals) keep their key fields, long values are
+  shortened and the records that do not fit are dropped with a note of how many were (the
+  names of the dropped fields are logged)
+- summarize: other outputs are summarized by the output_summarizer hidden prompt function,
+  cached by content hash (opt-in, it is one more LLM call: CONTEXT_SUMMARIZE=1)
+- truncate: the head of the output that fits, with a note of the tokens left out
+
+Tokens are counted locally, with tiktoken when it is installed and ~4 characters per token
+otherwise. Saved tokens are counted per strategy in the metrics registry
+(orchestrator_context_tokens_saved_total) and per request (context_savings).
+Fitting is opt-in: CONTEXT_BUDGET_TOKENS sets the budget, unset or 0 leaves outputs whole.
+"""
+# Standard imports
+import os
+import ast
+import json
+import math
+import hashlib
+import threading
+import contextvars
+from enum import Enum
+from functools import lru_cache
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Annotated, Any, Awaitable, Callable, Dict, FrozenSet, Iterator, List, Optional, Set
+
+# Third party
+from semantic_kernel import Kernel
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+
+# Internal imports
+from request_utils.metrics import get_registry
+from utils.singleflight import get_singleflight
+from utils.tracing import start_span
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+# Field names kept when records are reduced to their key fields (compared case-insensitively)
+DEFAULT_KEY_FIELDS = frozenset([
+    "id", "key", "number", "code", "name", "title", "subject", "summary", "status", "state", "priority",
+    "severity", "type", "category", "city", "country", "user", "assignee", "owner", "amount", "total",
+    "date", "created", "updated", "due_date",
+])
+
+TRUNCATION_NOTE = "\n[... {omitted} more tokens truncated]"
+OMITTED_RECORDS_NOTE = "... {omitted} more"
+
+Summarize = Callable[[str, int, Kernel], Awaitable[Any]]
+
+_fitted = get_registry().counter("context_fitted", "Subtask outputs fitted to the context budget.", "strategy")
+_saved = get_registry().counter("context_tokens_saved", "Prompt tokens saved by fitting subtask outputs to the context budget.", "strategy")
+
+
+class FitStrategy(str, Enum):
+    FITS = "fits"
+    EXTRACT = "extract"
+    SUMMARIZE = "summarize"
+    TRUNCATE = "truncate"
+
+
+@dataclass(frozen=True)
+class Fit:
+    text: str
+    strategy: FitStrategy
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+class ContextSavings:
+    """
+    Tokens fitted away while answering one request.
+    """
+
+    def __init__(self):
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.fits: Dict[str, int] = {}
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def add(self, fit: Fit) -> None:
+        self.tokens_before += fit.tokens_before
+        self.tokens_after += fit.tokens_after
+        self.fits[fit.strategy.value] = self.fits.get(fit.strategy.value, 0) + 1
+
+
+_savings: contextvars.ContextVar[Optional[ContextSavings]] = contextvars.ContextVar("context_savings", default=None)
+
+
+@contextmanager
+def context_savings() -> Iterator[ContextSavings]:
+    """
+    Tally of the outputs fitted inside the block, the enclosing request's tally when there is one.
+    """
+    savings = _savings.get()
+    if savings is not None:
+        yield savings
+        return
+    savings = ContextSavings()
+    token = _savings.set(savings)
+    try:
+        yield savings
+    finally:
+        _savings.reset(token)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str) -> Any:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class TokenCounter:
+    """
+    Tokens of a text with the tokenizer of the model (tiktoken) when installed, estimated from
+    its length otherwise.
+    """
+
+    def __init__(self, model: Annotated[str, "Model whose tokenizer is used"] = "gpt-4",
+                 chars_per_token: Annotated[float, "Estimate used without tiktoken"] = 4.0):
+        self.model = model
+        self.chars_per_token = chars_per_token
+        self._encoding = _encoding(model)
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def head(self, text: Annotated[str, "text to cut"], tokens: Annotated[int, "tokens kept"]) -> str:
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max(0, tokens)])
+        return text[:int(max(0, tokens) * self.chars_per_token)]
+
+
+def parse_structured(text: Annotated[str, "subtask output"]) -> Annotated[Optional[Any], "list or dict, None for plain text"]:
+    """
+    Value of an output printed as JSON or as a Python literal (str() of a plugin result).
+    """
+    text = text.strip()
+    if not text or text[0] not in "[{":
+        return None
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    return value if isinstance(value, (list, tuple, dict)) else None
+
+
+def key_fields(value: Any, fields: FrozenSet[str], max_value_chars: int, dropped: Optional[Set[str]] = None) -> Any:
+    """
+    Reduce records to their key fields: dicts keep the fields named in `fields` and every nested
+    list or dict (all their scalars when they have no key field), strings longer than
+    `max_value_chars` are shortened. The names of the fields left out are added to `dropped`.
+    """
+    if isinstance(value, dict):
+        has_key_fields = any(str(name).casefold() in fields for name in value)
+        kept = {}
+        for name, item in value.items():
+            if not has_key_fields or str(name).casefold() in fields or isinstance(item, (list, tuple, dict)):
+                kept[name] = key_fields(item, fields, max_value_chars, dropped)
+            elif dropped is not None:
+                dropped.add(str(name))
+        return kept
+    if isinstance(value, (list, tuple)):
+        return [key_fields(item, fields, max_value_chars, dropped) for item in value]
+    if isinstance(value, str) and len(value) > max_value_chars:
+        return value[:max_value_chars].rstrip() + "..."
+    return value
+
+
+def _largest_list(value: Any) -> Optional[List[Any]]:
+    largest = value if isinstance(value, list) else None
+    children = value.values() if isinstance(value, dict) else value if isinstance(value, list) else ()
+    for child in children:
+        candidate = _largest_list(child)
+        if candidate is not None and (largest is None or len(candidate) > len(largest)):
+            largest = candidate
+    return largest
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+async def output_summarizer_summarize(text: str, max_tokens: int, kernel: Kernel) -> Any:
+    """
+    Default summarization, the hidden output_summarizer prompt function.
+    """
+    # utils.token_accounting counts tokens with TokenCounter, it cannot be imported at module level
+    from utils.token_accounting import llm_purpose
+
+    output_summarizer = kernel.func("output_summarizer", "output_summarizer")
+    with llm_purpose(purpose="output_summarizer"):
+        return await output_summarizer.invoke(kernel, KernelArguments(output=text, max_words=str(max(1, max_tokens * 3 // 4))))
+
+
+class ContextBudget:
+    """
+    Fits subtask outputs to the token budget of the prompt they are fed to.
+    """
+
+    def __init__(self, max_tokens: Annotated[int, "Tokens an output may take in a prompt, 0 disables fitting"] = 0,
+                 counter: Annotated[Optional[TokenCounter], "Token counter, gpt-4 tokenizer by default"] = None,
+                 fields: Annotated[FrozenSet[str], "Key fields kept by extraction, lower case"] = DEFAULT_KEY_FIELDS,
+                 max_value_chars: Annotated[int, "Longest string value kept whole by extraction"] = 200,
+                 summarize: Annotated[Optional[Summarize], "Summarization of plain text outputs, async (text, max_tokens, kernel), None truncates them"] = None,
+                 summary_cache_size: Annotated[int, "Summaries cached by content hash"] = 256):
+        self.max_tokens = max_tokens
+        self.counter = counter or TokenCounter()
+        self.fields = frozenset(field.casefold() for field in fields)
+        self.max_value_chars = max_value_chars
+        self.summarize = summarize
+        self.summary_cache_size = summary_cache_size
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_tokens > 0
+
+    async def fit(self, text: Annotated[str, "subtask output"],
+                  kernel: Annotated[Optional[Kernel], "kernel holding the output_summarizer function, None does not summarize"] = None,
+                  max_tokens: Annotated[Optional[int], "budget, the configured one if None"] = None) -> Fit:
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        tokens = self.counter.count(text)
+        if budget <= 0 or tokens <= budget:
+            return Fit(text, FitStrategy.FITS, tokens, tokens)
+
+        with start_span("context_budget", {"context.tokens": tokens, "context.budget": budget}) as span:
+            fitted, strategy = self._extract(text, budget), FitStrategy.EXTRACT
+            if fitted is None and self.summarize is not None and kernel is not None:
+                fitted, strategy = await self._summary(text, budget, kernel), FitStrategy.SUMMARIZE
+            if fitted is None:
+                fitted, strategy = self.truncate(text, budget), FitStrategy.TRUNCATE
+            fit = Fit(fitted, strategy, tokens, self.counter.count(fitted))
+            span.set_attributes({"context.strategy": strategy.value, "context.tokens_saved": fit.tokens_saved})
+
+        _fitted.inc(strategy.value)
+        _saved.inc(strategy.value, fit.tokens_saved)
+        savings = _savings.get()
+        if savings is not None:
+            savings.add(fit)
+        logger.debug("Fitted a %d token output to %d tokens (%s)", fit.tokens_before, fit.tokens_after, strategy.value)
+        return fit
+
+    def truncate(self, text: str, budget: int) -> str:
+        """
+        Head of the text within the budget, cut at a line end when one is close, and a note of
+        the tokens left out.
+        """
+        total = self.counter.count(text)
+        note = TRUNCATION_NOTE.format(omitted=total)
+        head = self.counter.head(text, budget - self.counter.count(note))
+        line_end = head.rfind("\n")
+        if line_end > len(head) // 2:
+            head = head[:line_end]
+        return head + TRUNCATION_NOTE.format(omitted=max(0, total - self.counter.count(head)))
+
+    def _extract(self, text: str, budget: int) -> Optional[str]:
+        value = parse_structured(text)
+        if value is None:
+            return None
+        dropped: Set[str] = set()
+        value = key_fields(value, self.fields, self.max_value_chars, dropped)
+        if dropped:
+            logger.info("Context budget left fields %s out of a %d character output", sorted(dropped), len(text))
+        fitted = _dumps(value)
+        if self.counter.count(fitted) <= budget:
+            return fitted
+
+        # Keep as many records of the longest list as fit
+        records = _largest_list(value)
+        if not records:
+            return None
+        items = list(records)
+        low, high = 1, len(items) - 1
+        best: Optional[str] = None
+        while low <= high:
+            kept = (low + high) // 2
+            records[:] = items[:kept] + [OMITTED_RECORDS_NOTE.format(omitted=len(items) - kept)]
+            candidate = _dumps(value)
+            if self.counter.count(candidate) <= budget:
+                best, low = candidate, kept + 1
+            else:
+                high = kept - 1
+        return best
+
+    @staticmethod
+    def summary_key(text: str, budget: int) -> str:
+        return hashlib.sha256(f"{budget}\n{text}".encode("utf-8")).hexdigest()
+
+    async def _summary(self, text: str, budget: int, kernel: Kernel) -> Optional[str]:
+        key = self.summary_key(text, budget)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+                return summary
+        try:
+            # Concurrent subtasks fed with the same output share one summarization
+            summary = str(await get_singleflight("context_summary").do(key, lambda: self.summarize(text, budget, kernel))).strip()
+        except Exception as error:
+            logger.warning("Summarization of a %d character output failed, truncating it: %s", len(text), error)
+            return None
+        if not summary:
+            return None
+        if self.counter.count(summary) > budget:
+            summary = self.truncate(summary, budget)
+        if self.summary_cache_size:
+            with self._lock:
+                self._summaries[key] = summary
+                self._summaries.move_to_end(key)
+                while len(self._summaries) > self.summary_cache_size:
+                    self._summaries.popitem(last=False)
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        return {"fitted": _fitted.values(), "tokens_saved": _saved.values(), "summaries_cached": len(self._summaries),
+                "exact_counts": self.counter.exact}
+
+
+_default_budget: Optional[ContextBudget] = None
+
+
+def get_context_budget() -> ContextBudget:
+    """
+    Process wide budget, from CONTEXT_BUDGET_TOKENS (unset or 0 disables it, 1000 is a good
+    start) and CONTEXT_SUMMARIZE=1 (summarize plain text outputs instead of truncating them).
+    """
+    global _default_budget
+    if _default_budget is None:
+        _default_budget = ContextBudget(
+            max_tokens=int(os.getenv("CONTEXT_BUDGET_TOKENS", "0")),
+            summarize=output_summarizer_summarize if os.getenv("CONTEXT_SUMMARIZE", "0") == "1" else None)
+    return _default_budget
@@ -1,22 +1,161 @@
-from typing import Union, Any, Dict
+from typing import Union, Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
 import inspect
 import logging
+import threading
+from weakref import WeakKeyDictionary
+
+from pydantic import PrivateAttr
 
 import semantic_kernel as sk
 from semantic_kernel.functions.kernel_plugin import KernelPlugin
 from semantic_kernel.exceptions import PluginInvalidNameError, FunctionNameNotUniqueError
 from semantic_kernel.functions.kernel_function import KernelFunction
 from semantic_kernel.functions.kernel_function_from_method import KernelFunctionFromMethod
+from semantic_kernel.functions.kernel_function_metadata import KernelFunctionMetadata
 
 from semantic_kernel.connectors.openai_plugin.openai_function_execution_parameters import (
     OpenAIFunctionExecutionParameters,
 )
 
+from utils.thread_offload import needs_offload, offload_sync_method
+from utils.plan_cache import NON_CATALOG_PLUGINS
+from utils.lazy_plugins import LazyPluginSpec, lazy_plugin_functions
+
 logger: logging.Logger = logging.getLogger(__name__)
 
 
+class PluginSpec(NamedTuple):
+    """
+    A plugin object to register with CustomKernel.import_plugins.
+    """
+    instance: Any
+    name: str
+    description: str = ""
+
+
+class _FunctionTemplate(NamedTuple):
+    attribute: str
+    metadata: KernelFunctionMetadata
+    streams: bool
+    offload: bool
+
+
+# plugin class -> (plugin name, offload_sync) -> introspected kernel functions of the class
+_class_function_templates: "WeakKeyDictionary[type, Dict[Tuple[str, bool], List[_FunctionTemplate]]]" = WeakKeyDictionary()
+_class_function_templates_lock = threading.Lock()
+
+
+def clear_plugin_metadata_cache() -> None:
+    with _class_function_templates_lock:
+        _class_function_templates.clear()
+
+
+def _build_functions(candidates: Iterable[Tuple[str, Any]], plugin_name: str, offload_sync: bool) -> Tuple[Dict[str, KernelFunction], List[_FunctionTemplate]]:
+    functions: Dict[str, KernelFunction] = {}
+    templates: List[_FunctionTemplate] = []
+    # Read every method from the plugin instance
+    for attribute, candidate in candidates:
+        # If the method is a prompt function, register it
+        if not hasattr(candidate, "__kernel_function__"):
+            continue
+
+        offload = offload_sync and needs_offload(candidate)
+        if offload:
+            candidate = offload_sync_method(candidate)
+
+        func = KernelFunctionFromMethod(plugin_name=plugin_name, method=candidate)
+        if func.name in functions:
+            raise FunctionNameNotUniqueError(
+                "Overloaded functions are not supported, " "please differentiate function names."
+            )
+        functions[func.name] = func
+        templates.append(_FunctionTemplate(attribute=attribute, metadata=func.metadata,
+                                           streams=func.stream_method is not None, offload=offload))
+    return functions, templates
+
+
+def functions_from_object(plugin_instance: Union[Any, Dict[str, Any]], plugin_name: str, offload_sync: bool) -> Dict[str, KernelFunction]:
+    """
+    Kernel functions of a plugin object. The signature parsing and metadata of a plugin class is
+    done once per (class, plugin name) and reused for its next instances, which are only bound.
+    """
+    if isinstance(plugin_instance, dict):
+        return _build_functions(plugin_instance.items(), plugin_name, offload_sync)[0]
+
+    plugin_class = type(plugin_instance)
+    key = (plugin_name, offload_sync)
+    templates = _class_function_templates.get(plugin_class, {}).get(key)
+    if templates is None:
+        functions, templates = _build_functions(inspect.getmembers(plugin_instance, inspect.ismethod), plugin_name, offload_sync)
+        with _class_function_templates_lock:
+            _class_function_templates.setdefault(plugin_class, {})[key] = templates
+        return functions
+
+    functions = {}
+    for template in templates:
+        method = getattr(plugin_instance, template.attribute)
+        if template.offload:
+            method = offload_sync_method(method)
+        # Metadata was validated when the class was first imported
+        functions[template.metadata.name] = KernelFunctionFromMethod.model_construct(
+            metadata=template.metadata, method=method, stream_method=method if template.streams else None)
+    return functions
+
+
 class CustomKernel(sk.Kernel):
-    def import_plugin_from_object(self, plugin_instance: Union[Any, Dict[str, Any]], plugin_name: str, plugin_description: str = "") -> KernelPlugin:
+    # Bumped whenever plugins or functions are added, used to invalidate catalog dependent caches.
+    _catalog_version: int = PrivateAttr(default=0)
+    # Kernel whose catalog this one shares, set on views until they change their own catalog.
+    _catalog_id: Optional[int] = PrivateAttr(default=None)
+    # Plugins still shared with the kernel this view was taken from, copied before being modified.
+    _shared_plugins: FrozenSet[str] = PrivateAttr(default=frozenset())
+
+    @property
+    def catalog_version(self) -> int:
+        return self._catalog_version
+
+    @property
+    def catalog_id(self) -> int:
+        """
+        Identifies the plugin catalog, views share it with their template so catalog dependent
+        caches (plan fingerprints) are computed once.
+        """
+        return self._catalog_id if self._catalog_id is not None else id(self)
+
+    def view(self) -> "CustomKernel":
+        """
+        Cheap per-request kernel sharing the plugins, their functions and the AI services of this one.
+        Plugin collection, services and handlers are shallow copies, so registering plugins or
+        handlers on the view does not leak into this kernel.
+        """
+        plugins = self.plugins.model_copy(update={"plugins": dict(self.plugins.plugins)})
+        view = self.model_copy(update={
+            "plugins": plugins,
+            "services": dict(self.services),
+            "function_invoking_handlers": dict(self.function_invoking_handlers),
+            "function_invoked_handlers": dict(self.function_invoked_handlers),
+        })
+        view._catalog_id = self.catalog_id
+        view._shared_plugins = frozenset(plugins.plugins)
+        return view
+
+    def _catalog_changed(self, plugin_name: str) -> None:
+        if plugin_name in NON_CATALOG_PLUGINS:
+            # The planner's own function (registered on every create_plan) and the hidden ones are not part of the catalog
+            return
+        self._catalog_version += 1
+        self._catalog_id = None
+
+    def add_plugin(self, plugin_name: str, functions: List[KernelFunction], plugin: Optional[KernelPlugin] = None) -> None:
+        if plugin_name in self._shared_plugins:
+            shared = self.plugins.plugins[plugin_name]
+            self.plugins.plugins[plugin_name] = shared.model_copy(update={"functions": dict(shared.functions)})
+            self._shared_plugins = self._shared_plugins - {plugin_name}
+        super().add_plugin(plugin_name, functions, plugin)
+        self._catalog_changed(plugin_name)
+
+    def import_plugin_from_object(self, plugin_instance: Union[Any, Dict[str, Any]], plugin_name: str, plugin_description: str = "",
+                                  offload_sync: bool = True) -> KernelPlugin:
         """
         Creates a plugin that wraps the specified target object and imports it into the kernel's plugin collection
 
@@ -25,38 +164,76 @@ class CustomKernel(sk.Kernel):
                 dictionary of classes that contains methods with the kernel_function decorator for one or
                 several methods. See `TextMemoryPlugin` as an example.
             plugin_name (str): The name of the plugin. Allows chars: upper, lower ASCII and underscores.
+            plugin_description (str): The description of the plugin shown to the planner.
+            offload_sync (bool): Run sync kernel functions in a bounded thread pool so they do not
+                block the event loop.
 
         Returns:
             KernelPlugin: The imported plugin of type KernelPlugin.
         """
         if not plugin_name.strip():
             raise PluginInvalidNameError("Plugin name cannot be empty")
-        logger.debug(f"Importing plugin {plugin_name}")
-
-        functions: Dict[str, KernelFunction] = {}
-
-        if isinstance(plugin_instance, dict):
-            candidates = plugin_instance.items()
-        else:
-            candidates = inspect.getmembers(plugin_instance, inspect.ismethod)
-        # Read every method from the plugin instance
-        for _, candidate in candidates:
-            # If the method is a prompt function, register it
-            if not hasattr(candidate, "__kernel_function__"):
-                continue
-
-            func = KernelFunctionFromMethod(plugin_name=plugin_name, method=candidate)
-            if func.name in functions:
-                raise FunctionNameNotUniqueError(
-                    "Overloaded functions are not supported, " "please differentiate function names."
-                )
-            functions[func.name] = func
-        logger.debug(f"Methods imported: {len(functions)}")
+        logger.debug("Importing plugin %s", plugin_name)
+
+        functions = functions_from_object(plugin_instance, plugin_name, offload_sync)
+        logger.debug("Methods imported: %d", len(functions))
 
         plugin = KernelPlugin(name=plugin_name, functions=functions, description=plugin_description)
         self.plugins.add(plugin)
+        self._catalog_changed(plugin_name)
 
         return plugin
+
+    def import_plugins(self, plugins: Iterable[Union[PluginSpec, Tuple[Any, str], Tuple[Any, str, str]]],
+                       offload_sync: bool = True) -> List[KernelPlugin]:
+        """
+        Import many plugin objects in one pass. Every plugin is built before any is registered, so
+        a failing plugin leaves the kernel untouched.
+
+        Args:
+            plugins: PluginSpec (or (instance, name[, description]) tuples) to import.
+            offload_sync (bool): Run sync kernel functions in a bounded thread pool.
+
+        Returns:
+            List[KernelPlugin]: The imported plugins, in the given order.
+        """
+        built: List[KernelPlugin] = []
+        names = set()
+        for spec in plugins:
+            spec = PluginSpec(*spec)
+            if not spec.name.strip():
+                raise PluginInvalidNameError("Plugin name cannot be empty")
+            if spec.name in names:
+                raise PluginInvalidNameError(f"Plugin {spec.name} is imported twice")
+            names.add(spec.name)
+            functions = functions_from_object(spec.instance, spec.name, offload_sync)
+            built.append(KernelPlugin(name=spec.name, functions=functions, description=spec.description))
+
+        self._register_plugins(built)
+        return built
+
+    def import_lazy_plugins(self, specs: Iterable[LazyPluginSpec], offload_sync: bool = True) -> List[KernelPlugin]:
+        """
+        Register plugins by their declared metadata without importing them. Each plugin class is
+        imported and instantiated the first time one of its functions is invoked.
+
+        Args:
+            specs: LazyPluginSpec with the import path and declared functions of each plugin.
+            offload_sync (bool): Run sync kernel functions in a bounded thread pool.
+
+        Returns:
+            List[KernelPlugin]: The registered plugins, in the given order.
+        """
+        built = [KernelPlugin(name=spec.name, functions=lazy_plugin_functions(spec, offload_sync), description=spec.description)
+                 for spec in specs]
+        self._register_plugins(built)
+        return built
+
+    def _register_plugins(self, plugins: List[KernelPlugin]) -> None:
+        for plugin in plugins:
+            self.plugins.add(plugin)
+            self._catalog_changed(plugin.name)
+        logger.debug("Imported %d plugins", len(plugins))
     
     async def import_plugin_from_openai(
         self,
@@ -1,9 +1,39 @@
+"""
+Loggers of the orchestrator.
+
+Every logger from getLogger writes through one shared handler, which routes records to the
+configured sink:
+    sync   records are formatted and written by the calling thread (default)
+    queue  records are put on a queue and written by a background QueueListener thread, so
+           logging never blocks the event loop on stdout/stderr
+
+Configured with configure_logging or from the environment:
+    LOG_MODE         sync | queue
+    LOG_FORMAT       text | json (compact, one object per line, never colored)
+    LOG_RATE_LIMIT   max records per second per logger, 0 disables (default)
+    LOG_SAMPLE_RATE  fraction of DEBUG/INFO records kept, warnings and errors are always kept
+Text output is colored only when the stream is a terminal and NO_COLOR is not set.
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import random
 import logging
+import threading
+from time import monotonic
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+LOG_FORMAT = "%(asctime)s - %(pathname)s:%(lineno)d - %(funcName)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 class LogColors:
     RED = "\033[91m"
     YELLOW = "\033[93m"
-    ORANGE = "\033[38;5;208m" 
+    ORANGE = "\033[38;5;208m"
     CYAN = "\033[36m"
     RESET = "\033[0m"
 
@@ -17,21 +47,185 @@ class CustomFormatter(logging.Formatter):
     def format(self, record):
         color = self.COLOR_MAP.get(record.levelno)
         if color:
-            record.msg = f"{color}{record.msg}{LogColors.RESET}"
+            # Color a copy, the record may be formatted by other handlers
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = f"{color}{record.getMessage()}{LogColors.RESET}"
+            record.args = None
         return super().format(record)
 
-def getLogger(name, level=None):
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO if not level else level)
+class JsonFormatter(logging.Formatter):
+    """
+    One compact JSON object per record, without ANSI codes.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "at": f"{record.module}:{record.lineno}",
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
 
-    log_format = "%(asctime)s - %(pathname)s:%(lineno)d - %(funcName)s - %(levelname)s - %(message)s"
-    formatter = CustomFormatter(log_format, datefmt="%Y-%m-%d %H:%M:%S")
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per logger: at most `rate` records per second, with bursts of `burst`.
+    The first record let through after a drop carries the number dropped as `record.suppressed`.
+    """
 
-    if not logger.handlers:
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = float(burst or max(1, int(rate)))
+        self._tokens = self.burst
+        self._updated = monotonic()
+        self._suppressed = 0
+        self._lock = threading.Lock()
 
-    return logger
+    def filter(self, record):
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1.0:
+                self._suppressed += 1
+                return False
+            self._tokens -= 1.0
+            if self._suppressed:
+                record.suppressed, self._suppressed = self._suppressed, 0
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of the records below WARNING.
+    """
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.sample_rate
+
+class _SharedHandler(logging.Handler):
+    """
+    The handler of every logger, forwarding records to the current sink.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sink: logging.Handler = logging.NullHandler()
+
+    def handle(self, record):
+        # No lock here, the sink handler takes its own
+        if self.filter(record):
+            self.sink.handle(record)
+            return True
+        return False
+
+    def emit(self, record):
+        self.sink.handle(record)
 
+_shared_handler = _SharedHandler()
+_exception_formatter = logging.Formatter()
+_listener: Optional[QueueListener] = None
+_config = {"configured": False}
+_config_lock = threading.Lock()
 
+class _DroppingQueueHandler(QueueHandler):
+    dropped = 0
+
+    def prepare(self, record):
+        # Merge the args now (they may change before the listener runs) but keep the traceback
+        # apart from the message, so the formatters can still place it
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+def _use_color(stream: TextIO) -> bool:
+    return "NO_COLOR" not in os.environ and hasattr(stream, "isatty") and stream.isatty()
+
+def _build_formatter(log_format: str, stream: TextIO) -> logging.Formatter:
+    if log_format == "json":
+        return JsonFormatter()
+    if _use_color(stream):
+        return CustomFormatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+    return logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+
+def configure_logging(mode: Optional[str] = None, log_format: Optional[str] = None, stream: Optional[TextIO] = None,
+                      rate_limit: Optional[float] = None, sample_rate: Optional[float] = None,
+                      max_queue: int = 10000) -> None:
+    """
+    (Re)configure the sink of every custom logger. Arguments left to None are read from the
+    environment. rate_limit and sample_rate apply to loggers created afterwards.
+    In queue mode records are dropped, not waited for, when `max_queue` records are pending.
+    """
+    global _listener
+    mode = mode or os.getenv("LOG_MODE", "sync")
+    log_format = log_format or os.getenv("LOG_FORMAT", "text")
+    if mode not in ("sync", "queue"):
+        raise ValueError(f"Unknown log mode {mode}")
+    if log_format not in ("text", "json"):
+        raise ValueError(f"Unknown log format {log_format}")
+    stream = stream or sys.stderr
+
+    with _config_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+        output = logging.StreamHandler(stream)
+        output.setFormatter(_build_formatter(log_format, stream))
+        if mode == "queue":
+            _listener = QueueListener(queue.Queue(max_queue), output, respect_handler_level=False)
+            _listener.start()
+            _shared_handler.sink = _DroppingQueueHandler(_listener.queue)
+        else:
+            _shared_handler.sink = output
+
+        _config.update(
+            configured=True,
+            rate_limit=float(os.getenv("LOG_RATE_LIMIT", "0")) if rate_limit is None else rate_limit,
+            sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "1")) if sample_rate is None else sample_rate,
+        )
+
+@atexit.register
+def _stop_listener() -> None:
+    # Flush the records still queued
+    if _listener is not None:
+        _listener.stop()
+
+def getLogger(name, level=None, rate_limit: Optional[float] = None, sample_rate: Optional[float] = None):
+    if not _config["configured"]:
+        configure_logging()
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO if not level else level)
+
+    if _shared_handler not in logger.handlers:
+        logger.addHandler(_shared_handler)
+        rate_limit = _config["rate_limit"] if rate_limit is None else rate_limit
+        sample_rate = _config["sample_rate"] if sample_rate is None else sample_rate
+        if sample_rate < 1.0:
+            logger.addFilter(SamplingFilter(sample_rate))
+        if rate_limit > 0:
+            logger.addFilter(RateLimitFilter(rate_limit))
+
+    return logger
@@ -1,29 +1,171 @@
 # Standard imports
-import regex
-import json
+import copy
+import asyncio
 
-from typing import Any, Annotated, Dict
+from typing import Any, Annotated, AsyncIterator, Dict, List, Optional, Tuple
 
 # Third party
 import semantic_kernel as sk
 from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.functions.function_result import FunctionResult
 from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.functions.kernel_function import KernelFunction
+from semantic_kernel.functions.kernel_function_from_prompt import KernelFunctionFromPrompt
+from semantic_kernel.prompt_template.prompt_template_config import PromptTemplateConfig
 
 from semantic_kernel.planners.basic_planner import (
     BasicPlanner, 
-    Plan
+    Plan,
+    PROMPT
 )
 
 # Internal imports
 from request_utils.logger import MethodObservability
 from utils.input_model import Question
+from utils.context_budget import ContextBudget, FitStrategy, context_savings, get_context_budget
 from utils import custom_logs
+from utils.plan_cache import PLANNER_PLUGIN_NAME, PlanCache, catalog_fingerprint
+from utils.prompt_cache import PromptCompilationCache, function_manual, get_prompt_cache
+from utils.semantic_plan_index import SemanticPlanIndex
+from utils.plan_events import PlanEvent, PlanEventEmitter, PlanEventType
+from utils.plan_parser import parse_plan
+from utils.plan_graph import PlanNode, build_plan_graph, dependency_context, resolve_references, sink_indexes, uses_references
+from utils.llm_scheduler import FINAL_ANSWER, PLANNING, llm_call_context
+from utils.question_rewriter import QuestionRewriter
+from utils.token_accounting import LLMUsage, current_usage, llm_purpose, token_accounting
+from utils.tracing import question_attributes, start_span
 
 logger = custom_logs.getLogger(__name__)
 
 
+class PlanResult(str):
+    """
+    Answer of execute_plan, carrying the token and cost summary of the request (see
+    utils.token_accounting): the plan's own LLM calls, and the planning calls too when they
+    were made in the same token_accounting block or by create_plan.
+    """
+    llm_usage: Dict[str, Any]
+
+    def __new__(cls, value: str, llm_usage: Dict[str, Any]) -> "PlanResult":
+        result = super().__new__(cls, value)
+        result.llm_usage = llm_usage
+        return result
+
+
 class CustomBasicPlanner(BasicPlanner, metaclass=MethodObservability):
 
+    def __init__(self, service_id: str, execution_mode: Annotated[str, "'sequential' or 'parallel'"] = "sequential",
+                 max_concurrency: Annotated[int, "Max subtasks running at once in parallel mode"] = 4,
+                 plan_cache: Annotated[Optional[PlanCache], "Cache of generated plans, None disables it"] = None,
+                 semantic_index: Annotated[Optional[SemanticPlanIndex], "Reuse plans of paraphrased questions, None disables it"] = None,
+                 question_rewriter: Annotated[Optional[QuestionRewriter], "Rewrites questions with previous outputs, local strategies first"] = None,
+                 context_budget: Annotated[Optional[ContextBudget], "Fits previous outputs to the prompts they feed, the process wide one by default"] = None,
+                 prompt_cache: Annotated[Optional[PromptCompilationCache], "Compiled planner prompts by catalog, the process wide one by default"] = None) -> None:
+        super().__init__(service_id=service_id)
+        if execution_mode not in ("sequential", "parallel"):
+            raise ValueError(f"Unknown execution mode {execution_mode}")
+        self.execution_mode = execution_mode
+        self.max_concurrency = max_concurrency
+        self.plan_cache = plan_cache
+        self.semantic_index = semantic_index
+        self.context_budget = context_budget or get_context_budget()
+        self.question_rewriter = question_rewriter or QuestionRewriter(context_budget=self.context_budget)
+        self.prompt_cache = prompt_cache or get_prompt_cache()
+        # catalog id (kernel id, shared by kernel views) -> (catalog version, prompt, fingerprint)
+        self._catalog_fingerprints: Dict[int, Tuple[int, str, str]] = {}
+
+    def catalog_fingerprint(self, kernel: Kernel, prompt: str) -> str:
+        """
+        Fingerprint of the kernel catalog and planner prompt, recomputed only when the catalog changes.
+        Cached plans of the previous catalog are dropped when it does.
+        """
+        version = getattr(kernel, "catalog_version", None)
+        catalog_id = getattr(kernel, "catalog_id", id(kernel))
+        known = self._catalog_fingerprints.get(catalog_id)
+        if version is not None and known is not None and known[0] == version and known[1] == prompt:
+            return known[2]
+
+        fingerprint = catalog_fingerprint(kernel, prompt)
+        if known is not None and known[1] == prompt and known[2] != fingerprint:
+            logger.info("Plugin catalog changed, invalidating cached plans")
+            if self.plan_cache is not None:
+                self.plan_cache.invalidate(known[2])
+            if self.semantic_index is not None:
+                self.semantic_index.invalidate(known[2])
+        if version is not None:
+            self._catalog_fingerprints[catalog_id] = (version, prompt, fingerprint)
+        return fingerprint
+
+    async def create_plan(self, goal: str, kernel: Kernel, prompt: str = PROMPT) -> Plan:
+        """
+        Creates a plan for the given goal, reusing a cached plan when the same question (or a
+        close paraphrase, when a semantic index is set) was already planned against the same
+        catalog and prompt. Plans reused from a paraphrase carry a `semantic_match` attribute
+        with the matched question and its score, and every plan an `llm_usage` tally of the
+        completions spent creating it.
+        """
+        with start_span("create_plan", {"goal.chars": len(goal)}) as span, llm_call_context(priority=PLANNING), \
+                llm_purpose(purpose="planner", plugin=""), token_accounting(nested=True) as usage:
+            plan = await self._create_plan(goal, kernel, prompt, span)
+            span.set_attributes({"llm.prompt_tokens": usage.total["prompt_tokens"], "llm.completion_tokens": usage.total["completion_tokens"]})
+        plan.llm_usage = usage
+        return plan
+
+    async def _create_plan(self, goal: str, kernel: Kernel, prompt: str, span: Any) -> Plan:
+        fingerprint = self.catalog_fingerprint(kernel, prompt)
+        if self.plan_cache is None and self.semantic_index is None:
+            span.set_attribute("plan.source", "llm")
+            return await self._generate_plan(goal, kernel, prompt, fingerprint)
+
+        if self.plan_cache is not None:
+            cached_plan = self.plan_cache.get(goal, fingerprint)
+            if cached_plan is not None:
+                logger.info("Plan cache hit for goal: %s", goal)
+                span.set_attribute("plan.source", "cache")
+                return Plan(prompt=cached_plan.prompt, goal=goal, plan=cached_plan.generated_plan)
+
+        if self.semantic_index is not None:
+            match = self.semantic_index.lookup(goal, fingerprint)
+            if match is not None:
+                logger.info("Reusing plan of '%s' for goal '%s' (similarity %.3f)", match.question, goal, match.score)
+                plan = Plan(prompt=match.plan.prompt, goal=goal, plan=match.plan.generated_plan)
+                plan.semantic_match = match
+                span.set_attributes({"plan.source": "semantic_index", "plan.similarity": float(match.score)})
+                # Not put in the plan cache: a reuse stays a lookup, checked again on every request
+                return plan
+
+        span.set_attribute("plan.source", "llm")
+        plan = await self._generate_plan(goal, kernel, prompt, fingerprint)
+        if self.plan_cache is not None:
+            self.plan_cache.put(goal, fingerprint, plan)
+        if self.semantic_index is not None:
+            self.semantic_index.add(goal, fingerprint, plan)
+        return plan
+
+    def planner_function(self, kernel: Kernel, prompt: str,
+                         fingerprint: Annotated[str, "catalog fingerprint of the kernel and prompt"]) -> KernelFunctionFromPrompt:
+        """
+        The planner prompt function of a catalog, compiled once: the template is parsed and the
+        function manual rendered in, so planning a goal only substitutes the goal.
+        """
+        def compile() -> KernelFunctionFromPrompt:
+            execution_settings = PromptExecutionSettings(service_id=self.service_id, max_tokens=1000, temperature=0.8)
+            template = self.prompt_cache.template(
+                PromptTemplateConfig(template=prompt, execution_settings=execution_settings),
+                static_values={"available_functions": function_manual(kernel)}, key=("planner_template", fingerprint, self.service_id))
+            return KernelFunctionFromPrompt(function_name="CreatePlan", plugin_name=PLANNER_PLUGIN_NAME, prompt_template=template)
+
+        return self.prompt_cache.get_or_compile(("planner_function", fingerprint, self.service_id), compile)
+
+    async def _generate_plan(self, goal: str, kernel: Kernel, prompt: str, fingerprint: str) -> Plan:
+        """
+        BasicPlanner.create_plan with the compiled planner function, which is not registered in
+        the kernel: it is not part of the catalog offered to the planner.
+        """
+        generated_plan = await self.planner_function(kernel, prompt, fingerprint).invoke(kernel, KernelArguments(goal=goal))
+        return Plan(prompt=prompt, goal=goal, plan=generated_plan)
+
     def update_function_args(self, kernel: Kernel, func_name: Annotated[str, "name of the function"],
                              func_args: Annotated[Dict[str, str], "arguments for function generated by planner"],
                              **kwargs: Any) -> Dict[str, str]:
@@ -35,73 +177,291 @@ class CustomBasicPlanner(BasicPlanner, metaclass=MethodObservability):
                     if parameter.name == update_parameter:
                         if update_parameter in func_args:
                             original_question = func_args[update_parameter]
-                            logger.debug(f"Replaced parameter {update_parameter} with original value: {str(original_question)} with new value: {update_parameter_value}")
+                            logger.debug("Replaced parameter %s with original value: %s with new value: %s", update_parameter, original_question, update_parameter_value)
                         func_args[update_parameter] = update_parameter_value
          
          return func_args
     
     async def update_next_question(self, original_input: Annotated[str, "Original input from user"],
                              output_previous_function: Annotated[str, "output from previous functions"],
-                             kernel: Kernel) -> Annotated[str, "List of incidences"]:
+                             kernel: Kernel,
+                             depends: Annotated[bool, "Whether the step depends on the previous output"] = True,
+                             outputs: Annotated[Optional[Dict[int, str]], "Outputs of the finished steps by index"] = None,
+                             index: Annotated[Optional[int], "Index of the step"] = None) -> Annotated[str, "Updated question"]:
         """
-        Update the question of the next step in the plan based on the output of the last invoked function
+        Update the question of the next step in the plan based on the output of the last invoked function.
+        Local rewrites are tried first, the question_updater function is only called when they do not apply.
         """
-        question_update_question = kernel.func("question_updater", "question_updater")
-        arguments = KernelArguments(question=original_input, previous_output=output_previous_function)
-        logger.info(f"parameters update_next_question: {original_input} ---- {output_previous_function}")
-        return await question_update_question.invoke(kernel, arguments)
+        logger.info("parameters update_next_question: %s ---- %s", original_input, output_previous_function)
+        with start_span("update_next_question", {"question.chars": len(original_input),
+                                                  "context.chars": len(output_previous_function or "")}) as span, \
+                llm_purpose(purpose="question_updater"):
+            rewrite = await self.question_rewriter.rewrite(original_input, output_previous_function, kernel, depends=depends,
+                                                           outputs=outputs, index=index)
+            span.set_attributes({"rewrite.strategy": rewrite.strategy.value, "rewrite.chars": len(rewrite.question)})
+        logger.info("question rewrite strategy: %s", rewrite.strategy.value)
+        return rewrite.question
 
 
          
-    async def execute_plan(self, plan: Plan, kernel: Kernel, question: Question, headers) -> str:
+    def parse_generated_plan(self, plan: Plan) -> Dict[str, Any]:
+        """
+        Extract the JSON plan from the planner completion.
+        """
+        return parse_plan(str(plan.generated_plan.value))
+
+    async def execute_plan(self, plan: Plan, kernel: Kernel, question: Question, headers,
+                           execution_mode: Optional[Annotated[str, "Overrides the planner execution mode"]] = None) -> str:
         """
         Given a plan, execute each of the functions within the plan
         from start to finish and output the result.
         """
+        return await self._run_plan(plan, kernel, question, headers, execution_mode, PlanEventEmitter(), stream_final_answer=False)
+
+    async def execute_plan_stream(self, plan: Plan, kernel: Kernel, question: Question, headers,
+                                  execution_mode: Optional[Annotated[str, "Overrides the planner execution mode"]] = None,
+                                  stream_final_answer: Annotated[bool, "Stream the final answer token by token when it comes from a prompt function"] = True
+                                  ) -> AsyncIterator[PlanEvent]:
+        """
+        Execute the plan like execute_plan, yielding PlanEvents as it progresses: plan parsed,
+        subtask started, question rewritten, subtask output, answer tokens and final answer.
+        """
+        queue: "asyncio.Queue[Optional[PlanEvent]]" = asyncio.Queue()
+        emitter = PlanEventEmitter(queue.put_nowait)
+        runner = asyncio.ensure_future(self._run_plan(plan, kernel, question, headers, execution_mode, emitter, stream_final_answer))
+        runner.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            # Surface the execution error, if any
+            runner.result()
+        finally:
+            if not runner.done():
+                runner.cancel()
 
-        # Filter out good JSON from the result in case additional text is present
-        json_regex = r"\{(?:[^{}]|(?R))*\}"
-        generated_plan_string = regex.search(json_regex, str(plan.generated_plan.value)).group()
+    async def _run_plan(self, plan: Plan, kernel: Kernel, question: Question, headers, execution_mode: Optional[str],
+                        emitter: PlanEventEmitter, stream_final_answer: bool) -> str:
+        execution_mode = execution_mode or self.execution_mode
+        attributes = question_attributes(question)
+        attributes["execution_mode"] = execution_mode
+        # Planning completions are already in the tally of an enclosing block, or only in the plan's.
+        # Either way they are reported once, not again by later executions of the same plan.
+        plan_usage: Optional[LLMUsage] = getattr(plan, "llm_usage", None) if current_usage() is None else None
+        plan.llm_usage = None
+        with start_span("execute_plan", attributes) as span, llm_call_context(domain=question.domain_id), context_savings() as savings, \
+                token_accounting() as usage:
+            if plan_usage is not None:
+                usage.merge(plan_usage)
+            generated_plan = self.parse_generated_plan(plan)
+            span.set_attribute("plan.subtasks", len(generated_plan["subtasks"]))
+            emitter.emit(PlanEventType.PLAN_PARSED, data=copy.deepcopy(generated_plan), started_ms=0.0)
 
-        # TODO: there is some silly escape chars affecting the result of plan.generated_plan.value
-        # There should be \n only but they are showing up as \\n
-        encoded_bytes = generated_plan_string.encode("utf-8")
-        decoded_string = encoded_bytes.decode("unicode_escape")
+            if execution_mode == "parallel":
+                output = await self._execute_plan_parallel(generated_plan, kernel, question, headers, emitter, stream_final_answer)
+            else:
+                output = await self._execute_plan_sequential(generated_plan, kernel, question, headers, emitter, stream_final_answer)
+            span.set_attributes({"output.chars": len(str(output)), "context.tokens_saved": savings.tokens_saved,
+                                 "llm.calls": usage.total["calls"], "llm.prompt_tokens": usage.total["prompt_tokens"],
+                                 "llm.completion_tokens": usage.total["completion_tokens"], "llm.cost_usd": usage.total["cost_usd"]})
+            output = PlanResult(output, usage.summary())
+        if savings.tokens_saved:
+            logger.info("Context budget saved %d prompt tokens (%s)", savings.tokens_saved, savings.fits)
+        logger.info("LLM usage of message %s: %d calls, %d prompt and %d completion tokens, %.4f USD", question.message_id,
+                    output.llm_usage["calls"], output.llm_usage["prompt_tokens"], output.llm_usage["completion_tokens"],
+                    output.llm_usage["cost_usd"])
+
+        emitter.emit(PlanEventType.FINAL_ANSWER, data=output, started_ms=0.0)
+        return output
 
-        generated_plan = json.loads(decoded_string)
+    async def _invoke_subtask_function(self, kernel_function: KernelFunction, kernel: Kernel, arguments: KernelArguments,
+                                       emitter: PlanEventEmitter, index: int, stream: bool, final: bool = False) -> Any:
+        """
+        Invoke the function of a subtask, streaming its answer tokens as events when requested
+        and the function is a chat/text completion. The completions of `final` subtasks (the
+        answer) get the FINAL_ANSWER scheduling priority.
+        """
+        if final:
+            with llm_call_context(priority=FINAL_ANSWER), llm_purpose(purpose="answer"):
+                return await self._invoke_subtask_function(kernel_function, kernel, arguments, emitter, index, stream)
+        if isinstance(kernel_function, KernelFunctionFromPrompt) and self.context_budget.enabled:
+            arguments = await self._fit_prompt_arguments(kernel_function, kernel, arguments)
+        if not (stream and isinstance(kernel_function, KernelFunctionFromPrompt)):
+            return await kernel_function.invoke(kernel, arguments)
+
+        function = f"{kernel_function.plugin_name}.{kernel_function.name}"
+        chunks = []
+        async for partial in kernel_function.invoke_stream(kernel, arguments):
+            if isinstance(partial, FunctionResult):
+                if partial.metadata.get("exception"):
+                    raise partial.metadata["exception"]
+                continue
+            # Only the first choice is part of the answer
+            token = str(partial[0]) if partial else ""
+            if token:
+                chunks.append(token)
+                emitter.emit(PlanEventType.ANSWER_TOKEN, data=token, subtask_index=index, function=function)
+        return "".join(chunks)
+
+    async def _fit_prompt_arguments(self, kernel_function: KernelFunctionFromPrompt, kernel: Kernel,
+                                    arguments: KernelArguments) -> KernelArguments:
+        """
+        Fit the string arguments used by the prompt (the previous output as $input...) to the
+        context budget. The arguments are copied when one is fitted, the plan keeps the full outputs.
+        """
+        template = kernel_function.prompt_template.prompt_template_config.template or ""
+        fitted = arguments
+        for name, value in arguments.items():
+            if not isinstance(value, str) or f"${name}" not in template:
+                continue
+            fit = await self.context_budget.fit(value, kernel)
+            if fit.strategy is not FitStrategy.FITS:
+                if fitted is arguments:
+                    fitted = copy.copy(arguments)
+                fitted[name] = fit.text
+        return fitted
 
+    async def _execute_plan_sequential(self, generated_plan: Dict[str, Any], kernel: Kernel, question: Question, headers,
+                                       emitter: PlanEventEmitter, stream_final_answer: bool) -> str:
         arguments = KernelArguments(input=generated_plan["input"])
         subtasks = generated_plan["subtasks"]
+        # When the planner references outputs explicitly, steps without references do not need the previous output.
+        # Otherwise every step is assumed to build on the one before.
+        nodes = build_plan_graph(subtasks, kernel)
+        explicit_references = uses_references(subtasks)
         output_track = []
-        for subtask in subtasks:
-            
-            plugin_name, function_name = subtask["function"].split(".")
-            kernel_function = kernel.func(plugin_name, function_name)
-            
-            # Get the arguments dictionary for the function
-            subtask["args"] = self.update_function_args(kernel, subtask["function"], subtask["args"] if "args" in subtask else {}, question=question, headers=headers)
-            args = subtask.get("args", None)
-
-            if args:
-                for key, value in args.items():
-                    arguments[key] = value
-                if "question" in arguments:
-                    # When the input of a function is of type question check if the question requires updates from previous outputs.
-                    # This is required for questions that need to use multiple plugins to be answered,
-                    last_output = output_track[-1] if len(output_track) > 0 else ""
-                    if last_output:
-                        new_question = await self.update_next_question(original_input=question.question, output_previous_function=str(last_output), kernel=kernel)
-                        logger.info(f"new question: {new_question}")
-                        question.question=str(new_question)
-                    
-                output = await kernel_function.invoke(kernel, arguments)
+        for index, subtask in enumerate(subtasks):
+            with start_span("subtask", {"subtask.index": index, "subtask.function": subtask["function"]}) as span, \
+                    llm_purpose(purpose="subtask", plugin=subtask["function"]):
+                plugin_name, function_name = subtask["function"].split(".")
+                kernel_function = kernel.func(plugin_name, function_name)
+                subtask_started = emitter.now_ms()
+                emitter.emit(PlanEventType.SUBTASK_STARTED, subtask_index=index, function=subtask["function"])
 
-            else:
-                output = await kernel_function.invoke(kernel, arguments)
+                # Get the arguments dictionary for the function
+                outputs = {i: str(previous) for i, previous in enumerate(output_track)}
+                subtask_args = resolve_references(subtask["args"], outputs, index) if "args" in subtask else {}
+                subtask["args"] = self.update_function_args(kernel, subtask["function"], subtask_args, question=question, headers=headers)
+                args = subtask.get("args", None)
+                final = index == len(subtasks) - 1
+                stream = stream_final_answer and final
+
+                if args:
+                    for key, value in args.items():
+                        arguments[key] = value
+                    if "question" in arguments:
+                        # When the input of a function is of type question check if the question requires updates from previous outputs.
+                        # This is required for questions that need to use multiple plugins to be answered,
+                        last_output = output_track[-1] if len(output_track) > 0 else ""
+                        if last_output:
+                            rewrite_started = emitter.now_ms()
+                            if explicit_references:
+                                context = dependency_context(nodes[index], outputs)
+                                depends = context is not None
+                            else:
+                                context, depends = str(last_output), True
+                            new_question = await self.update_next_question(original_input=question.question, output_previous_function=context,
+                                                                           kernel=kernel, depends=depends, outputs=outputs, index=index)
+                            logger.info("new question: %s", new_question)
+                            question.question=str(new_question)
+                            emitter.emit(PlanEventType.QUESTION_REWRITTEN, data=question.question, subtask_index=index,
+                                         function=subtask["function"], started_ms=rewrite_started)
+
+                    output = await self._invoke_subtask_function(kernel_function, kernel, arguments, emitter, index, stream, final)
+
+                else:
+                    output = await self._invoke_subtask_function(kernel_function, kernel, arguments, emitter, index, stream, final)
+
+                emitter.emit(PlanEventType.SUBTASK_OUTPUT, data=str(output), subtask_index=index,
+                             function=subtask["function"], started_ms=subtask_started)
+                span.set_attribute("output.chars", len(str(output)))
 
             # Override the input context variable with the output of the function
             arguments["input"] = str(output)
             output_track.append(output)
 
         # At the very end, return the output of the last function
-        return str(output)
\ No newline at end of file
+        return str(output)
+
+    async def _execute_plan_parallel(self, generated_plan: Dict[str, Any], kernel: Kernel, question: Question, headers,
+                                     emitter: PlanEventEmitter, stream_final_answer: bool) -> str:
+        """
+        Execute the plan as a DAG: each subtask waits only for the subtasks it references and
+        independent subtasks run concurrently, bounded by max_concurrency.
+        The result is the output of the last subtask, or the outputs of all the subtasks
+        nobody depends on joined in plan order when the plan fans out.
+        """
+        nodes = build_plan_graph(generated_plan["subtasks"], kernel)
+        sinks = sink_indexes(nodes)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        outputs: Dict[int, str] = {}
+        tasks: List[asyncio.Task] = []
+
+        async def run_node(node: PlanNode) -> Any:
+            if node.dependencies:
+                await asyncio.gather(*(tasks[dependency] for dependency in node.dependencies))
+            async with semaphore:
+                stream = stream_final_answer and sinks == [node.index]
+                return await self._execute_subtask(node, generated_plan["input"], outputs, kernel, question, headers, emitter, stream,
+                                                   final=node.index in sinks)
+
+        async def run_and_store(node: PlanNode) -> Any:
+            output = await run_node(node)
+            outputs[node.index] = str(output)
+            return output
+
+        for node in nodes:
+            tasks.append(asyncio.ensure_future(run_and_store(node)))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        if len(sinks) == 1:
+            return outputs[sinks[0]]
+        return "\n\n".join(outputs[index] for index in sinks)
+
+    async def _execute_subtask(self, node: PlanNode, plan_input: str, outputs: Dict[int, str], kernel: Kernel,
+                               question: Question, headers, emitter: PlanEventEmitter, stream: bool, final: bool = False) -> Any:
+        """
+        Invoke a single subtask with its own arguments and its own copy of the question.
+        """
+        with start_span("subtask", {"subtask.index": node.index, "subtask.function": node.function}) as span, \
+                llm_purpose(purpose="subtask", plugin=node.function):
+            output = await self._run_subtask(node, plan_input, outputs, kernel, question, headers, emitter, stream, final)
+            span.set_attribute("output.chars", len(str(output)))
+            return output
+
+    async def _run_subtask(self, node: PlanNode, plan_input: str, outputs: Dict[int, str], kernel: Kernel,
+                           question: Question, headers, emitter: PlanEventEmitter, stream: bool, final: bool = False) -> Any:
+        plugin_name, function_name = node.function.split(".")
+        kernel_function = kernel.func(plugin_name, function_name)
+        subtask_started = emitter.now_ms()
+        emitter.emit(PlanEventType.SUBTASK_STARTED, subtask_index=node.index, function=node.function)
+
+        context = dependency_context(node, outputs)
+        arguments = KernelArguments(input=outputs[node.dependencies[-1]] if node.dependencies else plan_input)
+
+        subtask_question = question.model_copy()
+        args = resolve_references(dict(node.subtask.get("args") or {}), outputs, node.index)
+        args = self.update_function_args(kernel, node.function, args, question=subtask_question, headers=headers)
+        for key, value in args.items():
+            arguments[key] = value
+
+        if "question" in arguments and context:
+            rewrite_started = emitter.now_ms()
+            new_question = await self.update_next_question(original_input=question.question, output_previous_function=context, kernel=kernel,
+                                                           outputs=outputs, index=node.index)
+            logger.info("new question: %s", new_question)
+            subtask_question.question = str(new_question)
+            emitter.emit(PlanEventType.QUESTION_REWRITTEN, data=subtask_question.question, subtask_index=node.index,
+                         function=node.function, started_ms=rewrite_started)
+
+        output = await self._invoke_subtask_function(kernel_function, kernel, arguments, emitter, node.index, stream, final)
+        emitter.emit(PlanEventType.SUBTASK_OUTPUT, data=str(output), subtask_index=node.index,
+                     function=node.function, started_ms=subtask_started)
+        return output
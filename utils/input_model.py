@@ -1,11 +1,30 @@
-from pydantic import BaseModel
-from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, PrivateAttr
+from typing import Any, Dict, Iterable, List, Optional
 
 class Plugin(BaseModel):
     name: str
     url: str
     configuration: Dict[str, Any]
 
+    # Serialized once, dropped when a field is assigned (replace the configuration, do not mutate it in place)
+    _json: Optional[bytes] = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._json = None
+
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep: bool = False) -> "Plugin":
+        copied = super().model_copy(update=update, deep=deep)
+        if update:
+            copied._json = None
+        return copied
+
+    def json_bytes(self) -> bytes:
+        if self._json is None:
+            self._json = self.model_dump_json().encode("utf-8")
+        return self._json
+
 class Question(BaseModel):
     user_id: int
     message_id: int  # message storing answer-response tuples in vekai
@@ -14,4 +33,51 @@ class Question(BaseModel):
     question: str
     plugins: Optional[List[
         Plugin
-    ]] = None
\ No newline at end of file
+    ]] = None
+
+    # Lowercased plugin name -> configuration, dropped when `plugins` is assigned (replace the list, do not mutate it in place)
+    _plugin_index: Optional[Dict[str, Plugin]] = PrivateAttr(default=None)
+    # Question serialized without plugins, dropped when another field is assigned
+    _base_json: Optional[bytes] = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        self._invalidate((name,))
+
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep: bool = False) -> "Question":
+        copied = super().model_copy(update=update, deep=deep)
+        if update:
+            copied._invalidate(update)
+        return copied
+
+    def _invalidate(self, names: Iterable[str]) -> None:
+        fields = type(self).model_fields
+        for name in names:
+            if name == "plugins":
+                self._plugin_index = None
+            elif name in fields:
+                self._base_json = None
+
+    def plugin_conf(self, name: str) -> Optional[Plugin]:
+        """
+        Configuration of the plugin with this (case insensitive) name, looked up in an index
+        built once per plugins list.
+        """
+        if not self.plugins:
+            return None
+        if self._plugin_index is None:
+            configurations: Dict[str, Plugin] = {}
+            for plugin in self.plugins:
+                # First match wins, like the linear scan it replaces
+                configurations.setdefault(plugin.name.lower(), plugin)
+            self._plugin_index = configurations
+        return self._plugin_index.get(name.lower())
+
+    def plugin_payload(self, plugin: Plugin) -> bytes:
+        """
+        JSON of the question as sent to one plugin: the same fields with `plugins` holding only
+        its configuration. Built from cached fragments, without copying the question.
+        """
+        if self._base_json is None:
+            self._base_json = self.model_dump_json(exclude={"plugins"}).encode("utf-8")
+        return b"".join((self._base_json[:-1], b',"plugins":[', plugin.json_bytes(), b"]}"))
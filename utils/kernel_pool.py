@@ -0,0 +1,81 @@
+# Standard imports
+import threading
+from typing import Annotated, Any, Callable, Optional
+
+# Internal imports
+from utils.custom_kernel import CustomKernel
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+
+def build_kernel(chat_service: Annotated[Optional[Any], "Chat service replacing OpenAI (benchmarks, tests)"] = None
+                 ) -> Annotated[CustomKernel, "kernel with the chat service and every plugin loaded"]:
+    """
+    Build a fully loaded kernel: reads the .env settings, creates the OpenAI client (unless a
+    chat service is given) and imports the visible and hidden plugins.
+    """
+    import utils.sk_utils as sk_utils
+
+    kernel = sk_utils.get_kernel_router(chat_service)
+    sk_utils.load_plugins(kernel=kernel)
+    return kernel
+
+
+class KernelPool:
+    """
+    Builds a fully loaded kernel template once and hands out per-request views of it.
+
+    Views share the plugin metadata, kernel functions and the AI service clients of the template
+    and get their own plugin collection, services and handlers, so per-request changes (the
+    planner plugin, invoke handlers...) never reach the template or other requests.
+    """
+
+    def __init__(self, build: Annotated[Callable[[], CustomKernel], "Builds the template kernel"] = build_kernel):
+        self._build = build
+        self._template: Optional[CustomKernel] = None
+        self._lock = threading.Lock()
+        self.views_created = 0
+
+    @property
+    def template(self) -> CustomKernel:
+        if self._template is None:
+            with self._lock:
+                if self._template is None:
+                    logger.info("Building kernel template")
+                    self._template = self._build()
+        return self._template
+
+    def warm(self) -> "KernelPool":
+        """
+        Build the template now (at startup) instead of on the first request.
+        """
+        _ = self.template
+        return self
+
+    def view(self) -> Annotated[CustomKernel, "per-request kernel"]:
+        self.views_created += 1
+        return self.template.view()
+
+    def reset(self) -> None:
+        """
+        Drop the template, the next view rebuilds it (after settings or plugin code changes).
+        """
+        with self._lock:
+            self._template = None
+
+
+_default_pool: Optional[KernelPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_kernel_pool() -> KernelPool:
+    """
+    Process wide pool built with build_kernel.
+    """
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = KernelPool()
+    return _default_pool
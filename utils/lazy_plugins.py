@@ -0,0 +1,173 @@
+# Standard imports
+import importlib
+import threading
+from dataclasses import dataclass, field
+from typing import Annotated, Any, AsyncIterable, Dict, List, Optional, Tuple
+
+# Third party
+from pydantic import PrivateAttr
+from semantic_kernel.exceptions import FunctionInitializationError
+from semantic_kernel.functions.function_result import FunctionResult
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.functions.kernel_function import KernelFunction
+from semantic_kernel.functions.kernel_function_metadata import KernelFunctionMetadata
+from semantic_kernel.functions.kernel_parameter_metadata import KernelParameterMetadata
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LazyParameter:
+    name: str
+    description: str = ""
+    type: str = "str"
+    is_required: bool = True
+    default_value: Any = None
+
+
+@dataclass(frozen=True)
+class LazyFunction:
+    """
+    Declared metadata of a plugin function, what the planner sees before the plugin is imported.
+    """
+    name: str
+    description: str
+    parameters: Tuple[LazyParameter, ...] = ()
+    return_description: str = ""
+    return_type: str = "str"
+
+
+@dataclass(frozen=True)
+class LazyPluginSpec:
+    """
+    A plugin declared by name, description and import path ("package.module:Class").
+    The class is imported and instantiated the first time one of its functions is invoked.
+    """
+    name: str
+    description: str
+    import_path: str
+    functions: Tuple[LazyFunction, ...] = field(default_factory=tuple)
+
+    def function_metadata(self, function: LazyFunction) -> KernelFunctionMetadata:
+        return KernelFunctionMetadata(
+            name=function.name,
+            plugin_name=self.name,
+            description=function.description,
+            parameters=[KernelParameterMetadata(name=parameter.name, description=parameter.description,
+                                                default_value=parameter.default_value, type=parameter.type,
+                                                is_required=parameter.is_required)
+                        for parameter in function.parameters],
+            # Sync plugin methods are offloaded to threads, so every function is awaited
+            is_prompt=False,
+            is_asynchronous=True,
+            return_parameter=KernelParameterMetadata(name="return", description=function.return_description,
+                                                     default_value=None, type=function.return_type, is_required=True),
+        )
+
+
+def import_plugin_functions(spec: Annotated[LazyPluginSpec, "declared plugin"],
+                            offload_sync: Annotated[bool, "Run sync plugin methods in the thread pool"] = True) -> Annotated[Dict[str, KernelFunction], "kernel functions of the plugin by name"]:
+    """
+    Import and instantiate the plugin class of a spec and build its kernel functions.
+    """
+    # Imported here, custom_kernel depends on this module
+    from utils.custom_kernel import functions_from_object
+
+    module_name, _, class_name = spec.import_path.partition(":")
+    plugin_class = getattr(importlib.import_module(module_name), class_name)
+    return functions_from_object(plugin_class(), spec.name, offload_sync)
+
+
+def _parameter_fields(parameter: KernelParameterMetadata) -> Tuple[Any, ...]:
+    return parameter.name, parameter.description, parameter.type_, parameter.is_required, parameter.default_value
+
+
+def spec_mismatches(spec: Annotated[LazyPluginSpec, "declared plugin"],
+                    functions: Annotated[Dict[str, KernelFunction], "kernel functions of the imported plugin"]) -> Annotated[List[str], "differences, empty when the spec matches"]:
+    """
+    Differences between the declared metadata of a plugin and the metadata its @kernel_function
+    decorators produce: functions, descriptions, parameters and return values.
+    """
+    mismatches = []
+    declared_names = [function.name for function in spec.functions]
+    for name in sorted(set(functions) - set(declared_names)):
+        mismatches.append(f"{name} is not declared")
+    for declared in spec.functions:
+        function = functions.get(declared.name)
+        if function is None:
+            mismatches.append(f"{declared.name} has no kernel function in {spec.import_path}")
+            continue
+        expected, actual = spec.function_metadata(declared), function.metadata
+        if expected.description != actual.description:
+            mismatches.append(f"{declared.name} description {expected.description!r} != {actual.description!r}")
+        expected_parameters = [_parameter_fields(parameter) for parameter in expected.parameters]
+        actual_parameters = [_parameter_fields(parameter) for parameter in actual.parameters]
+        if expected_parameters != actual_parameters:
+            mismatches.append(f"{declared.name} parameters {expected_parameters} != {actual_parameters}")
+        if _parameter_fields(expected.return_parameter)[1:3] != _parameter_fields(actual.return_parameter)[1:3]:
+            mismatches.append(f"{declared.name} return {expected.return_parameter.description!r} ({expected.return_parameter.type_}) "
+                              f"!= {actual.return_parameter.description!r} ({actual.return_parameter.type_})")
+    return mismatches
+
+
+class LazyPluginLoader:
+    """
+    Imports, instantiates and binds a declared plugin once, shared by every kernel (and view)
+    the plugin is registered in.
+    """
+
+    def __init__(self, spec: LazyPluginSpec, offload_sync: bool = True):
+        self.spec = spec
+        self.offload_sync = offload_sync
+        self._functions: Optional[Dict[str, KernelFunction]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._functions is not None
+
+    def _load(self) -> Dict[str, KernelFunction]:
+        logger.info("Loading plugin %s from %s", self.spec.name, self.spec.import_path)
+        functions = import_plugin_functions(self.spec, self.offload_sync)
+        mismatches = spec_mismatches(self.spec, functions)
+        if mismatches:
+            raise FunctionInitializationError(f"Declared metadata of plugin {self.spec.name} differs from its kernel functions: "
+                                              + "; ".join(mismatches))
+        return functions
+
+    def function(self, name: str) -> KernelFunction:
+        if self._functions is None:
+            with self._lock:
+                if self._functions is None:
+                    self._functions = self._load()
+        return self._functions[name]
+
+
+class LazyKernelFunction(KernelFunction):
+    """
+    Kernel function exposing declared metadata and delegating to the real plugin function,
+    which is loaded on the first invocation.
+    """
+    _loader: LazyPluginLoader = PrivateAttr()
+
+    @classmethod
+    def declare(cls, loader: LazyPluginLoader, function: LazyFunction) -> "LazyKernelFunction":
+        lazy_function = cls(metadata=loader.spec.function_metadata(function))
+        lazy_function._loader = loader
+        return lazy_function
+
+    async def _invoke_internal(self, kernel: Any, arguments: KernelArguments) -> FunctionResult:
+        return await self._loader.function(self.name)._invoke_internal(kernel, arguments)
+
+    async def _invoke_internal_stream(self, kernel: Any, arguments: KernelArguments) -> AsyncIterable[Any]:
+        async for partial in self._loader.function(self.name)._invoke_internal_stream(kernel, arguments):
+            yield partial
+
+
+def lazy_plugin_functions(spec: Annotated[LazyPluginSpec, "declared plugin"],
+                          offload_sync: Annotated[bool, "Run sync plugin methods in the thread pool"] = True) -> Annotated[List[LazyKernelFunction], "declared functions"]:
+    loader = LazyPluginLoader(spec, offload_sync=offload_sync)
+    return [LazyKernelFunction.declare(loader, function) for function in spec.functions]
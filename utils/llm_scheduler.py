@@ -0,0 +1,518 @@
+"""
+Shared scheduler of the chat completion calls: requests-per-minute and tokens-per-minute
+budgets, priorities, fair queuing per domain and rate limit backoff.
+
+Calls wait in a queue per priority (FINAL_ANSWER, PLANNING, INTERACTIVE, BACKGROUND), served
+strictly in that order. Inside a priority the domains take turns, so one busy domain does not
+starve the others. A call is dispatched once both budgets cover it: one request and its
+estimated tokens, settled with the reported usage when the call returns.
+
+A rate limited call (429, or 503 with Retry-After) pauses every dispatch until the Retry-After
+delay (exponential backoff with jitter without the header) and is queued again, instead of
+every caller retrying on its own. The request rate is also halved, and recovers additively
+on successful calls, so budgets set above the real limits converge below them.
+
+Transient failures (other 5xx answers, connection errors and timeouts) only concern the call
+that hit them: it waits an exponential backoff with jitter on its own and is queued again,
+the OpenAI client is built without retries so every retry goes through the budgets.
+
+The priority and domain of the calls come from the context, see llm_call_context.
+"""
+# Standard imports
+import os
+import time
+import random
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Annotated, Any, AsyncIterable, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+# Third party
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.streaming_chat_message_content import StreamingChatMessageContent
+
+# Internal imports
+from request_utils.metrics import get_registry
+from utils import custom_logs
+from utils.chat_services import DelegatingChatCompletion
+
+logger = custom_logs.getLogger(__name__)
+
+T = TypeVar("T")
+
+FINAL_ANSWER = 0
+PLANNING = 1
+INTERACTIVE = 2
+BACKGROUND = 3
+PRIORITY_NAMES = {FINAL_ANSWER: "final_answer", PLANNING: "planning", INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Completion tokens reserved when the settings do not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+RETRYABLE_STATUS = (429, 503)
+# Errors (by class name, anywhere in the cause chain) of calls that never got an answer
+TRANSIENT_ERRORS = frozenset(["APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException",
+                              "ConnectionError", "TimeoutError"])
+
+_call_context: contextvars.ContextVar[Tuple[int, str]] = contextvars.ContextVar("llm_call_context", default=(INTERACTIVE, ""))
+
+_dispatched = get_registry().counter("llm_scheduler_dispatched", "Chat completions dispatched by the scheduler.", "priority")
+_rate_limited = get_registry().counter("llm_scheduler_rate_limited", "Chat completions rejected by the rate limit and retried.", "priority")
+_transient_retried = get_registry().counter("llm_scheduler_transient_retried", "Chat completions retried after a 5xx or connection error.", "priority")
+
+
+@contextmanager
+def llm_call_context(priority: Annotated[Optional[int], "FINAL_ANSWER, PLANNING, INTERACTIVE or BACKGROUND, unchanged if None"] = None,
+                     domain: Annotated[Optional[Any], "Domain id the calls are made for, unchanged if None"] = None) -> Iterator[None]:
+    """
+    Priority and domain of the chat completions made inside the block. Inside BACKGROUND work
+    the priority stays BACKGROUND, planning and answers of background jobs do not jump the queue.
+    """
+    current_priority, current_domain = _call_context.get()
+    if current_priority == BACKGROUND:
+        priority = None
+    token = _call_context.set((current_priority if priority is None else priority,
+                               current_domain if domain is None else str(domain)))
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def current_call_context() -> Tuple[int, str]:
+    return _call_context.get()
+
+
+def estimate_tokens(chat_history: ChatHistory, settings: PromptExecutionSettings) -> int:
+    """
+    Tokens reserved for a completion: ~4 characters per prompt token and the completion limit.
+    """
+    prompt = sum(len(message.content or "") // 4 + 4 for message in chat_history.messages)
+    max_tokens = getattr(settings, "max_tokens", None) or (settings.extension_data or {}).get("max_tokens")
+    return prompt + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def usage_tokens(completions: List[ChatMessageContent]) -> Optional[int]:
+    """
+    Tokens reported by the service for a completion, None when it reports no usage.
+    """
+    for completion in completions:
+        usage = (completion.metadata or {}).get("usage")
+        if usage is not None:
+            return (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+    return None
+
+
+def _parse_retry_after(headers: Any) -> Optional[float]:
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def rate_limit_of(error: BaseException) -> Optional[Tuple[int, Optional[float]]]:
+    """
+    (status, Retry-After seconds) when the error, or one it was raised from, is a rate limit
+    answer. The OpenAI connector wraps the openai errors in ServiceResponseException.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        if status in RETRYABLE_STATUS:
+            retry_after = _parse_retry_after(response.headers) if response is not None else None
+            if status == 429 or retry_after is not None:
+                return status, retry_after
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def transient_error_of(error: BaseException) -> Optional[str]:
+    """
+    What made the call fail when the error, or one it was raised from, is a 5xx answer (other
+    than a rate limit) or a connection error or timeout, None otherwise.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        if isinstance(status, int) and 500 <= status < 600:
+            return str(status)
+        names = {cls.__name__ for cls in type(error).__mro__}
+        if names & TRANSIENT_ERRORS:
+            return type(error).__name__
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class _TokenBucket:
+    """
+    Budget refilled continuously at `per_minute`, holding at most `burst_s` seconds of it.
+    It can go negative when a call used more than it reserved, later calls then wait for the
+    debt to be refilled.
+    """
+
+    def __init__(self, per_minute: float, burst_s: float, clock: Callable[[], float]):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * burst_s
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_s(self, amount: float) -> float:
+        """
+        Seconds until `amount` is available (amounts above the capacity only need a full bucket).
+        """
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "priority", "domain")
+
+    def __init__(self, future: "asyncio.Future[None]", tokens: int, priority: int, domain: str):
+        self.future = future
+        self.tokens = tokens
+        self.priority = priority
+        self.domain = domain
+
+
+class Grant:
+    """
+    Dispatch permission of one call. settle() records the success of the call and corrects its
+    tokens with the real usage, release() frees the concurrency slot.
+    """
+
+    def __init__(self, scheduler: "LLMScheduler", tokens: int, priority: int):
+        self._scheduler = scheduler
+        self.tokens = tokens
+        self.priority = priority
+        self._released = False
+
+    def settle(self, used_tokens: Optional[int]) -> None:
+        self._scheduler._recover()
+        if used_tokens is not None and used_tokens != self.tokens:
+            self._scheduler._adjust_tokens(self.tokens - used_tokens)
+            self.tokens = used_tokens
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._scheduler._release()
+
+
+class LLMScheduler:
+    """
+    Requests/tokens per minute budgets shared by every chat completion of the process.
+    """
+
+    def __init__(self, requests_per_minute: Annotated[float, "Request budget"] = 500,
+                 tokens_per_minute: Annotated[float, "Token budget (prompt + completion)"] = 150_000,
+                 max_concurrency: Annotated[Optional[int], "Calls in flight at once, None for no limit"] = None,
+                 burst_s: Annotated[float, "Seconds of budget spendable at once, OpenAI enforces limits over short windows"] = 10.0,
+                 max_retries: Annotated[int, "Retries of a rate limited call"] = 5,
+                 base_backoff_s: Annotated[float, "First backoff without Retry-After, doubled on each retry"] = 1.0,
+                 max_backoff_s: float = 60.0,
+                 max_transient_retries: Annotated[int, "Retries of a call failed with a 5xx or connection error"] = 2,
+                 base_transient_backoff_s: Annotated[float, "First backoff after a transient failure, doubled on each retry"] = 0.5,
+                 clock: Annotated[Callable[[], float], "Monotonic clock"] = time.monotonic):
+        if requests_per_minute <= 0 or tokens_per_minute <= 0:
+            raise ValueError(f"LLM budgets must be positive, got {requests_per_minute} requests "
+                             f"and {tokens_per_minute} tokens per minute")
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff_s = base_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.max_transient_retries = max_transient_retries
+        self.base_transient_backoff_s = base_transient_backoff_s
+        self._clock = clock
+        self._requests = _TokenBucket(requests_per_minute, burst_s, clock)
+        self._request_rate = self._requests.rate
+        self._tokens = _TokenBucket(tokens_per_minute, burst_s, clock)
+        # priority -> domain -> waiters, domains in turn order
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.rate_limited = 0
+        self.transient_retried = 0
+
+    # Queue
+
+    def _check_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters of a previous loop can never be woken up
+            self._loop = loop
+            self._queues = {}
+            self._in_flight = 0
+            self._timer = None
+        return loop
+
+    def queued(self) -> int:
+        return sum(len(waiters) for domains in self._queues.values() for waiters in domains.values())
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """
+        Head of the highest priority queue, domains taking turns. Cancelled waiters are dropped.
+        """
+        for priority in sorted(self._queues):
+            domains = self._queues[priority]
+            while domains:
+                domain, waiters = next(iter(domains.items()))
+                while waiters and waiters[0].future.done():
+                    waiters.popleft()
+                if waiters:
+                    return waiters[0]
+                del domains[domain]
+            del self._queues[priority]
+        return None
+
+    def _pop(self, waiter: _Waiter) -> None:
+        domains = self._queues[waiter.priority]
+        waiters = domains[waiter.domain]
+        waiters.popleft()
+        if waiters:
+            # The domain had its turn
+            domains.move_to_end(waiter.domain)
+        else:
+            del domains[waiter.domain]
+
+    def _pump(self) -> None:
+        """
+        Dispatch the waiters the budgets allow, then sleep until the next one can go.
+        """
+        self._timer = None
+        while True:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if self.max_concurrency is not None and self._in_flight >= self.max_concurrency:
+                # Woken up by _release
+                return
+            now = self._clock()
+            self._requests.refill()
+            self._tokens.refill()
+            wait = max(self._paused_until - now, self._requests.wait_s(1), self._tokens.wait_s(waiter.tokens))
+            if wait > 0:
+                self._timer = self._loop.call_later(wait, self._pump)
+                return
+            self._pop(waiter)
+            self._requests.level -= 1
+            self._tokens.level -= waiter.tokens
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    def _wake(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._pump()
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        if self._loop is not None and not self._loop.is_closed():
+            self._wake()
+
+    def _recover(self) -> None:
+        if self._requests.rate < self._request_rate:
+            self._requests.refill()
+            self._requests.rate = min(self._request_rate, self._requests.rate + self._request_rate / 20)
+
+    def _throttle(self) -> None:
+        """
+        Halve the request rate (once per pause, the 429s of one burst arrive together) and drop
+        the requests budget so the pause does not end in another burst.
+        """
+        if self._clock() >= self._paused_until:
+            self._requests.refill()
+            self._requests.rate = max(self._request_rate / 16, self._requests.rate / 2)
+        self._requests.level = min(self._requests.level, 0.0)
+
+    def _adjust_tokens(self, refund: float) -> None:
+        self._tokens.level = min(self._tokens.capacity, self._tokens.level + refund)
+        if refund > 0 and self._loop is not None and not self._loop.is_closed():
+            self._wake()
+
+    async def acquire(self, tokens: Annotated[int, "Estimated tokens of the call"],
+                      priority: Optional[int] = None, domain: Optional[str] = None) -> Grant:
+        """
+        Wait for the turn of a call, priority and domain default to the llm_call_context.
+        """
+        loop = self._check_loop()
+        context_priority, context_domain = _call_context.get()
+        priority = context_priority if priority is None else priority
+        domain = context_domain if domain is None else domain
+        waiter = _Waiter(loop.create_future(), tokens, priority, domain)
+        self._queues.setdefault(priority, OrderedDict()).setdefault(domain, deque()).append(waiter)
+        if self._timer is None:
+            self._pump()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Dispatched while being cancelled
+                self._release()
+            raise
+        _dispatched.inc(PRIORITY_NAMES.get(priority, str(priority)))
+        return Grant(self, tokens, priority)
+
+    # Rate limits
+
+    def backoff_s(self, error: BaseException, attempt: Annotated[int, "0 for the first retry"]) -> Optional[float]:
+        """
+        Seconds to pause all dispatches after a rate limited call, None when the error is not
+        a rate limit or the call ran out of retries.
+        """
+        rate_limit = rate_limit_of(error)
+        if rate_limit is None or attempt >= self.max_retries:
+            return None
+        status, retry_after = rate_limit
+        if retry_after is None:
+            retry_after = min(self.max_backoff_s, self.base_backoff_s * 2 ** attempt) * random.uniform(0.5, 1.0)
+        self.rate_limited += 1
+        priority = _call_context.get()[0]
+        _rate_limited.inc(PRIORITY_NAMES.get(priority, str(priority)))
+        self._throttle()
+        self._paused_until = max(self._paused_until, self._clock() + retry_after)
+        logger.warning("Chat completion rate limited (%s), pausing dispatches for %.2fs (retry %d)", status, retry_after, attempt + 1)
+        return retry_after
+
+    def transient_backoff_s(self, error: BaseException, attempt: Annotated[int, "transient retries so far"]) -> Optional[float]:
+        """
+        Seconds the call waits before being queued again after a transient failure, None when
+        the error is not transient or the call ran out of retries.
+        """
+        cause = transient_error_of(error)
+        if cause is None or attempt >= self.max_transient_retries:
+            return None
+        delay = min(self.max_backoff_s, self.base_transient_backoff_s * 2 ** attempt) * random.uniform(0.5, 1.0)
+        self.transient_retried += 1
+        priority = _call_context.get()[0]
+        _transient_retried.inc(PRIORITY_NAMES.get(priority, str(priority)))
+        logger.warning("Chat completion failed (%s), retrying in %.2fs (retry %d)", cause, delay, attempt + 1)
+        return delay
+
+    def retry_delay_s(self, error: BaseException, attempts: Annotated[Dict[str, int], "retries so far by kind, updated"]) -> Optional[float]:
+        """
+        Seconds to wait before queueing a failed call again (0 after a rate limit, dispatches
+        are already paused), None to raise the error.
+        """
+        if self.backoff_s(error, attempts.get("rate_limit", 0)) is not None:
+            attempts["rate_limit"] = attempts.get("rate_limit", 0) + 1
+            return 0.0
+        delay = self.transient_backoff_s(error, attempts.get("transient", 0))
+        if delay is not None:
+            attempts["transient"] = attempts.get("transient", 0) + 1
+        return delay
+
+    async def run(self, call: Annotated[Callable[[], Awaitable[T]], "Makes the call, invoked again on retries"],
+                  tokens: Annotated[int, "Estimated tokens of the call"],
+                  used_tokens: Annotated[Callable[[T], Optional[int]], "Tokens used according to the result"] = lambda _: None) -> T:
+        """
+        Run a call when its turn comes, retrying it after rate limits and transient failures.
+        """
+        attempts: Dict[str, int] = {}
+        while True:
+            grant = await self.acquire(tokens)
+            try:
+                result = await call()
+                grant.settle(used_tokens(result))
+                return result
+            except Exception as error:
+                delay = self.retry_delay_s(error, attempts)
+                if delay is None:
+                    raise
+            finally:
+                grant.release()
+            if delay:
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        self._requests.refill()
+        self._tokens.refill()
+        return {"queued": self.queued(), "in_flight": self._in_flight, "rate_limited": self.rate_limited,
+                "transient_retried": self.transient_retried,
+                "requests_per_minute": round(self._requests.rate * 60, 1),
+                "requests_available": round(self._requests.level, 2), "tokens_available": round(self._tokens.level, 1)}
+
+
+class SchedulingChatCompletion(DelegatingChatCompletion):
+    """
+    Chat completion service whose calls go through an LLMScheduler.
+    """
+    scheduler: LLMScheduler
+
+    def __init__(self, inner: Any, scheduler: Annotated[LLMScheduler, "Shared scheduler"]) -> None:
+        super().__init__(inner, scheduler=scheduler)
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        return await self.scheduler.run(lambda: self.inner.complete_chat(chat_history, settings, **kwargs),
+                                        estimate_tokens(chat_history, settings), usage_tokens)
+
+    async def complete_chat_stream(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                                   **kwargs: Any) -> AsyncIterable[List[StreamingChatMessageContent]]:
+        tokens = estimate_tokens(chat_history, settings)
+        attempts: Dict[str, int] = {}
+        while True:
+            grant = await self.scheduler.acquire(tokens)
+            streamed = False
+            try:
+                async for partial in self.inner.complete_chat_stream(chat_history, settings, **kwargs):
+                    streamed = True
+                    yield partial
+                grant.settle(None)
+                return
+            except Exception as error:
+                # Chunks already yielded cannot be taken back, only retry a stream that never started
+                if streamed:
+                    raise
+                delay = self.scheduler.retry_delay_s(error, attempts)
+                if delay is None:
+                    raise
+            finally:
+                grant.release()
+            if delay:
+                await asyncio.sleep(delay)
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """
+    Process wide scheduler, budgets from LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE and
+    LLM_MAX_CONCURRENCY.
+    """
+    global _scheduler
+    if _scheduler is None:
+        max_concurrency = os.getenv("LLM_MAX_CONCURRENCY")
+        _scheduler = LLMScheduler(float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+                                  float(os.getenv("LLM_TOKENS_PER_MINUTE", "150000")),
+                                  int(max_concurrency) if max_concurrency else None)
+    return _scheduler
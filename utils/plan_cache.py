@@ -0,0 +1,142 @@
+# Standard imports
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Annotated, Callable, Dict, Optional, Tuple
+
+# Third party
+from semantic_kernel import Kernel
+from semantic_kernel.planners.basic_planner import Plan
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+# Plugin registered by BasicPlanner.create_plan itself, it is not part of the catalog offered to the planner.
+PLANNER_PLUGIN_NAME = "PlannerPlugin"
+# Prompt functions used internally by the planner (see utils.sk_utils._load_hidden_plugins), not offered to it either.
+HIDDEN_PLUGIN_NAMES = frozenset(["question_updater", "output_summarizer"])
+# Plugins left out of the catalog fingerprint and of the function manual of the planner prompt.
+NON_CATALOG_PLUGINS = HIDDEN_PLUGIN_NAMES | {PLANNER_PLUGIN_NAME}
+
+
+def normalize_question(question: Annotated[str, "question text"]) -> Annotated[str, "normalized question"]:
+    """
+    Normalize a question for cache lookups: unicode NFKC, case folding, collapsed whitespace
+    and no trailing punctuation.
+    """
+    normalized = unicodedata.normalize("NFKC", question).casefold()
+    return " ".join(normalized.split()).rstrip(" ?!.¿¡")
+
+
+def catalog_fingerprint(kernel: Annotated[Kernel, "kernel with the registered plugins"],
+                        prompt: Annotated[str, "planner prompt"]) -> Annotated[str, "sha256 of the catalog and prompt"]:
+    """
+    Fingerprint of what the planner sees: plugins (not the planner's own or the hidden ones),
+    their function names and parameter signatures, and the planner prompt.
+    """
+    digest = hashlib.sha256()
+    for plugin_name in sorted(kernel.plugins.plugins):
+        if plugin_name in NON_CATALOG_PLUGINS:
+            continue
+        plugin = kernel.plugins.plugins[plugin_name]
+        digest.update(f"plugin:{plugin_name}:{plugin.description or ''}\n".encode("utf-8"))
+        for function_name in sorted(plugin.functions):
+            function = plugin.functions[function_name]
+            digest.update(f"function:{function_name}:{function.description or ''}\n".encode("utf-8"))
+            for parameter in function.parameters:
+                digest.update(f"param:{parameter.name}:{parameter.type_}:{parameter.is_required}:{parameter.description or ''}\n".encode("utf-8"))
+    digest.update(b"prompt:")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class _PlanCacheEntry:
+    plan: Plan
+    expires_at: float
+
+
+class PlanCache:
+    """
+    LRU + TTL cache of generated plans keyed by normalized question and catalog fingerprint.
+    """
+
+    def __init__(self, max_entries: Annotated[int, "Maximum number of cached plans"] = 1024,
+                 ttl_seconds: Annotated[float, "Time a plan stays valid"] = 3600.0,
+                 clock: Annotated[Callable[[], float], "Monotonic clock"] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], _PlanCacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(question: str, fingerprint: str) -> Tuple[str, str]:
+        return normalize_question(question), fingerprint
+
+    def get(self, question: Annotated[str, "question text"], fingerprint: Annotated[str, "catalog fingerprint"]) -> Annotated[Optional[Plan], "cached plan if any"]:
+        key = self.key(question, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.plan
+
+    def put(self, question: Annotated[str, "question text"], fingerprint: Annotated[str, "catalog fingerprint"],
+            plan: Annotated[Plan, "plan to cache"]) -> None:
+        key = self.key(question, fingerprint)
+        with self._lock:
+            self._entries[key] = _PlanCacheEntry(plan=plan, expires_at=self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, fingerprint: Annotated[Optional[str], "only drop plans built for this catalog, None drops all"] = None) -> int:
+        """
+        Drop cached plans and return how many were removed.
+        """
+        with self._lock:
+            if fingerprint is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key in self._entries if key[1] == fingerprint]
+                for key in stale:
+                    del self._entries[key]
+                removed = len(stale)
+            self.invalidations += removed
+        if removed:
+            logger.info("Invalidated %d cached plans", removed)
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+        }
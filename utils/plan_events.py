@@ -0,0 +1,61 @@
+# Standard imports
+import time
+from enum import Enum
+from dataclasses import dataclass, asdict
+from typing import Annotated, Any, Callable, Dict, Optional
+
+
+class PlanEventType(str, Enum):
+    PLAN_PARSED = "plan_parsed"
+    SUBTASK_STARTED = "subtask_started"
+    SUBTASK_OUTPUT = "subtask_output"
+    QUESTION_REWRITTEN = "question_rewritten"
+    ANSWER_TOKEN = "answer_token"
+    FINAL_ANSWER = "final_answer"
+
+
+@dataclass(frozen=True)
+class PlanEvent:
+    """
+    Progress event emitted while a plan is executed.
+
+    elapsed_ms is measured from the start of the execution, duration_ms is the time spent
+    by the step the event closes (subtask, rewrite or whole plan).
+    """
+    type: PlanEventType
+    elapsed_ms: float
+    data: Any = None
+    subtask_index: Optional[int] = None
+    function: Optional[str] = None
+    duration_ms: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        event = asdict(self)
+        event["type"] = self.type.value
+        event["data"] = self.data if isinstance(self.data, (str, int, float, bool, dict, list, type(None))) else str(self.data)
+        return event
+
+
+EventSink = Callable[[PlanEvent], None]
+
+
+class PlanEventEmitter:
+    """
+    Builds timed events and hands them to a sink (no-op when there is none).
+    """
+
+    def __init__(self, sink: Annotated[Optional[EventSink], "Receives every event"] = None):
+        self.sink = sink
+        self.started_at = time.perf_counter()
+
+    def now_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def emit(self, type: PlanEventType, data: Any = None, subtask_index: Optional[int] = None,
+             function: Optional[str] = None, started_ms: Optional[float] = None) -> None:
+        if self.sink is None:
+            return
+        elapsed_ms = self.now_ms()
+        duration_ms = elapsed_ms - started_ms if started_ms is not None else None
+        self.sink(PlanEvent(type=type, elapsed_ms=elapsed_ms, data=data, subtask_index=subtask_index,
+                            function=function, duration_ms=duration_ms))
@@ -0,0 +1,123 @@
+# Standard imports
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Annotated, Any, Dict, List, Optional, Sequence, Tuple
+
+# Third party
+from semantic_kernel import Kernel
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+# "$step2" / "$step_2" points to the output of the second subtask (1-based), "$output" to the previous one.
+STEP_REFERENCE = re.compile(r"\$(?:step_?(\d+)|output)\b")
+
+
+@dataclass
+class PlanNode:
+    """
+    A subtask of a generated plan together with the subtasks whose output it needs.
+    """
+    index: int
+    subtask: Dict[str, Any]
+    dependencies: Tuple[int, ...] = field(default_factory=tuple)
+
+    @property
+    def function(self) -> str:
+        return self.subtask["function"]
+
+
+def _references(value: Any, index: int) -> List[int]:
+    """
+    Collect the (0-based) subtask indexes referenced inside an argument value.
+    """
+    found = []
+    if isinstance(value, str):
+        for match in STEP_REFERENCE.finditer(value):
+            found.append(int(match.group(1)) - 1 if match.group(1) else index - 1)
+    elif isinstance(value, dict):
+        for item in value.values():
+            found.extend(_references(item, index))
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            found.extend(_references(item, index))
+    return found
+
+
+def _consumes_input(kernel: Kernel, function_name: str, args: Dict[str, Any]) -> bool:
+    """
+    A function with an `input` parameter that the plan does not fill receives the previous output.
+    """
+    if "input" in args:
+        return False
+    plugin_name, name = function_name.split(".")
+    try:
+        parameters = kernel.func(plugin_name, name).parameters
+    except Exception:
+        return False
+    return any(parameter.name == "input" for parameter in parameters)
+
+
+def build_plan_graph(subtasks: Annotated[Sequence[Dict[str, Any]], "subtasks of the generated plan"],
+                     kernel: Annotated[Kernel, "kernel holding the plan functions"]) -> Annotated[List[PlanNode], "subtasks with their dependencies"]:
+    """
+    Build the dependency DAG of a plan. A subtask depends on an earlier one only when it
+    references its output ($stepN / $output in its args) or consumes it through `input`.
+    References to the subtask itself or to later subtasks are ignored, so the graph is acyclic.
+    """
+    nodes = []
+    for index, subtask in enumerate(subtasks):
+        args = subtask.get("args") or {}
+        dependencies = {ref for ref in _references(args, index) if 0 <= ref < index}
+        if index > 0 and _consumes_input(kernel, subtask["function"], args):
+            dependencies.add(index - 1)
+        nodes.append(PlanNode(index=index, subtask=subtask, dependencies=tuple(sorted(dependencies))))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Plan graph: %s", [(node.function, node.dependencies) for node in nodes])
+    return nodes
+
+
+def uses_references(subtasks: Annotated[Sequence[Dict[str, Any]], "subtasks of the generated plan"]) -> bool:
+    """
+    Whether any subtask references the output of another one with $stepN / $output.
+    """
+    return any(_references(subtask.get("args") or {}, index) for index, subtask in enumerate(subtasks))
+
+
+def sink_indexes(nodes: Annotated[Sequence[PlanNode], "plan graph"]) -> Annotated[List[int], "indexes of subtasks no other subtask depends on"]:
+    """
+    Return, in plan order, the subtasks whose output is not consumed by any other subtask.
+    """
+    consumed = {dependency for node in nodes for dependency in node.dependencies}
+    return [node.index for node in nodes if node.index not in consumed]
+
+
+def resolve_references(value: Annotated[Any, "argument value"],
+                       outputs: Annotated[Dict[int, str], "outputs of finished subtasks by index"],
+                       index: Annotated[int, "index of the subtask owning the value"]) -> Any:
+    """
+    Replace $stepN / $output references with the outputs of the referenced subtasks.
+    """
+    if isinstance(value, str):
+        def replace(match: "re.Match") -> str:
+            ref = int(match.group(1)) - 1 if match.group(1) else index - 1
+            return outputs.get(ref, match.group(0))
+        return STEP_REFERENCE.sub(replace, value)
+    if isinstance(value, dict):
+        return {key: resolve_references(item, outputs, index) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, outputs, index) for item in value]
+    return value
+
+
+def dependency_context(node: Annotated[PlanNode, "subtask"],
+                       outputs: Annotated[Dict[int, str], "outputs of finished subtasks by index"]) -> Annotated[Optional[str], "joined outputs of the dependencies"]:
+    """
+    Join the outputs the subtask depends on, in plan order.
+    """
+    if not node.dependencies:
+        return None
+    return "\n".join(outputs[dependency] for dependency in node.dependencies)
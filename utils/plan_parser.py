@@ -0,0 +1,133 @@
+# Standard imports
+import re
+import json
+from bisect import bisect_left
+from typing import Annotated, Any, Dict, Iterator, List, Tuple
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+PLAN_KEY = '"subtasks"'
+
+# Only these characters change the scanner state, everything else is skipped by the regex engine.
+_STRUCTURAL = re.compile(r'[{}"\\]')
+
+# JSON escapes that show up doubled when a completion is returned escaped (\\n instead of \n).
+# Only ASCII escapes are decoded so accents and other non-ASCII text are left untouched.
+_ESCAPED_SEQUENCE = re.compile(r'\\(["\\/bfnrt]|u[0-9a-fA-F]{4})')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class PlanParseError(ValueError):
+    """
+    The completion does not contain a valid plan.
+    """
+
+
+def _balanced_objects(text: str) -> List[Tuple[int, int]]:
+    """
+    Spans (start, end) of every balanced {...} of the text in a single pass. Braces inside
+    JSON strings are ignored; strings are only tracked inside an object so quotes in the
+    surrounding prose do not matter.
+    """
+    spans: List[Tuple[int, int]] = []
+    starts: List[int] = []
+    in_string = False
+    # Position of the character escaped by the last backslash inside a string
+    skip = -1
+    for match in _STRUCTURAL.finditer(text):
+        position = match.start()
+        if position == skip:
+            continue
+        char = match.group()
+        if in_string:
+            if char == "\\":
+                skip = position + 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = bool(starts)
+        elif char == "{":
+            starts.append(position)
+        elif char == "}" and starts:
+            spans.append((starts.pop(), position + 1))
+    return spans
+
+
+def _unescape(text: str) -> str:
+    def replace(match: "re.Match") -> str:
+        sequence = match.group(1)
+        return chr(int(sequence[1:], 16)) if sequence[0] == "u" else _ESCAPES[sequence]
+    return _ESCAPED_SEQUENCE.sub(replace, text)
+
+
+def _candidates(text: str) -> Iterator[str]:
+    """
+    Balanced objects mentioning "subtasks", outermost first.
+    """
+    keys = []
+    position = text.find(PLAN_KEY)
+    while position != -1:
+        keys.append(position)
+        position = text.find(PLAN_KEY, position + 1)
+    if not keys:
+        return
+    for start, end in sorted(_balanced_objects(text), key=lambda span: (span[0], -span[1])):
+        index = bisect_left(keys, start)
+        if index < len(keys) and keys[index] < end:
+            yield text[start:end]
+
+
+def validate_plan(plan: Annotated[Any, "decoded plan"]) -> Annotated[Dict[str, Any], "the same plan"]:
+    """
+    Check the plan schema: {"input": str, "subtasks": [{"function": "plugin.function", "args": {...}}]}.
+    """
+    if not isinstance(plan, dict):
+        raise PlanParseError(f"Plan must be an object, got {type(plan).__name__}")
+    if not isinstance(plan.get("input"), str):
+        raise PlanParseError("Plan field 'input' must be a string")
+    subtasks = plan.get("subtasks")
+    if not isinstance(subtasks, list) or not subtasks:
+        raise PlanParseError("Plan field 'subtasks' must be a non empty list")
+    for index, subtask in enumerate(subtasks):
+        if not isinstance(subtask, dict):
+            raise PlanParseError(f"subtasks[{index}] must be an object")
+        function = subtask.get("function")
+        if not isinstance(function, str) or function.count(".") != 1 or not all(function.split(".")):
+            raise PlanParseError(f"subtasks[{index}].function must be 'plugin.function', got {function!r}")
+        if "args" in subtask and subtask["args"] is not None and not isinstance(subtask["args"], dict):
+            raise PlanParseError(f"subtasks[{index}].args must be an object")
+    return plan
+
+
+def parse_plan(completion: Annotated[str, "planner completion"],
+               max_attempts: Annotated[int, "candidate objects decoded at most"] = 32) -> Annotated[Dict[str, Any], "validated plan"]:
+    """
+    Extract the plan from a completion that may wrap it in prose or code fences.
+
+    The completion is scanned once for balanced objects and the outermost ones mentioning
+    "subtasks" are decoded until one validates. If none does, the completion is assumed to
+    be escaped (\\n, \\") and the scan is repeated on its unescaped text.
+    """
+    texts = [completion]
+    unescaped = _unescape(completion)
+    if unescaped != completion:
+        texts.append(unescaped)
+
+    last_error: ValueError = PlanParseError("No JSON object with 'subtasks' found in the completion")
+    attempts = 0
+    for text in texts:
+        for candidate in _candidates(text):
+            if attempts >= max_attempts:
+                raise PlanParseError(f"No valid plan in the first {max_attempts} candidates: {last_error}")
+            attempts += 1
+            try:
+                return validate_plan(json.loads(candidate, strict=False))
+            except ValueError as exc:
+                last_error = exc
+                logger.debug("Discarded plan candidate: %s", exc)
+    if isinstance(last_error, PlanParseError):
+        raise last_error
+    raise PlanParseError(f"Invalid plan JSON: {last_error}") from last_error
@@ -0,0 +1,147 @@
+"""
+Compiled prompt templates.
+
+Templates are tokenized once, and the variables that do not change between requests are
+rendered into them ahead of time: the function manual ([AVAILABLE FUNCTIONS]) of the planner
+prompt is built once per catalog fingerprint, so a request only substitutes its goal. Hidden
+functions (question_updater...) share one parsed template across kernels, their requests only
+substitute the question and previous output.
+"""
+# Standard imports
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Annotated, Any, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+# Third party
+from pydantic import Field
+from semantic_kernel import Kernel
+from semantic_kernel.prompt_template.kernel_prompt_template import KernelPromptTemplate
+from semantic_kernel.prompt_template.prompt_template_config import PromptTemplateConfig
+from semantic_kernel.template_engine.blocks.block import Block
+from semantic_kernel.template_engine.blocks.text_block import TextBlock
+from semantic_kernel.template_engine.blocks.var_block import VarBlock
+
+# Internal imports
+from utils.plan_cache import NON_CATALOG_PLUGINS
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CompiledPromptTemplate(KernelPromptTemplate):
+    """
+    semantic-kernel template whose `static_values` variables are already rendered in, merged
+    with the text around them.
+    """
+    static_values: Dict[str, str] = Field(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        blocks: List[Block] = []
+        for block in self._blocks:
+            if isinstance(block, VarBlock) and block.name in self.static_values:
+                block = TextBlock.from_text(self.static_values[block.name])
+            if isinstance(block, TextBlock) and blocks and isinstance(blocks[-1], TextBlock):
+                block = TextBlock.from_text(blocks.pop().content + block.content)
+            blocks.append(block)
+        self._blocks = blocks
+
+
+def function_manual(kernel: Annotated[Kernel, "kernel with the registered plugins"]) -> Annotated[str, "[AVAILABLE FUNCTIONS] section"]:
+    """
+    The [AVAILABLE FUNCTIONS] section of the planner prompt, in BasicPlanner's format, without
+    the planner's own function and the hidden ones (question_updater, output_summarizer).
+    """
+    manual = []
+    for function in kernel.plugins.get_list_of_function_metadata():
+        if function.plugin_name in NON_CATALOG_PLUGINS:
+            continue
+        manual.append(f"{function.plugin_name}.{function.name}\n")
+        if function.description:
+            manual.append(f"description: {function.description}\n")
+        manual.append("args:\n")
+        for parameter in function.parameters:
+            manual.append(f"- {parameter.name}: {parameter.description or ''}\n")
+        manual.append("\n")
+    return "".join(manual)
+
+
+class PromptCompilationCache:
+    """
+    Compiled templates and the functions built on them, by key, least recently used evicted.
+    """
+
+    def __init__(self, max_entries: Annotated[int, "Compiled entries kept"] = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compile(self, key: Annotated[Hashable, "What the entry is compiled from"],
+                       compile: Annotated[Callable[[], T], "Builds the entry on a miss"]) -> T:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Compiled outside the lock, concurrent misses of a key compile it twice and keep one
+        entry = compile()
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def template(self, prompt_template_config: Annotated[PromptTemplateConfig, "semantic-kernel format template"],
+                 static_values: Annotated[Optional[Dict[str, str]], "Variables rendered ahead of time"] = None,
+                 key: Annotated[Optional[Hashable], "Cache key, the template, its settings and static values by default"] = None
+                 ) -> CompiledPromptTemplate:
+        if key is None:
+            key = ("template", hashlib.sha256(json.dumps([prompt_template_config.model_dump(mode="json"), static_values or {}],
+                                                          sort_keys=True, default=str).encode("utf-8")).hexdigest())
+        return self.get_or_compile(key, lambda: CompiledPromptTemplate(prompt_template_config=prompt_template_config,
+                                                                         static_values=static_values or {}))
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_default_cache = PromptCompilationCache()
+
+
+def get_prompt_cache() -> PromptCompilationCache:
+    return _default_cache
+
+
+_prompt_files: Dict[str, Tuple[int, str]] = {}
+
+
+def load_prompt(path: Annotated[str, "prompt file"]) -> Annotated[str, "prompt text"]:
+    """
+    Contents of a prompt file, read again only when the file changes.
+    """
+    path = os.path.abspath(path)
+    modified = os.stat(path).st_mtime_ns
+    known = _prompt_files.get(path)
+    if known is not None and known[0] == modified:
+        return known[1]
+    with open(path, "r", encoding="utf-8") as f:
+        prompt = f.read()
+    _prompt_files[path] = (modified, prompt)
+    return prompt
@@ -0,0 +1,205 @@
+# Standard imports
+import ast
+import json
+import hashlib
+import threading
+from enum import Enum
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Annotated, Any, Awaitable, Callable, Dict, List, Optional
+
+# Third party
+from semantic_kernel import Kernel
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+
+# Internal imports
+from utils.context_budget import ContextBudget
+from utils.plan_cache import normalize_question
+from utils.plan_graph import STEP_REFERENCE, resolve_references
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+# Placeholders a question may carry for the previous output, replaced verbatim when present.
+PREVIOUS_OUTPUT_PLACEHOLDERS = ("{{$previous_output}}", "{previous_output}")
+
+# Outputs that carry nothing to rewrite the question with.
+EMPTY_OUTPUTS = frozenset(["", "none", "null", "[]", "{}", "()", "''", '""'])
+
+# Longer values read as sentences ("No incidences were found") and are left to the LLM.
+ENTITY_MAX_WORDS = 4
+
+# Values that are flags or statuses rather than names, appending them says nothing.
+NON_ENTITIES = frozenset(["true", "false", "none", "null", "yes", "no", "ok", "n/a"])
+
+LLMRewrite = Callable[[str, str, Kernel], Awaitable[Any]]
+
+
+class RewriteStrategy(str, Enum):
+    SKIPPED = "skipped"
+    TEMPLATE = "template"
+    ENTITY = "entity"
+    MEMOIZED = "memoized"
+    LLM = "llm"
+
+
+@dataclass(frozen=True)
+class Rewrite:
+    question: str
+    strategy: RewriteStrategy
+
+
+async def question_updater_rewrite(question: str, previous_output: str, kernel: Kernel) -> Any:
+    """
+    Default fallback, the hidden question_updater prompt function.
+    """
+    question_updater = kernel.func("question_updater", "question_updater")
+    return await question_updater.invoke(kernel, KernelArguments(question=question, previous_output=previous_output))
+
+
+def is_name_like(value: Annotated[Any, "value of a short output"]) -> bool:
+    """
+    A name (a city, a user...): text with letters, not a number, a boolean or a status.
+    """
+    if not isinstance(value, str):
+        return False
+    value = value.strip()
+    return any(char.isalpha() for char in value) and value.casefold() not in NON_ENTITIES \
+        and len(value.split()) <= ENTITY_MAX_WORDS
+
+
+def short_entities(previous_output: Annotated[str, "output of the previous subtask"],
+                   max_chars: Annotated[int, "longest output considered a short value"] = 80,
+                   max_entities: Annotated[int, "most values in a list output"] = 3) -> Annotated[Optional[List[str]], "values, None when the output is not short"]:
+    """
+    Extract the values of a short output: a name ("Barcelona") or a small list of names
+    ("['Barcelona', 'Madrid']"), each of a few words rather than a sentence. Numbers, booleans
+    and anything longer or nested need the LLM.
+    """
+    text = previous_output.strip()
+    if not text or len(text) > max_chars or "\n" in text:
+        return None
+    if text[0] in "[({":
+        try:
+            value = json.loads(text)
+        except ValueError:
+            try:
+                value = ast.literal_eval(text)
+            except (ValueError, SyntaxError):
+                return None
+        if not isinstance(value, (list, tuple)) or not 0 < len(value) <= max_entities:
+            return None
+        entities = value
+    else:
+        entities = [text.strip("\"'")]
+    if not all(is_name_like(entity) for entity in entities):
+        return None
+    return [entity.strip() for entity in entities]
+
+
+class QuestionRewriter:
+    """
+    Rewrites the question of a subtask with the output of the subtasks it depends on, trying
+    cheap local strategies before paying for an LLM call:
+
+    - skipped: the subtask does not depend on prior output or that output is empty
+    - template: the question has placeholders for the outputs, each $stepN / $output replaced
+      with the output of its own subtask, {previous_output} with the output passed
+    - entity: the output is a short name (a city, a user...) appended to the question
+    - memoized: the same (question, previous output) pair was already rewritten
+    - llm: everything else goes to the question_updater function, with the output fitted to
+      the context budget
+    """
+
+    def __init__(self, llm_rewrite: Annotated[LLMRewrite, "Fallback rewrite, async (question, previous_output, kernel)"] = question_updater_rewrite,
+                 entity_template: Annotated[str, "How short values are added to the question"] = "{question} ({entities})",
+                 max_entity_chars: Annotated[int, "Longest output handled by entity substitution, 0 disables it"] = 80,
+                 max_entities: Annotated[int, "Most values of a list output handled by entity substitution"] = 3,
+                 memo_size: Annotated[int, "Rewrites memoized, 0 disables memoization"] = 1024,
+                 context_budget: Annotated[Optional[ContextBudget], "Fits the output passed to the LLM, None passes it whole"] = None):
+        self.llm_rewrite = llm_rewrite
+        self.entity_template = entity_template
+        self.max_entity_chars = max_entity_chars
+        self.max_entities = max_entities
+        self.memo_size = memo_size
+        self.context_budget = context_budget
+        self._memo: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {strategy.value: 0 for strategy in RewriteStrategy}
+
+    @staticmethod
+    def memo_key(question: str, previous_output: str) -> str:
+        payload = json.dumps([normalize_question(question), previous_output.strip()], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, question: str, strategy: RewriteStrategy) -> Rewrite:
+        with self._lock:
+            self.counts[strategy.value] += 1
+        logger.debug("Question rewrite (%s): %s", strategy.value, question)
+        return Rewrite(question=question, strategy=strategy)
+
+    def _template(self, question: str, previous_output: str, outputs: Optional[Dict[int, str]],
+                  index: Optional[int]) -> Optional[str]:
+        if STEP_REFERENCE.search(question):
+            if outputs is None or index is None:
+                return None
+            resolved = resolve_references(question, {ref: output.strip() for ref, output in outputs.items()}, index)
+            # References to subtasks without an output are left to the LLM
+            return None if STEP_REFERENCE.search(resolved) else resolved
+        for placeholder in PREVIOUS_OUTPUT_PLACEHOLDERS:
+            if placeholder in question:
+                return question.replace(placeholder, previous_output.strip())
+        return None
+
+    def _entity(self, question: str, previous_output: str) -> Optional[str]:
+        if not self.max_entity_chars or STEP_REFERENCE.search(question):
+            return None
+        entities = short_entities(previous_output, self.max_entity_chars, self.max_entities)
+        if entities is None:
+            return None
+        folded = question.casefold()
+        missing = [entity for entity in entities if entity.casefold() not in folded]
+        if not missing:
+            # The question already names the values
+            return question
+        # Keep the closing punctuation of the question after the inserted values
+        body = question.rstrip(" ?!.")
+        return self.entity_template.format(question=body, entities=", ".join(missing)) + question[len(body):].strip()
+
+    async def rewrite(self, question: Annotated[str, "question of the subtask"],
+                      previous_output: Annotated[Optional[str], "output of the subtasks it depends on"],
+                      kernel: Annotated[Kernel, "kernel holding the question_updater function"],
+                      depends: Annotated[bool, "whether the subtask depends on the previous output"] = True,
+                      outputs: Annotated[Optional[Dict[int, str]], "outputs of finished subtasks by index, resolve $stepN / $output"] = None,
+                      index: Annotated[Optional[int], "index of the subtask, what $output refers to"] = None) -> Rewrite:
+        if not depends or previous_output is None or previous_output.strip().casefold() in EMPTY_OUTPUTS:
+            return self._count(question, RewriteStrategy.SKIPPED)
+
+        rewritten = self._template(question, previous_output, outputs, index)
+        if rewritten is not None:
+            return self._count(rewritten, RewriteStrategy.TEMPLATE)
+        rewritten = self._entity(question, previous_output)
+        if rewritten is not None:
+            return self._count(rewritten, RewriteStrategy.ENTITY)
+
+        key = self.memo_key(question, previous_output)
+        with self._lock:
+            memoized = self._memo.get(key)
+            if memoized is not None:
+                self._memo.move_to_end(key)
+        if memoized is not None:
+            return self._count(memoized, RewriteStrategy.MEMOIZED)
+
+        if self.context_budget is not None and self.context_budget.enabled:
+            previous_output = (await self.context_budget.fit(previous_output, kernel)).text
+        rewritten = str(await self.llm_rewrite(question, previous_output, kernel)).strip() or question
+        if self.memo_size:
+            with self._lock:
+                self._memo[key] = rewritten
+                self._memo.move_to_end(key)
+                while len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+        return self._count(rewritten, RewriteStrategy.LLM)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counts, memoized_size=len(self._memo))
@@ -0,0 +1,164 @@
+# Standard imports
+import re
+import zlib
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Annotated, Dict, FrozenSet, List, Optional, Tuple
+
+# Third party
+import numpy as np
+from semantic_kernel.planners.basic_planner import Plan
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+# Words that carry no intent, ignored so "lista las incidencias" and "muéstrame incidencias" get closer.
+STOP_WORDS = frozenset("""
+a al algo algun alguna algunos como con de del el en es esta este la las lo los me mi mis muestrame
+por para que se sobre su sus te tu un una unas uno unos y o lista listar dame ensename quiero ver
+cuales cual son hay todas todos puedes podrias favor
+the a an and are as at be by for from give i in is it list me my of on or please show tell that
+the this to what which with all can could get find there
+""".split())
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+
+def tokenize(text: Annotated[str, "question"]) -> Annotated[List[str], "content words"]:
+    """
+    Lowercase, accent-free words without stop words.
+    """
+    words = _WORD.findall(_strip_accents(text.casefold()))
+    content = [word for word in words if word not in STOP_WORDS]
+    return content or words
+
+
+def _singular(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+@dataclass(frozen=True)
+class SemanticMatch:
+    """
+    A cached plan reused for a paraphrased question.
+    """
+    question: str
+    score: float
+    plan: Plan = field(repr=False)
+
+
+def key_terms(text: Annotated[str, "question"]) -> Annotated[FrozenSet[str], "content words and entities of the question"]:
+    """
+    Content words (singular) and entities (names, ids, numbers) of the question: they must all
+    match for two questions to share a plan, "wifi" and "vpn", "most" and "least" or "john" and
+    "johnny" change the plan however similar the rest of the question is.
+    """
+    return frozenset(_singular(word) for word in tokenize(text))
+
+
+@dataclass
+class _Bucket:
+    questions: List[str] = field(default_factory=list)
+    key_terms: List[FrozenSet[str]] = field(default_factory=list)
+    plans: List[Plan] = field(default_factory=list)
+    vectors: Optional[np.ndarray] = None
+
+
+class SemanticPlanIndex:
+    """
+    Local similarity index over already planned questions.
+
+    Questions are embedded as hashed word and character n-gram vectors (sublinear tf, L2
+    normalized) so no external embedding service is needed. Lookups only consider questions
+    planned against the same catalog fingerprint and with the same key terms (see key_terms):
+    paraphrases differ in word order, stop words and plurals, not in what they ask for.
+    """
+
+    def __init__(self, threshold: Annotated[float, "Minimum cosine similarity to reuse a plan"] = 0.9,
+                 dimensions: Annotated[int, "Size of the hashed vector space"] = 2 ** 12,
+                 ngram_range: Annotated[Tuple[int, int], "Character n-gram sizes"] = (3, 5),
+                 max_entries: Annotated[int, "Questions kept per catalog fingerprint"] = 1024):
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self.max_entries = max_entries
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _features(self, text: str) -> List[str]:
+        words = tokenize(text)
+        features = [f"w:{word}" for word in words]
+        low, high = self.ngram_range
+        for word in words:
+            padded = f" {word} "
+            for size in range(low, high + 1):
+                features.extend(f"c:{padded[i:i + size]}" for i in range(len(padded) - size + 1))
+        return features
+
+    def vectorize(self, text: Annotated[str, "question"]) -> Annotated[np.ndarray, "L2 normalized hashed vector"]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dimensions] += 1.0
+        np.log1p(vector, out=vector)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def add(self, question: Annotated[str, "planned question"], fingerprint: Annotated[str, "catalog fingerprint"],
+            plan: Annotated[Plan, "generated plan"]) -> None:
+        vector = self.vectorize(question)[np.newaxis, :]
+        with self._lock:
+            bucket = self._buckets.setdefault(fingerprint, _Bucket())
+            bucket.questions.append(question)
+            bucket.key_terms.append(key_terms(question))
+            bucket.plans.append(plan)
+            bucket.vectors = vector if bucket.vectors is None else np.vstack((bucket.vectors, vector))
+            if len(bucket.questions) > self.max_entries:
+                overflow = len(bucket.questions) - self.max_entries
+                del bucket.questions[:overflow]
+                del bucket.key_terms[:overflow]
+                del bucket.plans[:overflow]
+                bucket.vectors = bucket.vectors[overflow:]
+
+    def lookup(self, question: Annotated[str, "question to plan"], fingerprint: Annotated[str, "catalog fingerprint"]) -> Annotated[Optional[SemanticMatch], "best match over the threshold"]:
+        with self._lock:
+            bucket = self._buckets.get(fingerprint)
+            if bucket is None or bucket.vectors is None:
+                self.misses += 1
+                return None
+            scores = bucket.vectors @ self.vectorize(question)
+            question_terms = key_terms(question)
+            for candidate in np.flatnonzero(scores >= self.threshold)[np.argsort(-scores[scores >= self.threshold])]:
+                if bucket.key_terms[candidate] == question_terms:
+                    self.hits += 1
+                    return SemanticMatch(question=bucket.questions[candidate], score=min(float(scores[candidate]), 1.0),
+                                         plan=bucket.plans[candidate])
+            self.misses += 1
+            return None
+
+    def invalidate(self, fingerprint: Annotated[Optional[str], "only drop questions of this catalog, None drops all"] = None) -> None:
+        with self._lock:
+            if fingerprint is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(fingerprint, None)
+
+    def __len__(self) -> int:
+        return sum(len(bucket.questions) for bucket in self._buckets.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
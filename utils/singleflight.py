@@ -0,0 +1,139 @@
+"""
+Request coalescing ("singleflight"): concurrent identical calls share one in-flight execution.
+
+The first caller of a key starts the call, the callers arriving while it runs wait for the
+same result (or exception). Nothing is kept once the call ends, caching is the result and
+plan caches' job. A caller cancelling only stops its own wait, the call is cancelled when
+nobody waits for it anymore.
+
+Counted per group in the metrics registry (orchestrator_singleflight_calls_total and
+orchestrator_singleflight_collapsed_total). COALESCE_CALLS=0 turns coalescing off.
+"""
+# Standard imports
+import os
+import asyncio
+import threading
+from typing import Annotated, Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+# Internal imports
+from request_utils.metrics import get_registry
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+T = TypeVar("T")
+
+_enabled = os.getenv("COALESCE_CALLS", "1") != "0"
+_calls = get_registry().counter("singleflight_calls", "Calls going through request coalescing.", "group")
+_collapsed = get_registry().counter("singleflight_collapsed", "Calls served by an identical call already in flight.", "group")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class _SyncFlight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    In-flight calls of one group (plugin reads, LLM completions...) by key.
+    """
+
+    def __init__(self, group: Annotated[str, "Group name, label of the metrics"]):
+        self.group = group
+        self._flights: Dict[Tuple[int, str], _Flight] = {}
+        self._sync_flights: Dict[str, _SyncFlight] = {}
+        self._sync_lock = threading.Lock()
+
+    async def do(self, key: Annotated[str, "Canonical hash of the call"],
+                 call: Annotated[Callable[[], Awaitable[T]], "Starts the call, only invoked by the first caller"]) -> T:
+        if not _enabled:
+            return await call()
+        _calls.inc(self.group)
+        # Tasks cannot be awaited from another event loop
+        flight_key = (id(asyncio.get_running_loop()), key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = self._flights[flight_key] = _Flight(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(lambda _: self._flights.pop(flight_key, None))
+        else:
+            _collapsed.inc(self.group)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def do_sync(self, key: Annotated[str, "Canonical hash of the call"],
+                call: Annotated[Callable[[], T], "Makes the call, only invoked by the first caller"]) -> T:
+        """
+        Blocking counterpart of do, for calls made from worker threads.
+        """
+        if not _enabled:
+            return call()
+        _calls.inc(self.group)
+        with self._sync_lock:
+            flight = self._sync_flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._sync_flights[key] = _SyncFlight()
+        if not leader:
+            _collapsed.inc(self.group)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = call()
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._sync_lock:
+                del self._sync_flights[key]
+            flight.done.set()
+
+    def in_flight(self) -> int:
+        return len(self._flights) + len(self._sync_flights)
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_singleflight(group: Annotated[str, "Group name"]) -> SingleFlight:
+    flight = _groups.get(group)
+    if flight is None:
+        with _groups_lock:
+            flight = _groups.setdefault(group, SingleFlight(group))
+    return flight
+
+
+def set_coalescing(enabled: Annotated[bool, "Coalesce identical concurrent calls"]) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def coalescing_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Calls and collapsed calls per group.
+    """
+    calls = _calls.values()
+    collapsed = _collapsed.values()
+    return {group: {"calls": calls.get(group, 0), "collapsed": collapsed.get(group, 0)} for group in sorted(calls)}
@@ -1,37 +1,68 @@
 # Standard
-from typing import Annotated, Dict, List
+from typing import Annotated, Any, Dict, List, Optional
 
 # Third party
 import semantic_kernel as sk
 
-from semantic_kernel.connectors.ai.open_ai.services.open_ai_chat_completion import OpenAIChatCompletion
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
 from semantic_kernel.functions.kernel_plugin import KernelPlugin
 from semantic_kernel.prompt_template.input_variable import InputVariable
 
 # Internal
 from utils.input_model import Question
-from utils.custom_kernel import CustomKernel
-from plugins.ServiceDesk.ServiceDesk import ServiceDesk
-from plugins.Invoices_db.InvoicesDB import InvoicesDB
-from plugins.Rag.Rag import Rag
-from plugins.CitiesDB.Cities import CitiesDB
+from utils.custom_kernel import CustomKernel, PluginSpec
+from utils.prompt_cache import get_prompt_cache
+from plugins.catalog import PLUGIN_CATALOG
+
+def get_kernel_router(chat_service: Annotated[Optional[ChatCompletionClientBase], "Chat service to use instead of OpenAI (service id 'planner')"] = None,
+                      scheduler: Annotated[Optional[Any], "LLMScheduler of the calls, the process wide one for OpenAI"] = None
+                      ) -> Annotated[sk.Kernel, "Kernel instance"]:
+    from utils.chat_services import CoalescingChatCompletion, RecordingChatCompletion, ReplayChatCompletion, TracingChatCompletion
+    from utils.llm_scheduler import SchedulingChatCompletion, get_llm_scheduler
+    from utils.token_accounting import AccountingChatCompletion
+    from utils.traffic import get_recorder, get_replayer
 
-def get_kernel_router() -> Annotated[sk.Kernel, "Kernel instance"]:
     # Initialize the kernel
     kernel = CustomKernel()
     # Add a text or chat completion service using either:
     # kernel.add_text_completion_service()
     # kernel.add_chat_service()
 
-    api_key, org_id = sk.openai_settings_from_dot_env()
-    
-    kernel.add_service(
-        OpenAIChatCompletion(
+    replayer = get_replayer()
+    if chat_service is None and replayer is not None:
+        # Replay (see utils.traffic): recorded completions, no OpenAI client
+        chat_service = ReplayChatCompletion(service_id="planner", ai_model_id="gpt-4", replayer=replayer)
+
+    if chat_service is None:
+        # The OpenAI connector pulls the openai SDK, only import it when it is used
+        from openai import AsyncOpenAI
+        from semantic_kernel.connectors.ai.open_ai.services.open_ai_chat_completion import OpenAIChatCompletion
+
+        api_key, org_id = sk.openai_settings_from_dot_env()
+        chat_service = OpenAIChatCompletion(
             service_id="planner",
             ai_model_id="gpt-4",
-            api_key=api_key,
+            # Rate limits, 5xx and connection errors are retried by the scheduler, within its budgets
+            async_client=AsyncOpenAI(api_key=api_key, max_retries=0),
         )
-    )
+        scheduler = scheduler or get_llm_scheduler()
+
+    recorder = get_recorder()
+    if recorder is not None:
+        chat_service = RecordingChatCompletion(chat_service, recorder)
+
+    if scheduler is not None:
+        # Requests/tokens per minute budgets, priorities and rate limit backoff (see utils.llm_scheduler)
+        chat_service = SchedulingChatCompletion(chat_service, scheduler)
+
+    # Identical concurrent completions (planning, question updates) share one call
+    chat_service = CoalescingChatCompletion(chat_service)
+
+    # Tokens and cost per request, domain, purpose and plugin (see utils.token_accounting), coalesced calls counted once
+    chat_service = AccountingChatCompletion(chat_service)
+
+    # Completions get a span when the request is traced (see utils.tracing)
+    kernel.add_service(TracingChatCompletion(chat_service))
 
     return kernel
 
@@ -63,42 +94,70 @@ def _load_hidden_plugins(kernel: Annotated[sk.Kernel, "kernel instance from sema
         ],
     )
 
+    # Templates are parsed once and shared by every kernel (see utils.prompt_cache)
     question_updater = kernel.create_function_from_prompt(
         function_name="question_updater",
         plugin_name="question_updater",
         prompt_template_config=prompt_template_config,
+        prompt_template=get_prompt_cache().template(prompt_template_config),
     )
 
-    kernel.add_function_invoked_handler
-
-    return [question_updater]
+    # Summaries of subtask outputs over the context budget (see utils.context_budget)
+    summarizer_prompt = """
+        Summarize the following output of a service in at most {{$max_words}} words.
+        Keep every name, identifier, status, date and amount that could answer a question about it.
+        Do not include anything but the summary in your response.
 
+        {{$output}}
+    """
 
-def load_plugins(kernel: Annotated[sk.Kernel, "kernel instance from semantic kernel"]) -> Annotated[Dict[str, List[KernelPlugin]], "List of loaded plugins in KernelPlugin format"]:
-    # Import the native functions
-    servicedesk_plugin = kernel.import_plugin_from_object(ServiceDesk(),
-                                                          plugin_name="sevicedesk",
-                                                          plugin_description="Provide information about incidences through the ServiceDesk ticketing service")
+    summarizer_template_config = sk.PromptTemplateConfig(
+        template=summarizer_prompt,
+        name="output_summary",
+        template_format="semantic-kernel",
+        input_variables=[
+            InputVariable(name="output", description="Output to summarize", is_required=True),
+            InputVariable(name="max_words", description="Length of the summary", is_required=True)
+        ],
+    )
 
-    invoices_plugin = kernel.import_plugin_from_object(InvoicesDB(),
-                                                       plugin_name="invoices",
-                                                       plugin_description="Retrieve information about invoices and the users related to them. Execute write operations on invoices like update, upsert on inserts.")
+    output_summarizer = kernel.create_function_from_prompt(
+        function_name="output_summarizer",
+        plugin_name="output_summarizer",
+        prompt_template_config=summarizer_template_config,
+        prompt_template=get_prompt_cache().template(summarizer_template_config),
+    )
 
-    rag_plugin = kernel.import_plugin_from_object(Rag(),
-                                                        plugin_name="rag",
-                                                        plugin_description="Default plugin to call when no other plugin can be used. Any information not provided by other functions are meant to be retrieved from here.")
+    kernel.add_function_invoked_handler
 
-    cities_plugin = kernel.import_plugin_from_object(CitiesDB(),
-                                                        plugin_name="cities_db",
-                                                        plugin_description="Plugin useful to retrieve cities based on some filters.")
+    return [question_updater, output_summarizer]
+
+
+def load_plugins(kernel: Annotated[sk.Kernel, "kernel instance from semantic kernel"],
+                 lazy: Annotated[bool, "Register the declared catalog and import each plugin on first use"] = True) -> Annotated[Dict[str, List[KernelPlugin]], "List of loaded plugins in KernelPlugin format"]:
+    if lazy:
+        loaded_plugins = kernel.import_lazy_plugins(PLUGIN_CATALOG)
+    else:
+        from plugins.ServiceDesk.ServiceDesk import ServiceDesk
+        from plugins.Invoices_db.InvoicesDB import InvoicesDB
+        from plugins.Rag.Rag import Rag
+        from plugins.CitiesDB.Cities import CitiesDB
+
+        # Import the native functions
+        loaded_plugins = kernel.import_plugins([
+            PluginSpec(ServiceDesk(), "sevicedesk", "Provide information about incidences through the ServiceDesk ticketing service"),
+            PluginSpec(InvoicesDB(), "invoices", "Retrieve information about invoices and the users related to them. Execute write operations on invoices like update, upsert on inserts."),
+            PluginSpec(Rag(), "rag", "Default plugin to call when no other plugin can be used. Any information not provided by other functions are meant to be retrieved from here."),
+            PluginSpec(CitiesDB(), "cities_db", "Plugin useful to retrieve cities based on some filters."),
+        ])
     
     hidden_plugins = _load_hidden_plugins(kernel=kernel)
-    
-    loaded_plugins = [servicedesk_plugin, invoices_plugin, rag_plugin, cities_plugin]
 
     return {"visible": loaded_plugins, "hidden": hidden_plugins}
 
 async def load_plugins_async(kernel: Annotated[sk.Kernel, "kernel instance from semantic kernel"]) -> Annotated[List[KernelPlugin], "List of loaded plugins in KernelPlugin format"]:
+    from plugins.Invoices_db.InvoicesDB import InvoicesDB
+
     # Import the native functions
     # servicedesk_plugin = kernel.import_plugin_from_object(ServiceDesk(),
     #                                                       plugin_name="sevicedesk",
@@ -0,0 +1,68 @@
+# Standard imports
+import json
+import asyncio
+from typing import Any, List
+
+# Third party
+import semantic_kernel as sk
+
+# Internal imports
+from utils.batch_runner import BatchRunner, completed_message_ids, percentile
+from utils.input_model import Question
+
+
+class FakePlanner:
+    """
+    Answers every question without planning, recording the message_ids it answered.
+    """
+    def __init__(self):
+        self.answered: List[int] = []
+
+    async def create_plan(self, goal: str, **kwargs: Any) -> str:
+        return goal
+
+    async def execute_plan(self, plan: str, kernel: sk.Kernel, question: Question, **kwargs: Any) -> str:
+        self.answered.append(question.message_id)
+        return f"answer to {plan}"
+
+
+def question_line(message_id: int) -> str:
+    return json.dumps({"user_id": 1, "message_id": message_id, "chat_id": 1, "domain_id": 1, "question": f"question {message_id}"})
+
+
+def result_line(message_id: int, status: str) -> str:
+    return json.dumps({"message_id": message_id, "status": status}) + "\n"
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(value) for value in range(1, 11)]
+
+    assert [percentile(values, fraction) for fraction in (0.0, 0.1, 0.5, 0.9, 0.95, 1.0)] == [1.0, 1.0, 5.0, 9.0, 10.0, 10.0]
+    assert percentile([float(value) for value in range(1, 101)], 0.99) == 99.0
+    assert percentile([7.0], 0.5) == 7.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_completed_message_ids_truncates_a_partial_last_line(tmp_path):
+    output = tmp_path / "results.jsonl"
+    complete = result_line(1, "ok") + result_line(2, "error")
+    output.write_text(complete + '{"message_id": 3, "sta', encoding="utf-8")
+
+    assert completed_message_ids(str(output)) == {1}
+    assert output.read_text(encoding="utf-8") == complete
+
+
+def test_resume_skips_the_answered_message_ids(tmp_path):
+    input_path = tmp_path / "questions.jsonl"
+    input_path.write_text("\n".join(question_line(message_id) for message_id in (1, 2, 3)) + "\n", encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    output.write_text(result_line(1, "ok") + result_line(2, "error"), encoding="utf-8")
+    planner = FakePlanner()
+
+    report = asyncio.run(BatchRunner(sk.Kernel(), planner, "prompt", concurrency=2).run(str(input_path), str(output)))
+
+    assert sorted(planner.answered) == [2, 3]
+    assert (report.skipped, report.succeeded, report.failed) == (1, 2, 0)
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert sorted(record["message_id"] for record in records[2:]) == [2, 3]
+    assert completed_message_ids(str(output)) == {1, 2, 3}
@@ -0,0 +1,115 @@
+# Standard imports
+import json
+import asyncio
+from typing import List
+
+# Third party
+import pytest
+import semantic_kernel as sk
+
+# Internal imports
+from utils.context_budget import ContextBudget, FitStrategy, context_savings
+
+
+def tickets(count: int) -> str:
+    return json.dumps([{"id": i, "status": "open", "description": "printer out of toner " * 20, "history": "x" * 300}
+                       for i in range(count)])
+
+
+def fit(budget: ContextBudget, text: str, kernel: sk.Kernel = None):
+    return asyncio.run(budget.fit(text, kernel))
+
+
+def test_budget_is_disabled_by_default():
+    text = tickets(50)
+
+    result = fit(ContextBudget(), text)
+
+    assert not ContextBudget().enabled
+    assert result.strategy == FitStrategy.FITS
+    assert result.text == text
+
+
+def test_extract_keeps_the_key_fields_of_the_records():
+    budget = ContextBudget(max_tokens=200)
+
+    result = fit(budget, tickets(3))
+
+    assert result.strategy == FitStrategy.EXTRACT
+    assert json.loads(result.text) == [{"id": i, "status": "open"} for i in range(3)]
+    assert result.tokens_after <= 200 < result.tokens_before
+
+
+def test_extract_drops_the_records_that_do_not_fit_with_a_note():
+    budget = ContextBudget(max_tokens=60)
+
+    result = fit(budget, tickets(40))
+
+    records = json.loads(result.text)
+    assert result.strategy == FitStrategy.EXTRACT
+    assert records[0] == {"id": 0, "status": "open"}
+    assert records[-1] == f"... {40 - (len(records) - 1)} more"
+    assert budget.counter.count(result.text) <= 60
+
+
+def test_extract_reads_python_literals():
+    output = str({"city": "Madrid", "forecast": "sunny " * 200})
+
+    result = fit(ContextBudget(max_tokens=50), output)
+
+    assert result.strategy == FitStrategy.EXTRACT
+    assert json.loads(result.text) == {"city": "Madrid"}
+
+
+def test_plain_text_is_truncated_without_summarization():
+    text = "\n".join(f"line {i} of a long answer" for i in range(200))
+    budget = ContextBudget(max_tokens=50)
+
+    result = fit(budget, text, sk.Kernel())
+
+    assert result.strategy == FitStrategy.TRUNCATE
+    assert result.text.startswith("line 0 of a long answer\nline 1")
+    assert "more tokens truncated]" in result.text
+    assert result.tokens_after <= 50
+
+
+def test_summaries_are_cached_by_content():
+    calls: List[str] = []
+
+    async def summarize(text: str, max_tokens: int, kernel: sk.Kernel) -> str:
+        calls.append(text)
+        return "a short summary"
+
+    budget = ContextBudget(max_tokens=20, summarize=summarize)
+    text = "a long plain text answer " * 50
+
+    first = fit(budget, text, sk.Kernel())
+    second = fit(budget, text, sk.Kernel())
+
+    assert first.strategy == second.strategy == FitStrategy.SUMMARIZE
+    assert first.text == second.text == "a short summary"
+    assert len(calls) == 1
+
+
+def test_failed_summarization_falls_back_to_truncation():
+    async def summarize(text: str, max_tokens: int, kernel: sk.Kernel) -> str:
+        raise RuntimeError("summarizer unavailable")
+
+    result = fit(ContextBudget(max_tokens=20, summarize=summarize), "a long plain text answer " * 50, sk.Kernel())
+
+    assert result.strategy == FitStrategy.TRUNCATE
+
+
+@pytest.mark.parametrize("strategy, text", [(FitStrategy.EXTRACT, tickets(3)), (FitStrategy.TRUNCATE, "word " * 500)])
+def test_fits_are_tallied_per_request(strategy, text):
+    budget = ContextBudget(max_tokens=200)
+
+    async def request():
+        with context_savings() as savings:
+            fitted = await budget.fit(text)
+        return fitted, savings
+
+    fitted, savings = asyncio.run(request())
+
+    assert savings.fits == {strategy.value: 1}
+    assert savings.tokens_saved == fitted.tokens_saved > 0
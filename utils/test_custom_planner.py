@@ -0,0 +1,136 @@
+# Standard imports
+import json
+import asyncio
+from types import SimpleNamespace
+from typing import Annotated, Any, Dict, List
+
+# Third party
+import pytest
+import semantic_kernel as sk
+from semantic_kernel.exceptions import KernelFunctionNotFoundError
+from semantic_kernel.functions import kernel_function
+from semantic_kernel.planners.basic_planner import Plan
+
+# Internal imports
+from utils.custom_planner import CustomBasicPlanner
+from utils.input_model import Question
+from utils.plan_events import PlanEvent, PlanEventType
+
+
+class Steps:
+    """
+    Native plugin recording when each call starts and ends, and how many run at once.
+    """
+    def __init__(self, delay_s: float = 0.02):
+        self.delay_s = delay_s
+        self.events: List[tuple] = []
+        self.running = 0
+        self.peak = 0
+
+    @kernel_function(description="Echo the text in upper case", name="echo")
+    async def echo(self, text: Annotated[str, "text to echo"]) -> Annotated[str, "the text in upper case"]:
+        self.events.append(("start", text))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(self.delay_s)
+        self.running -= 1
+        self.events.append(("end", text))
+        return text.upper()
+
+
+def kernel_with(steps: Steps) -> sk.Kernel:
+    kernel = sk.Kernel()
+    kernel.import_plugin_from_object(steps, "steps")
+    return kernel
+
+
+def plan_of(*subtasks: Dict[str, Any]) -> Plan:
+    generated_plan = {"input": "goal", "subtasks": list(subtasks)}
+    return Plan(prompt="", goal="goal", plan=SimpleNamespace(value=json.dumps(generated_plan)))
+
+
+def echo(text: str) -> Dict[str, Any]:
+    return {"function": "steps.echo", "args": {"text": text}}
+
+
+def question() -> Question:
+    return Question(user_id=1, message_id=1, chat_id=1, domain_id=1, question="goal")
+
+
+def collect_events(planner: CustomBasicPlanner, plan: Plan, kernel: sk.Kernel, events: List[PlanEvent]) -> None:
+    async def consume() -> None:
+        async for event in planner.execute_plan_stream(plan, kernel, question(), headers={}):
+            events.append(event)
+    asyncio.run(consume())
+
+
+def run_parallel(planner: CustomBasicPlanner, plan: Plan, kernel: sk.Kernel) -> str:
+    return asyncio.run(planner.execute_plan(plan, kernel, question(), headers={}, execution_mode="parallel"))
+
+
+def test_steps_run_after_the_steps_they_reference():
+    steps = Steps()
+
+    result = run_parallel(CustomBasicPlanner(service_id="planner"), plan_of(echo("a"), echo("b after $step1")), kernel_with(steps))
+
+    assert steps.events == [("start", "a"), ("end", "a"), ("start", "b after A"), ("end", "b after A")]
+    assert str(result) == "B AFTER A"
+
+
+@pytest.mark.parametrize("max_concurrency", [2, 4])
+def test_independent_steps_overlap_up_to_max_concurrency(max_concurrency):
+    steps = Steps()
+    planner = CustomBasicPlanner(service_id="planner", max_concurrency=max_concurrency)
+
+    run_parallel(planner, plan_of(echo("a"), echo("b"), echo("c"), echo("d")), kernel_with(steps))
+
+    assert steps.peak == max_concurrency
+    assert len(steps.events) == 8
+
+
+def test_failing_step_cancels_its_siblings_and_raises():
+    steps = Steps(delay_s=0.2)
+    plan = plan_of(echo("slow"), {"function": "steps.missing", "args": {}}, echo("after $step1"))
+
+    with pytest.raises(KernelFunctionNotFoundError):
+        run_parallel(CustomBasicPlanner(service_id="planner"), plan, kernel_with(steps))
+
+    # The slow sibling was cancelled mid call and its dependent never started
+    assert steps.events == [("start", "slow")]
+
+
+def test_outputs_of_several_sinks_are_joined_in_plan_order():
+    steps = Steps()
+
+    result = run_parallel(CustomBasicPlanner(service_id="planner"), plan_of(echo("a"), echo("b"), echo("c $step1")), kernel_with(steps))
+
+    assert str(result) == "B\n\nC A"
+
+
+def test_stream_yields_the_events_of_each_subtask_in_order():
+    events: List[PlanEvent] = []
+
+    collect_events(CustomBasicPlanner(service_id="planner"), plan_of(echo("a"), echo("b $step1")), kernel_with(Steps()), events)
+
+    assert [(event.type, event.subtask_index) for event in events] == [
+        (PlanEventType.PLAN_PARSED, None),
+        (PlanEventType.SUBTASK_STARTED, 0),
+        (PlanEventType.SUBTASK_OUTPUT, 0),
+        (PlanEventType.SUBTASK_STARTED, 1),
+        (PlanEventType.SUBTASK_OUTPUT, 1),
+        (PlanEventType.FINAL_ANSWER, None),
+    ]
+    assert events[0].data["subtasks"][1]["function"] == "steps.echo"
+    assert [events[2].data, events[4].data] == ["A", "B A"]
+    assert str(events[-1].data) == "B A"
+
+
+def test_stream_ends_with_the_error_of_a_failing_subtask():
+    events: List[PlanEvent] = []
+    plan = plan_of(echo("a"), {"function": "steps.missing", "args": {}})
+
+    with pytest.raises(KernelFunctionNotFoundError):
+        collect_events(CustomBasicPlanner(service_id="planner"), plan, kernel_with(Steps()), events)
+
+    # The events before the failure were delivered, no final answer
+    assert [event.type for event in events] == [PlanEventType.PLAN_PARSED, PlanEventType.SUBTASK_STARTED, PlanEventType.SUBTASK_OUTPUT]
@@ -0,0 +1,152 @@
+# Standard imports
+import time
+import asyncio
+
+# Third party
+import pytest
+
+# Internal imports
+from utils.llm_scheduler import BACKGROUND, FINAL_ANSWER, INTERACTIVE, LLMScheduler, rate_limit_of, transient_error_of
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int, headers=None):
+        super().__init__(f"status {status_code}")
+        self.response = FakeResponse(status_code, headers)
+
+
+def test_rate_limit_and_retry_after_are_read_through_wrapped_errors():
+    try:
+        try:
+            raise StatusError(429, {"retry-after": "2"})
+        except StatusError as error:
+            raise RuntimeError("service error") from error
+    except RuntimeError as wrapped:
+        assert rate_limit_of(wrapped) == (429, 2.0)
+
+    assert rate_limit_of(StatusError(429, {"retry-after-ms": "250"})) == (429, 0.25)
+    assert rate_limit_of(StatusError(503, {"retry-after": "1"})) == (503, 1.0)
+    # A 503 without Retry-After is an outage, not a rate limit
+    assert rate_limit_of(StatusError(503)) is None
+    assert transient_error_of(StatusError(503)) == "503"
+    assert transient_error_of(StatusError(400)) is None
+
+
+def test_higher_priority_is_dispatched_first():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        running = await scheduler.acquire(1, priority=INTERACTIVE)
+
+        async def call(priority, name):
+            grant = await scheduler.acquire(1, priority=priority)
+            order.append(name)
+            grant.release()
+
+        waiters = [asyncio.ensure_future(call(BACKGROUND, "background")),
+                   asyncio.ensure_future(call(INTERACTIVE, "interactive")),
+                   asyncio.ensure_future(call(FINAL_ANSWER, "final_answer"))]
+        await asyncio.sleep(0)
+        assert scheduler.queued() == 3
+        running.release()
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(scenario()) == ["final_answer", "interactive", "background"]
+
+
+def test_domains_take_turns_inside_a_priority():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        running = await scheduler.acquire(1)
+
+        async def call(domain, name):
+            grant = await scheduler.acquire(1, priority=INTERACTIVE, domain=domain)
+            order.append(name)
+            grant.release()
+
+        waiters = [asyncio.ensure_future(call(domain, name)) for domain, name in (("1", "a1"), ("1", "a2"), ("2", "b1"))]
+        await asyncio.sleep(0)
+        running.release()
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(scenario()) == ["a1", "b1", "a2"]
+
+
+def test_rate_limited_call_waits_retry_after_and_is_retried():
+    async def scenario():
+        scheduler = LLMScheduler()
+        attempts = []
+
+        async def call():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise StatusError(429, {"retry-after-ms": "50"})
+            return "ok"
+
+        return await scheduler.run(call, tokens=10), attempts, scheduler
+
+    result, attempts, scheduler = asyncio.run(scenario())
+
+    assert result == "ok"
+    assert attempts[1] - attempts[0] >= 0.045
+    assert scheduler.rate_limited == 1
+
+
+def test_rate_limit_pauses_every_dispatch():
+    async def scenario():
+        scheduler = LLMScheduler()
+        scheduler.backoff_s(StatusError(429, {"retry-after-ms": "50"}), 0)
+        started = time.monotonic()
+        grant = await scheduler.acquire(1)
+        grant.release()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.045
+
+
+def test_errors_that_are_not_retryable_are_raised_at_once():
+    async def scenario():
+        scheduler = LLMScheduler()
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            raise StatusError(400)
+
+        with pytest.raises(StatusError):
+            await scheduler.run(call, tokens=10)
+        return len(attempts)
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_transient_errors_are_retried_a_bounded_number_of_times():
+    async def scenario():
+        scheduler = LLMScheduler(max_transient_retries=2, base_transient_backoff_s=0.001)
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            raise ConnectionError("reset")
+
+        with pytest.raises(ConnectionError):
+            await scheduler.run(call, tokens=10)
+        return len(attempts), scheduler.transient_retried, scheduler.rate_limited
+
+    assert asyncio.run(scenario()) == (3, 2, 0)
+
+
+@pytest.mark.parametrize("budgets", [{"requests_per_minute": 0}, {"tokens_per_minute": 0}, {"tokens_per_minute": -1},
+                                     {"max_concurrency": 0}])
+def test_budgets_must_be_positive(budgets):
+    with pytest.raises(ValueError):
+        LLMScheduler(**budgets)
@@ -0,0 +1,79 @@
+# Third party
+import semantic_kernel as sk
+from semantic_kernel.functions import kernel_function
+from semantic_kernel.planners.basic_planner import Plan
+
+# Internal imports
+from utils.plan_cache import PlanCache, catalog_fingerprint
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def plan(goal: str) -> Plan:
+    return Plan(prompt="", goal=goal, plan=goal)
+
+
+class Echo:
+    @kernel_function(description="Echo the text", name="echo")
+    def echo(self, text: str) -> str:
+        return text
+
+
+def test_lookup_normalizes_the_question():
+    cache = PlanCache()
+    cache.put("Which  incidences?", "f", plan("a"))
+
+    assert cache.get("which incidences?", "f").goal == "a"
+    assert cache.get("which incidences?", "other catalog") is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = PlanCache(max_entries=2)
+    cache.put("a", "f", plan("a"))
+    cache.put("b", "f", plan("b"))
+    cache.get("a", "f")
+    cache.put("c", "f", plan("c"))
+
+    assert cache.get("b", "f") is None
+    assert cache.get("a", "f") is not None and cache.get("c", "f") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = PlanCache(ttl_seconds=10, clock=clock)
+    cache.put("a", "f", plan("a"))
+
+    clock.now = 9.9
+    assert cache.get("a", "f") is not None
+    clock.now = 10.0
+    assert cache.get("a", "f") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_invalidate_one_catalog():
+    cache = PlanCache()
+    cache.put("a", "old", plan("a"))
+    cache.put("a", "new", plan("a"))
+
+    assert cache.invalidate("old") == 1
+    assert cache.get("a", "old") is None and cache.get("a", "new") is not None
+
+
+def test_hidden_functions_are_not_part_of_the_catalog():
+    kernel = sk.Kernel()
+    kernel.import_plugin_from_object(Echo(), "tools")
+    fingerprint = catalog_fingerprint(kernel, "prompt")
+
+    kernel.import_plugin_from_object(Echo(), "output_summarizer")
+    assert catalog_fingerprint(kernel, "prompt") == fingerprint
+
+    kernel.import_plugin_from_object(Echo(), "more_tools")
+    assert catalog_fingerprint(kernel, "prompt") != fingerprint
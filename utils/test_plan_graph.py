@@ -0,0 +1,44 @@
+# Third party
+import semantic_kernel as sk
+
+# Internal imports
+from utils.plan_graph import build_plan_graph, dependency_context, resolve_references, sink_indexes, uses_references
+
+SUBTASKS = [
+    {"function": "cities_db.get_cities", "args": {"filter": {"population": "max(population)"}}},
+    {"function": "rag.ask_rag", "args": {"question": "weather"}},
+    {"function": "sevicedesk.get_incidences", "args": {"question": "incidences in $step1"}},
+    {"function": "rag.ask_rag", "args": {"question": "compare $step_2 with $output"}},
+]
+
+
+def test_dependencies_from_step_and_output_references():
+    nodes = build_plan_graph(SUBTASKS, sk.Kernel())
+
+    assert [node.dependencies for node in nodes] == [(), (), (0,), (1, 2)]
+    assert sink_indexes(nodes) == [3]
+    assert uses_references(SUBTASKS)
+
+
+def test_self_and_forward_references_are_ignored():
+    subtasks = [{"function": "a.b", "args": {"question": "$step1 and $step2"}}, {"function": "a.c", "args": {}}]
+
+    nodes = build_plan_graph(subtasks, sk.Kernel())
+
+    assert [node.dependencies for node in nodes] == [(), ()]
+    assert sink_indexes(nodes) == [0, 1]
+
+
+def test_resolve_references_in_nested_args():
+    outputs = {0: "Istanbul", 1: "sunny", 2: "3 incidences"}
+
+    resolved = resolve_references({"question": "compare $step2 with $output", "nested": ["$step1", {"x": "$step9"}]}, outputs, 3)
+
+    assert resolved == {"question": "compare sunny with 3 incidences", "nested": ["Istanbul", {"x": "$step9"}]}
+
+
+def test_dependency_context_joins_outputs_in_plan_order():
+    nodes = build_plan_graph(SUBTASKS, sk.Kernel())
+
+    assert dependency_context(nodes[3], {0: "a", 1: "b", 2: "c"}) == "b\nc"
+    assert dependency_context(nodes[0], {}) is None
@@ -0,0 +1,59 @@
+# Standard imports
+import json
+
+# Third party
+import pytest
+
+# Internal imports
+from utils.plan_parser import PlanParseError, _balanced_objects, parse_plan, validate_plan
+
+PLAN = {"input": "Which incidences?", "subtasks": [{"function": "sevicedesk.get_incidences", "args": {"question": "list {all}"}}]}
+
+
+def test_balanced_objects_ignore_braces_in_strings():
+    text = 'prose "quoted" {"a": "}", "b": {"c": 1}} tail }'
+
+    spans = _balanced_objects(text)
+
+    assert sorted(text[start:end] for start, end in spans) == ['{"a": "}", "b": {"c": 1}}', '{"c": 1}']
+
+
+def test_plan_wrapped_in_prose_and_code_fence():
+    completion = f"Here is the plan:\n```json\n{json.dumps(PLAN)}\n```\nLet me know {{if}} it helps."
+
+    assert parse_plan(completion) == PLAN
+
+
+def test_outermost_valid_object_wins_over_earlier_invalid_one():
+    completion = '{"subtasks": "not a list"} then ' + json.dumps(PLAN)
+
+    assert parse_plan(completion) == PLAN
+
+
+def test_escaped_completion():
+    completion = json.dumps(json.dumps(PLAN))[1:-1]
+
+    assert parse_plan(completion) == PLAN
+
+
+def test_no_plan():
+    with pytest.raises(PlanParseError, match="No JSON object"):
+        parse_plan("I cannot answer that.")
+
+
+@pytest.mark.parametrize("plan, message", [
+    ([], "must be an object"),
+    ({"subtasks": [{"function": "a.b"}]}, "'input' must be a string"),
+    ({"input": "q", "subtasks": []}, "non empty list"),
+    ({"input": "q", "subtasks": ["a.b"]}, r"subtasks\[0\] must be an object"),
+    ({"input": "q", "subtasks": [{"function": "nodot"}]}, r"subtasks\[0\].function must be 'plugin.function'"),
+    ({"input": "q", "subtasks": [{"function": "a.b", "args": ["x"]}]}, r"subtasks\[0\].args must be an object"),
+])
+def test_schema_errors(plan, message):
+    with pytest.raises(PlanParseError, match=message):
+        validate_plan(plan)
+
+
+def test_schema_error_of_the_only_candidate_is_raised():
+    with pytest.raises(PlanParseError, match="non empty list"):
+        parse_plan('{"input": "q", "subtasks": []}')
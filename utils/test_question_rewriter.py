@@ -0,0 +1,75 @@
+# Standard imports
+import asyncio
+from typing import Any, List, Tuple
+
+# Internal imports
+from utils.question_rewriter import QuestionRewriter, Rewrite, RewriteStrategy
+
+
+class FakeLLM:
+    """
+    Stands in for the question_updater function, recording its calls.
+    """
+    def __init__(self):
+        self.calls: List[Tuple[str, str]] = []
+
+    async def __call__(self, question: str, previous_output: str, kernel: Any) -> str:
+        self.calls.append((question, previous_output))
+        return f"{question} knowing {previous_output}"
+
+
+def rewrite(rewriter: QuestionRewriter, question: str, previous_output: Any, **kwargs: Any) -> Rewrite:
+    return asyncio.run(rewriter.rewrite(question, previous_output, None, **kwargs))
+
+
+def test_skipped_when_the_subtask_does_not_depend_on_a_useful_output():
+    llm = FakeLLM()
+    rewriter = QuestionRewriter(llm_rewrite=llm)
+
+    assert rewrite(rewriter, "weather in $step1", "Barcelona", depends=False) == Rewrite("weather in $step1", RewriteStrategy.SKIPPED)
+    assert rewrite(rewriter, "weather", " [] ").strategy is RewriteStrategy.SKIPPED
+    assert rewrite(rewriter, "weather", None).strategy is RewriteStrategy.SKIPPED
+    assert llm.calls == []
+
+
+def test_template_comes_before_entity():
+    rewriter = QuestionRewriter(llm_rewrite=FakeLLM())
+
+    # A short name would also do for entity substitution, the placeholders win
+    assert rewrite(rewriter, "weather in $step1 and $output", "sunny", outputs={0: "Barcelona ", 1: "sunny"}, index=2) == \
+        Rewrite("weather in Barcelona and sunny", RewriteStrategy.TEMPLATE)
+    assert rewrite(rewriter, "weather in {previous_output}", "Barcelona") == Rewrite("weather in Barcelona", RewriteStrategy.TEMPLATE)
+
+
+def test_entity_appends_short_names_only():
+    llm = FakeLLM()
+    rewriter = QuestionRewriter(llm_rewrite=llm)
+
+    assert rewrite(rewriter, "weather in the largest city?", "Barcelona") == \
+        Rewrite("weather in the largest city (Barcelona)?", RewriteStrategy.ENTITY)
+    assert rewrite(rewriter, "weather in those cities", "['Barcelona', 'Madrid']").question == "weather in those cities (Barcelona, Madrid)"
+    assert rewrite(rewriter, "is it open", "True").strategy is RewriteStrategy.LLM
+    assert llm.calls == [("is it open", "True")]
+
+
+def test_unresolved_references_go_to_the_llm():
+    llm = FakeLLM()
+    rewriter = QuestionRewriter(llm_rewrite=llm)
+
+    assert rewrite(rewriter, "incidences in $step3", "Barcelona", outputs={0: "Barcelona"}, index=1).strategy is RewriteStrategy.LLM
+    assert rewrite(rewriter, "incidences in $step1", "Barcelona").strategy is RewriteStrategy.LLM
+    assert len(llm.calls) == 2
+
+
+def test_memoized_rewrites_skip_the_llm():
+    llm = FakeLLM()
+    rewriter = QuestionRewriter(llm_rewrite=llm)
+    output = "There are 3 open incidences about the wifi in the office"
+
+    first = rewrite(rewriter, "who reported them", output)
+    second = rewrite(rewriter, "Who reported them", output)
+
+    assert (first.strategy, second.strategy) == (RewriteStrategy.LLM, RewriteStrategy.MEMOIZED)
+    assert second.question == first.question
+    assert len(llm.calls) == 1
+    assert rewriter.stats()["llm"] == 1 and rewriter.stats()["memoized"] == 1
@@ -0,0 +1,51 @@
+# Third party
+import pytest
+from semantic_kernel.planners.basic_planner import Plan
+
+# Internal imports
+from utils.semantic_plan_index import SemanticPlanIndex
+
+
+def index_with(question: str) -> SemanticPlanIndex:
+    index = SemanticPlanIndex()
+    index.add(question, "f", Plan(prompt="", goal=question, plan=question))
+    return index
+
+
+@pytest.mark.parametrize("planned, asked", [
+    ("lista las incidencias wifi", "muéstrame las incidencias de wifi"),
+    ("Show me all the incidences", "list the incidences"),
+    ("Which is the most populated city in Europe?", "which is the most populated city in europe"),
+])
+def test_paraphrases_reuse_the_plan(planned, asked):
+    match = index_with(planned).lookup(asked, "f")
+
+    assert match is not None and match.question == planned
+    assert match.score >= 0.9
+
+
+@pytest.mark.parametrize("planned, asked", [
+    ("lista las incidencias wifi", "lista las incidencias vpn"),
+    ("city with the most population", "city with the least population"),
+    ("invoices of user john", "invoices of user johnny"),
+    ("invoices of user 12", "invoices of user 13"),
+])
+def test_questions_asking_for_something_else_do_not(planned, asked):
+    index = index_with(planned)
+
+    assert index.lookup(asked, "f") is None
+    assert index.stats()["misses"] == 1
+
+
+def test_other_catalog_does_not_match():
+    assert index_with("list the incidences").lookup("list the incidences", "other") is None
+
+
+def test_oldest_questions_are_dropped_past_max_entries():
+    index = SemanticPlanIndex(max_entries=2)
+    for question in ("wifi incidences", "vpn incidences", "printer incidences"):
+        index.add(question, "f", Plan(prompt="", goal=question, plan=question))
+
+    assert len(index) == 2
+    assert index.lookup("wifi incidences", "f") is None
+    assert index.lookup("printer incidences", "f") is not None
@@ -0,0 +1,144 @@
+# Standard imports
+import time
+import asyncio
+import threading
+from typing import Any, AsyncIterable, List
+
+# Third party
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_role import ChatRole
+from semantic_kernel.contents.streaming_chat_message_content import StreamingChatMessageContent
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+
+# Internal imports
+from utils.chat_services import CoalescingChatCompletion
+from utils.singleflight import SingleFlight, _collapsed
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", call) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+
+def test_error_reaches_every_waiter_and_is_not_kept():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+        retried = await asyncio.gather(flight.do("key", failing), return_exceptions=True)
+        return results + retried
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(calls) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    flight = SingleFlight("test")
+
+    async def call():
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do("key", call))
+        second = asyncio.ensure_future(flight.do("key", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ("result", True)
+
+
+def test_sync_error_propagates_to_waiting_threads():
+    flight = SingleFlight("test_sync_error")
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call(make):
+        try:
+            flight.do_sync("key", make)
+        except ValueError as error:
+            errors.append(error)
+
+    leader = threading.Thread(target=call, args=(failing,))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call, args=(lambda: "not called",))
+    follower.start()
+    # The follower counts as collapsed right before waiting for the leader
+    while _collapsed.values().get("test_sync_error", 0) < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.in_flight() == 0
+
+
+class CountingChat(ChatCompletionClientBase):
+    """
+    Chat service answering with the arguments it got, counting its calls.
+    """
+    calls: int = 0
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [ChatMessageContent(role=ChatRole.ASSISTANT, content=f"answer with {dict(kwargs.get('arguments') or {})}")]
+
+    async def complete_chat_stream(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                                   **kwargs: Any) -> AsyncIterable[List[StreamingChatMessageContent]]:
+        yield []
+
+
+def test_completions_coalesce_only_with_the_same_arguments():
+    inner = CountingChat(ai_model_id="model", service_id="chat")
+    service = CoalescingChatCompletion(inner)
+    chat_history = ChatHistory()
+    chat_history.add_user_message("Which city is the largest?")
+
+    async def complete(**kwargs: Any) -> str:
+        completions = await service.complete_chat(chat_history, PromptExecutionSettings(), **kwargs)
+        return completions[0].content
+
+    async def scenario():
+        return await asyncio.gather(complete(arguments=KernelArguments(city="Barcelona")),
+                                    complete(arguments=KernelArguments(city="Barcelona")),
+                                    complete(arguments=KernelArguments(city="Madrid")))
+
+    first, second, other = asyncio.run(scenario())
+
+    assert first == second == "answer with {'city': 'Barcelona'}"
+    assert other == "answer with {'city': 'Madrid'}"
+    assert inner.calls == 2
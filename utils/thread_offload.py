@@ -0,0 +1,70 @@
+# Standard imports
+import os
+import asyncio
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from inspect import isasyncgenfunction, iscoroutinefunction, isgeneratorfunction
+from typing import Annotated, Any, Callable, Optional
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = int(os.getenv("SYNC_PLUGIN_MAX_WORKERS", "16"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Annotated[ThreadPoolExecutor, "Bounded pool used to run sync plugin functions"]:
+    """
+    Return the shared bounded thread pool, creating it on first use.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix="sync-plugin")
+    return _executor
+
+
+def set_executor(executor: Annotated[Optional[ThreadPoolExecutor], "Executor to use, None to recreate the default one lazily"]) -> None:
+    """
+    Replace the shared thread pool (for example to change its size).
+    """
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+
+async def run_in_thread(func: Annotated[Callable, "Blocking callable"], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a blocking callable in the shared pool without blocking the event loop.
+    Context variables are propagated to the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+def needs_offload(method: Annotated[Callable, "Kernel function candidate"]) -> bool:
+    """
+    True for plain sync methods; coroutines and generators are left as they are.
+    """
+    return not (iscoroutinefunction(method) or isasyncgenfunction(method) or isgeneratorfunction(method))
+
+
+def offload_sync_method(method: Annotated[Callable, "Sync kernel function (bound method)"]) -> Annotated[Callable, "Async kernel function"]:
+    """
+    Wrap a sync kernel function into a coroutine function that runs it in the shared pool.
+    The kernel function metadata set by the @kernel_function decorator is kept.
+    """
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return await run_in_thread(method, *args, **kwargs)
+
+    logger.debug("Offloading sync kernel function %s to thread pool", getattr(method, "__kernel_function_name__", method.__name__))
+    return wrapper
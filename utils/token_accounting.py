@@ -0,0 +1,244 @@
+"""
+Token and cost accounting of the chat completions.
+
+Every completion is counted once: prompt tokens from the rendered prompt and completion tokens
+from the answer, or the usage reported by the service when there is one. Completions shared
+with an identical call in flight (see utils.singleflight) are not counted again.
+
+Calls are labelled with their purpose (planner, question_updater, output_summarizer, subtask,
+answer) and the plugin function of the subtask they were made for (llm_purpose), and rolled up:
+
+- per request, in the tally of the enclosing token_accounting block, which the planner returns
+  with the execute_plan result (PlanResult.llm_usage)
+- per domain, purpose and plugin, in the metrics registry (orchestrator_llm_prompt_tokens_total,
+  orchestrator_llm_completion_tokens_total, orchestrator_llm_cost_usd_total...)
+
+Costs use MODEL_PRICES (USD per 1K tokens), LLM_PRICES='{"model": [prompt, completion]}' overrides them.
+"""
+# Standard imports
+import os
+import json
+import contextvars
+from contextlib import contextmanager
+from typing import Annotated, Any, AsyncIterable, Dict, Iterator, List, Optional, Tuple
+
+# Third party
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.streaming_chat_message_content import StreamingChatMessageContent
+
+# Internal imports
+from request_utils.metrics import get_registry
+from utils.chat_services import DelegatingChatCompletion
+from utils.context_budget import TokenCounter
+from utils.llm_scheduler import current_call_context
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+# USD per 1K (prompt, completion) tokens, models are matched by longest prefix
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-35-turbo": (0.0005, 0.0015),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+# Tokens the chat format adds to every message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+OTHER = "other"
+
+_counter = TokenCounter()
+
+_call_labels: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar("llm_call_labels", default=(OTHER, ""))
+
+_prompt_tokens = get_registry().counter("llm_prompt_tokens", "Prompt tokens of the chat completions.", "domain")
+_completion_tokens = get_registry().counter("llm_completion_tokens", "Completion tokens of the chat completions.", "domain")
+_cost = get_registry().counter("llm_cost_usd", "Estimated cost of the chat completions in USD.", "domain")
+_purpose_tokens = get_registry().counter("llm_purpose_tokens", "Prompt and completion tokens of the chat completions.", "purpose")
+_plugin_tokens = get_registry().counter("llm_plugin_tokens", "Prompt and completion tokens of the chat completions made for a plugin function.", "plugin")
+
+
+@contextmanager
+def llm_purpose(purpose: Annotated[Optional[str], "planner, question_updater, output_summarizer, subtask or answer, unchanged if None"] = None,
+                plugin: Annotated[Optional[str], "plugin.function of the subtask the calls are made for, unchanged if None"] = None) -> Iterator[None]:
+    """
+    Labels of the chat completions made inside the block.
+    """
+    current_purpose, current_plugin = _call_labels.get()
+    token = _call_labels.set((current_purpose if purpose is None else purpose, current_plugin if plugin is None else plugin))
+    try:
+        yield
+    finally:
+        _call_labels.reset(token)
+
+
+def model_prices(model: Annotated[str, "model id"]) -> Optional[Tuple[float, float]]:
+    matches = [name for name in MODEL_PRICES if model == name or model.startswith(name + "-")]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = model_prices(model)
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1000
+
+
+def _tally() -> Dict[str, float]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+
+def _add(tally: Dict[str, float], calls: int, prompt_tokens: int, completion_tokens: int, cost: float) -> None:
+    tally["calls"] += calls
+    tally["prompt_tokens"] += prompt_tokens
+    tally["completion_tokens"] += completion_tokens
+    tally["cost_usd"] += cost
+
+
+class LLMUsage:
+    """
+    Chat completions made while answering one request (or one part of it, see token_accounting).
+    """
+
+    def __init__(self, parent: Annotated[Optional["LLMUsage"], "Tally the calls are also added to"] = None):
+        self.parent = parent
+        self.total = _tally()
+        self.estimated_calls = 0
+        self.coalesced_calls = 0
+        self.by_purpose: Dict[str, Dict[str, float]] = {}
+        self.by_plugin: Dict[str, Dict[str, float]] = {}
+
+    def add(self, purpose: str, plugin: str, prompt_tokens: int, completion_tokens: int, cost: float, estimated: bool,
+            calls: int = 1) -> None:
+        _add(self.total, calls, prompt_tokens, completion_tokens, cost)
+        _add(self.by_purpose.setdefault(purpose, _tally()), calls, prompt_tokens, completion_tokens, cost)
+        if plugin:
+            _add(self.by_plugin.setdefault(plugin, _tally()), calls, prompt_tokens, completion_tokens, cost)
+        if estimated:
+            self.estimated_calls += calls
+        if self.parent is not None:
+            self.parent.add(purpose, plugin, prompt_tokens, completion_tokens, cost, estimated, calls)
+
+    def add_coalesced(self) -> None:
+        self.coalesced_calls += 1
+        if self.parent is not None:
+            self.parent.add_coalesced()
+
+    def merge(self, other: Annotated["LLMUsage", "tally of calls made outside this one's block"]) -> None:
+        for purpose, tally in other.by_purpose.items():
+            self.add(purpose, "", int(tally["prompt_tokens"]), int(tally["completion_tokens"]), tally["cost_usd"], False, int(tally["calls"]))
+        self.estimated_calls += other.estimated_calls
+        self.coalesced_calls += other.coalesced_calls
+        # Plugins are attributed separately, the purpose tallies above already hold the calls
+        for plugin, tally in other.by_plugin.items():
+            _add(self.by_plugin.setdefault(plugin, _tally()), int(tally["calls"]), int(tally["prompt_tokens"]),
+                 int(tally["completion_tokens"]), tally["cost_usd"])
+
+    def summary(self) -> Dict[str, Any]:
+        def rounded(tally: Dict[str, float]) -> Dict[str, float]:
+            return dict(tally, cost_usd=round(tally["cost_usd"], 6))
+
+        return dict(rounded(self.total), estimated_calls=self.estimated_calls, coalesced_calls=self.coalesced_calls,
+                    by_purpose={purpose: rounded(tally) for purpose, tally in self.by_purpose.items()},
+                    by_plugin={plugin: rounded(tally) for plugin, tally in self.by_plugin.items()})
+
+
+_usage: contextvars.ContextVar[Optional[LLMUsage]] = contextvars.ContextVar("llm_usage", default=None)
+
+
+def current_usage() -> Optional[LLMUsage]:
+    return _usage.get()
+
+
+@contextmanager
+def token_accounting(nested: Annotated[bool, "Own tally even inside another block, its calls are also added to the outer one"] = False
+                     ) -> Iterator[LLMUsage]:
+    """
+    Tally of the chat completions made inside the block, the enclosing request's tally when there
+    is one (unless nested).
+    """
+    outer = _usage.get()
+    if outer is not None and not nested:
+        yield outer
+        return
+    usage = LLMUsage(parent=outer)
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def record_call(model: Annotated[str, "model id, for the cost"], prompt_tokens: int, completion_tokens: int,
+                estimated: Annotated[bool, "Tokens counted locally, the service reported no usage"]) -> None:
+    """
+    Count one chat completion in the current tally and the metrics.
+    """
+    purpose, plugin = _call_labels.get()
+    _, domain = current_call_context()
+    cost = call_cost(model, prompt_tokens, completion_tokens)
+    domain_label = str(domain) if domain not in (None, "") else "none"
+    _prompt_tokens.inc(domain_label, prompt_tokens)
+    _completion_tokens.inc(domain_label, completion_tokens)
+    _cost.inc(domain_label, cost)
+    _purpose_tokens.inc(purpose, prompt_tokens + completion_tokens)
+    if plugin:
+        _plugin_tokens.inc(plugin, prompt_tokens + completion_tokens)
+    usage = _usage.get()
+    if usage is not None:
+        usage.add(purpose, plugin, prompt_tokens, completion_tokens, cost, estimated)
+
+
+def usage_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Tokens and cost per domain, tokens per purpose and plugin, since the process started.
+    """
+    return {"prompt_tokens": _prompt_tokens.values(), "completion_tokens": _completion_tokens.values(),
+            "cost_usd": {domain: round(cost, 6) for domain, cost in _cost.values().items()},
+            "by_purpose": _purpose_tokens.values(), "by_plugin": _plugin_tokens.values()}
+
+
+class AccountingChatCompletion(DelegatingChatCompletion):
+    """
+    Chat completion service counting the tokens and cost of every completion (see record_call).
+    """
+    @staticmethod
+    def prompt_tokens(chat_history: ChatHistory) -> int:
+        return sum(_counter.count(message.content or "") + MESSAGE_OVERHEAD_TOKENS for message in chat_history.messages)
+
+    async def complete_chat(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                            **kwargs: Any) -> List[ChatMessageContent]:
+        completions = await self.inner.complete_chat(chat_history, settings, **kwargs)
+        metadata = (completions[0].metadata if completions else None) or {}
+        if metadata.get("coalesced"):
+            # Shared with an identical completion in flight, its tokens were spent once
+            usage = _usage.get()
+            if usage is not None:
+                usage.add_coalesced()
+            return completions
+        reported = metadata.get("usage")
+        if reported is not None:
+            record_call(self.ai_model_id, getattr(reported, "prompt_tokens", 0) or 0,
+                        getattr(reported, "completion_tokens", 0) or 0, estimated=False)
+        else:
+            record_call(self.ai_model_id, self.prompt_tokens(chat_history),
+                        sum(_counter.count(completion.content or "") for completion in completions), estimated=True)
+        return completions
+
+    async def complete_chat_stream(self, chat_history: ChatHistory, settings: PromptExecutionSettings,
+                                   **kwargs: Any) -> AsyncIterable[List[StreamingChatMessageContent]]:
+        # Streams report no usage, the answer is counted once it is complete (or abandoned)
+        completion: List[str] = []
+        try:
+            async for partial in self.inner.complete_chat_stream(chat_history, settings, **kwargs):
+                completion.extend(message.content or "" for message in partial)
+                yield partial
+        finally:
+            record_call(self.ai_model_id, self.prompt_tokens(chat_history), _counter.count("".join(completion)), estimated=True)
@@ -0,0 +1,366 @@
+"""
+Per-request trace spans exported as OTLP JSON.
+
+A trace starts with the first span opened outside any other (normally `trace_question`), and
+whether it is recorded is decided there, once, from the sample rate (head-based sampling).
+Spans of unsampled traces are a shared no-op object, so instrumented code costs a context
+variable lookup. Spans of sampled traces are exported in a background thread when the root
+span ends; spans still open at that point (detached tasks) are dropped.
+
+Configured from the environment, or with configure_tracing:
+    TRACE_EXPORT       file path (.jsonl, one OTLP ExportTraceServiceRequest per line) or
+                       http(s) URL of an OTLP/HTTP collector (e.g. http://localhost:4318/v1/traces)
+    TRACE_SAMPLE_RATE  fraction of traces recorded, 0.01 by default
+"""
+# Standard imports
+import os
+import json
+import queue
+import atexit
+import random
+import threading
+from time import time_ns
+from contextvars import ContextVar
+from typing import Annotated, Any, Dict, List, Optional, Union
+
+# Third party
+import requests
+
+# Internal imports
+from utils import custom_logs
+from utils.input_model import Question
+
+logger = custom_logs.getLogger(__name__)
+
+AttributeValue = Union[str, bool, int, float]
+
+DEFAULT_SAMPLE_RATE = 0.01
+SERVICE_NAME = "orchestrator"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    """
+    Stand-in for spans of unsampled traces (and for the absence of a tracer).
+    """
+    recording = False
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, AttributeValue]) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledRoot(_NoopSpan):
+    """
+    Root of an unsampled trace: marks the context so nested spans do not start new traces.
+    """
+
+    def __enter__(self) -> "_UnsampledRoot":
+        self._token = _current_span.set(NOOP_SPAN)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_span.reset(self._token)
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self) -> None:
+        self.trace_id = random.getrandbits(128).to_bytes(16, "big").hex()
+        # Appended from tasks and offload threads, list.append is atomic
+        self.spans: List["Span"] = []
+
+
+class Span:
+    """
+    A timed operation of a sampled trace. Used as a context manager, it is the current span
+    (the parent of spans opened inside it) until it exits.
+    """
+    recording = True
+    __slots__ = ("tracer", "trace", "name", "span_id", "parent_span_id", "attributes", "start_ns", "end_ns",
+                 "error", "_token")
+
+    def __init__(self, tracer: "Tracer", trace: _Trace, name: str, parent_span_id: Optional[str],
+                 attributes: Optional[Dict[str, AttributeValue]]) -> None:
+        self.tracer = tracer
+        self.trace = trace
+        self.name = name
+        self.span_id = random.getrandbits(64).to_bytes(8, "big").hex()
+        self.parent_span_id = parent_span_id
+        self.attributes: Dict[str, AttributeValue] = dict(attributes) if attributes else {}
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def __enter__(self) -> "Span":
+        self.start()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_span.reset(self._token)
+        self.end(exc)
+
+    def start(self) -> None:
+        """
+        Start timing without making the span current, for operations that yield to their caller.
+        """
+        self.start_ns = time_ns()
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.end_ns = time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.spans.append(self)
+        if self.parent_span_id is None:
+            self.tracer._export(self.trace)
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, AttributeValue]) -> None:
+        self.attributes.update(attributes)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_value(value: AttributeValue) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_request(spans: List[Span], service_name: str = SERVICE_NAME) -> Dict[str, Any]:
+    """
+    OTLP/JSON ExportTraceServiceRequest holding the given spans.
+    """
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+    }]}
+
+
+class OTLPJsonFileExporter:
+    """
+    Appends one OTLP/JSON request per trace to a JSONL file (the format of the OpenTelemetry
+    collector file exporter, readable by its otlpjsonfile receiver).
+    """
+
+    def __init__(self, path: Annotated[str, "JSONL file the traces are appended to"], service_name: str = SERVICE_NAME):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(otlp_request(spans, self.service_name), ensure_ascii=False) + "\n")
+
+
+class OTLPHttpExporter:
+    """
+    Posts OTLP/JSON requests to a collector (OTLP/HTTP, usually http://host:4318/v1/traces).
+    """
+
+    def __init__(self, endpoint: Annotated[str, "Collector traces URL"], service_name: str = SERVICE_NAME,
+                 timeout: Annotated[float, "Seconds per export request"] = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def export(self, spans: List[Span]) -> None:
+        response = self._session.post(self.endpoint, json=otlp_request(spans, self.service_name), timeout=self.timeout)
+        response.raise_for_status()
+
+
+def exporter_from_target(target: Annotated[str, "File path or http(s) collector URL"]) -> Any:
+    if target.startswith(("http://", "https://")):
+        return OTLPHttpExporter(target)
+    return OTLPJsonFileExporter(target)
+
+
+class Tracer:
+    """
+    Starts spans and hands finished sampled traces to the exporter from a background thread,
+    so exporting never blocks a request.
+    """
+
+    def __init__(self, exporter: Annotated[Optional[Any], "Object with export(spans), None disables tracing"] = None,
+                 sample_rate: Annotated[float, "Fraction of traces recorded"] = DEFAULT_SAMPLE_RATE,
+                 max_queued_traces: Annotated[int, "Traces waiting for export before new ones are dropped"] = 1024):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}")
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter is not None else 0.0
+        self.dropped_traces = 0
+        self._queue: "queue.Queue[Optional[_Trace]]" = queue.Queue(maxsize=max_queued_traces)
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def start_span(self, name: Annotated[str, "Operation name"],
+                   attributes: Annotated[Optional[Dict[str, AttributeValue]], "Initial attributes"] = None) -> Union[Span, _NoopSpan]:
+        """
+        Span to use as a context manager: child of the current span, or the root of a new trace
+        sampled at sample_rate when there is none.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            if self.sample_rate <= 0.0 or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+                return _UnsampledRoot()
+            return Span(self, _Trace(), name, None, attributes)
+        if not parent.recording:
+            return NOOP_SPAN
+        return Span(self, parent.trace, name, parent.span_id, attributes)
+
+    def _export(self, trace: _Trace) -> None:
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._worker.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped_traces += 1
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            try:
+                if trace is None:
+                    return
+                self.exporter.export(sorted(trace.spans, key=lambda span: span.start_ns))
+            except Exception as exc:
+                logger.warning("Trace export failed: %s", exc)
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """
+        Wait until every finished trace has been exported.
+        """
+        if self._worker is not None:
+            self._queue.join()
+
+    def shutdown(self) -> None:
+        if self._worker is not None:
+            self.flush()
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def configure_tracing(exporter: Annotated[Optional[Any], "Exporter, or a file path / collector URL"] = None,
+                      sample_rate: Annotated[float, "Fraction of traces recorded"] = DEFAULT_SAMPLE_RATE) -> Tracer:
+    """
+    Replace the process wide tracer. Without exporter tracing is disabled.
+    """
+    global _tracer
+    if isinstance(exporter, str):
+        exporter = exporter_from_target(exporter)
+    tracer = Tracer(exporter, sample_rate)
+    with _tracer_lock:
+        previous, _tracer = _tracer, tracer
+    if previous is not None:
+        previous.shutdown()
+    return tracer
+
+
+def get_tracer() -> Tracer:
+    """
+    Process wide tracer, configured from TRACE_EXPORT / TRACE_SAMPLE_RATE on first use.
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                target = os.getenv("TRACE_EXPORT")
+                _tracer = Tracer(exporter_from_target(target) if target else None,
+                                 float(os.getenv("TRACE_SAMPLE_RATE", str(DEFAULT_SAMPLE_RATE))))
+    return _tracer
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    if _tracer is not None:
+        _tracer.flush()
+
+
+def start_span(name: Annotated[str, "Operation name"],
+               attributes: Annotated[Optional[Dict[str, AttributeValue]], "Initial attributes"] = None) -> Union[Span, _NoopSpan]:
+    """
+    Span of the process wide tracer, see Tracer.start_span.
+    """
+    return get_tracer().start_span(name, attributes)
+
+
+def current_span() -> Union[Span, _NoopSpan]:
+    return _current_span.get() or NOOP_SPAN
+
+
+def question_attributes(question: Question) -> Dict[str, AttributeValue]:
+    return {"message_id": question.message_id, "chat_id": question.chat_id, "domain_id": question.domain_id}
+
+
+def trace_question(question: Annotated[Question, "Question answered inside the span"]) -> Union[Span, _NoopSpan]:
+    """
+    Root span of the trace of one question.
+    """
+    attributes = question_attributes(question)
+    attributes["question.chars"] = len(question.question)
+    return start_span("question", attributes)
+
+
+def payload_size(payload: Any) -> int:
+    """
+    Size in bytes of a request or response body, 0 when unknown.
+    """
+    if payload is None:
+        return 0
+    if isinstance(payload, (bytes, bytearray)):
+        return len(payload)
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    try:
+        return len(json.dumps(payload, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
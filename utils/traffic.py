@@ -0,0 +1,274 @@
+"""
+Record and replay of the orchestrator's external traffic: LLM completions and plugin HTTP calls.
+
+In record mode every exchange is appended to a log (JSONL, or SQLite for .db/.sqlite paths)
+under a hash of the request content. In replay mode the recorded responses are served
+locally, after the recorded duration multiplied by `time_scale` (0 answers at once), so a
+captured run can be replayed against a new build without network access.
+
+Configured with configure_traffic or from the environment:
+    TRAFFIC_MODE        off | record | replay
+    TRAFFIC_LOG         log path
+    TRAFFIC_TIME_SCALE  replay timing factor, 1 by default
+"""
+# Standard imports
+import os
+import json
+import base64
+import hashlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Annotated, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Internal imports
+from utils import custom_logs
+
+logger = custom_logs.getLogger(__name__)
+
+LLM = "llm"
+HTTP = "http"
+
+
+class ReplayMissError(LookupError):
+    """
+    Raised in strict replay when a request was not recorded.
+    """
+
+
+@dataclass
+class Exchange:
+    kind: str
+    key: str
+    elapsed_ms: float
+    request: Dict[str, Any] = field(default_factory=dict)
+    response: Dict[str, Any] = field(default_factory=dict)
+
+
+def _digest(*parts: Union[str, bytes]) -> str:
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode("utf-8") if isinstance(part, str) else part)
+        hasher.update(b"\x00")
+    return hasher.hexdigest()[:32]
+
+
+def llm_key(model: Annotated[str, "Model id"], messages: Annotated[Sequence[Tuple[str, str]], "(role, content) pairs"],
+            settings: Annotated[Optional[Dict[str, Any]], "Execution settings that change the completion"] = None) -> str:
+    return _digest(LLM, model, json.dumps(list(messages), ensure_ascii=False),
+                   json.dumps(settings or {}, sort_keys=True, default=str))
+
+
+def http_key(method: str, url: str, body: Optional[Union[bytes, str]]) -> str:
+    """
+    Headers are left out: they carry per-request ids and credentials, not the query.
+    """
+    return _digest(HTTP, method.upper(), url, body or b"")
+
+
+def encode_body(body: Union[bytes, str, None]) -> Dict[str, Any]:
+    if body is None:
+        return {"body": ""}
+    if isinstance(body, str):
+        return {"body": body}
+    try:
+        return {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body": base64.b64encode(body).decode("ascii"), "base64": True}
+
+
+def decode_body(response: Dict[str, Any]) -> bytes:
+    if response.get("base64"):
+        return base64.b64decode(response["body"])
+    return response.get("body", "").encode("utf-8")
+
+
+class TrafficLog(ABC):
+    """
+    Append-only store of exchanges.
+    """
+
+    @abstractmethod
+    def append(self, exchange: Exchange) -> None:
+        """Persist one exchange."""
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[Exchange]:
+        """Exchanges in recording order."""
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlTrafficLog(TrafficLog):
+    """
+    One compact JSON object per line.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def append(self, exchange: Exchange) -> None:
+        line = json.dumps(asdict(exchange), ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def __iter__(self) -> Iterator[Exchange]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield Exchange(**json.loads(line))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SqliteTrafficLog(TrafficLog):
+    """
+    Exchanges in a SQLite table, indexed by kind and key.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS exchanges (id INTEGER PRIMARY KEY, kind TEXT, key TEXT, "
+                                 "elapsed_ms REAL, request TEXT, response TEXT)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS exchanges_key ON exchanges (kind, key)")
+        self._connection.commit()
+
+    def append(self, exchange: Exchange) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO exchanges (kind, key, elapsed_ms, request, response) VALUES (?, ?, ?, ?, ?)",
+                (exchange.kind, exchange.key, exchange.elapsed_ms,
+                 json.dumps(exchange.request, ensure_ascii=False), json.dumps(exchange.response, ensure_ascii=False)))
+            self._connection.commit()
+
+    def __iter__(self) -> Iterator[Exchange]:
+        with self._lock:
+            rows = self._connection.execute("SELECT kind, key, elapsed_ms, request, response FROM exchanges ORDER BY id").fetchall()
+        for kind, key, elapsed_ms, request, response in rows:
+            yield Exchange(kind, key, elapsed_ms, json.loads(request), json.loads(response))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def open_traffic_log(path: Annotated[str, ".db / .sqlite for SQLite, anything else is JSONL"]) -> TrafficLog:
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteTrafficLog(path)
+    return JsonlTrafficLog(path)
+
+
+class TrafficRecorder:
+    def __init__(self, log: TrafficLog):
+        self.log = log
+        self.recorded = 0
+
+    def record(self, exchange: Exchange) -> None:
+        try:
+            self.log.append(exchange)
+            self.recorded += 1
+        except Exception as exc:
+            # Recording must never break the run it observes
+            logger.warning("Could not record %s exchange: %s", exchange.kind, exc)
+
+
+class TrafficReplayer:
+    """
+    Serves recorded exchanges by key. A request recorded several times gets its responses in
+    recording order, then the sequence starts again.
+    """
+
+    def __init__(self, exchanges: Iterable[Exchange], time_scale: Annotated[float, "Factor applied to recorded durations"] = 1.0,
+                 strict: Annotated[bool, "Raise ReplayMissError on unrecorded requests"] = True):
+        self.time_scale = time_scale
+        self.strict = strict
+        self._exchanges: Dict[Tuple[str, str], List[Exchange]] = {}
+        for exchange in exchanges:
+            self._exchanges.setdefault((exchange.kind, exchange.key), []).append(exchange)
+        self._cursors: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, kind: str, key: str, description: str = "") -> Optional[Exchange]:
+        with self._lock:
+            recorded = self._exchanges.get((kind, key))
+            if not recorded:
+                self.misses += 1
+            else:
+                self.hits += 1
+                cursor = self._cursors.get((kind, key), 0)
+                self._cursors[(kind, key)] = cursor + 1
+                return recorded[cursor % len(recorded)]
+        if self.strict:
+            raise ReplayMissError(f"No recorded {kind} exchange for {description or key}")
+        return None
+
+    def delay_s(self, exchange: Exchange) -> float:
+        return exchange.elapsed_ms * self.time_scale / 1000
+
+    def stats(self) -> Dict[str, int]:
+        return {"recorded_keys": len(self._exchanges), "hits": self.hits, "misses": self.misses}
+
+
+_recorder: Optional[TrafficRecorder] = None
+_replayer: Optional[TrafficReplayer] = None
+_configured = False
+_config_lock = threading.Lock()
+
+
+def configure_traffic(mode: Annotated[str, "off | record | replay"] = "off", path: Optional[str] = None,
+                      time_scale: float = 1.0, strict: bool = True) -> None:
+    """
+    Set the process wide traffic mode. Kernels built afterwards (sk_utils.get_kernel_router)
+    record or replay their completions, plugin HTTP calls switch immediately.
+    """
+    global _recorder, _replayer, _configured
+    if mode not in ("off", "record", "replay"):
+        raise ValueError(f"Unknown traffic mode {mode}")
+    if mode != "off" and not path:
+        raise ValueError(f"Traffic mode {mode} needs a log path")
+    with _config_lock:
+        if _recorder is not None:
+            _recorder.log.close()
+        _recorder = _replayer = None
+        if mode == "record":
+            _recorder = TrafficRecorder(open_traffic_log(path))
+            logger.info("Recording LLM and HTTP traffic to %s", path)
+        elif mode == "replay":
+            log = open_traffic_log(path)
+            _replayer = TrafficReplayer(log, time_scale=time_scale, strict=strict)
+            log.close()
+            logger.info("Replaying traffic from %s (%s keys, time scale %s)", path, _replayer.stats()["recorded_keys"], time_scale)
+        _configured = True
+
+
+def _configure_from_env() -> None:
+    if not _configured:
+        configure_traffic(os.getenv("TRAFFIC_MODE", "off"), os.getenv("TRAFFIC_LOG"),
+                          float(os.getenv("TRAFFIC_TIME_SCALE", "1")))
+
+
+def get_recorder() -> Optional[TrafficRecorder]:
+    _configure_from_env()
+    return _recorder
+
+
+def get_replayer() -> Optional[TrafficReplayer]:
+    _configure_from_env()
+    return _replayer